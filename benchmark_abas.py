@@ -0,0 +1,58 @@
+import argparse
+import os
+import time
+
+from olist_agregados import ABAS_DASHBOARD, ABAS_V3
+from olist_conexao import criar_engine
+from olist_etl import construir_base, construir_base_v3
+from olist_modelo import ESQUEMAS, construir_modelo
+from olist_sintetico import gerar_sqlite
+
+# --- MICRO-BENCHMARK: TODAS AS ABAS x SÓ A ABA VISÍVEL ---
+# Antes cada rerun com filtro novo calculava os resumos das seis abas (st.tabs
+# é só visual); agora só a aba selecionada calcula (on_change='rerun' + .open).
+# Mede, sobre uma base sintética, o tempo de cada aba isolada contra o das
+# seis juntas, nos dois dashboards. No v3 os resumos gerais (topo da página)
+# rodam sempre, então o custo de uma aba é o dela mais o dos gerais.
+# Uso: python benchmark_abas.py --pedidos 200000
+
+PASTA_DADOS = os.environ.get('OLIST_BENCH_DIR', '.olist_bench')
+
+
+def cronometrar(func, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        func()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+
+def medir(titulo, modelo, abas, repeticoes, sempre=None):
+    tempos = {aba: cronometrar(lambda: montar(modelo), repeticoes) for aba, montar in abas.items()}
+    total = sum(tempos.values())
+    print(f"\n{titulo}: todas as abas {total:.3f}s")
+    print(f"{'Aba':<14}{'tempo (s)':>11}{'rerun (s)':>11}{'x mais rápido':>15}")
+    for aba, tempo in tempos.items():
+        rerun = tempo if sempre is None or aba == sempre else tempo + tempos[sempre]
+        print(f"{aba:<14}{tempo:>11.3f}{rerun:>11.3f}{total / rerun:>15.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Custo do rerun: seis abas x aba visível")
+    parser.add_argument('--pedidos', type=int, default=200_000)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    os.makedirs(PASTA_DADOS, exist_ok=True)
+    caminho_db = gerar_sqlite(os.path.join(PASTA_DADOS, f"olist_abas_{args.pedidos}.db"), args.pedidos)
+    with criar_engine(f"sqlite:///{caminho_db}").connect() as conn:
+        final = construir_modelo(construir_base(conn), ESQUEMAS['final'])
+        v3 = construir_modelo(construir_base_v3(conn), ESQUEMAS['v3'])
+    print(f"{args.pedidos:,} pedidos, {len(final):,} itens")
+    medir("Dashboard final", final, ABAS_DASHBOARD, args.repeticoes)
+    medir("Dashboard v3", v3, ABAS_V3, args.repeticoes, sempre='Geral')
+
+
+if __name__ == "__main__":
+    main()
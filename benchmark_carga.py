@@ -0,0 +1,75 @@
+import argparse
+import multiprocessing as mp
+import resource
+import time
+
+import pandas as pd
+from sqlalchemy import create_engine
+
+from olist_sql import COLUNAS_DASHBOARD, carregar_olist_pandas, carregar_olist_sql
+from olist_tipos import tipar_chunk
+
+# --- BENCHMARK DE CARGA: PICO DE MEMÓRIA (RSS) ---
+# Compara o carregador antigo (SELECT * das sete tabelas + merges + conversão
+# numérica via string) com o carregador em blocos tipados. Cada carregador roda
+# em um processo separado, para que o pico de RSS de um não contamine o outro.
+# Uso: python benchmark_carga.py --url mysql+pymysql://... [--chunk 50000]
+
+NUMERICOS = ['price', 'freight_value', 'product_weight_g', 'product_photos_qty', 'review_score', 'payment_installments']
+MEDIDAS = ['product_length_cm', 'product_height_cm', 'product_width_cm']
+DATAS = ['order_purchase_timestamp', 'order_approved_at',
+         'order_delivered_customer_date', 'order_estimated_delivery_date']
+
+
+def carga_antiga(conn, tamanho_chunk):
+    df = carregar_olist_pandas(conn, COLUNAS_DASHBOARD)
+    for col in NUMERICOS:
+        df[col] = pd.to_numeric(df[col].astype(str).str.replace(',', '.'), errors='coerce').fillna(0)
+    for col in DATAS:
+        df[col] = pd.to_datetime(df[col], errors='coerce')
+    return df
+
+
+def carga_em_blocos(conn, tamanho_chunk):
+    return carregar_olist_sql(
+        conn, COLUNAS_DASHBOARD, tamanho_chunk=tamanho_chunk,
+        tratar_chunk=lambda c: tipar_chunk(c, zerar=NUMERICOS, numericos=MEDIDAS, datas=DATAS))
+
+
+CARREGADORES = {'antigo (SELECT * + merge)': carga_antiga, 'em blocos tipados': carga_em_blocos}
+
+
+def _pico_rss_mb():
+    # ru_maxrss é em KB no Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _medir(nome, url, tamanho_chunk, fila):
+    engine = create_engine(url)
+    base = _pico_rss_mb()
+    inicio = time.perf_counter()
+    with engine.connect() as conn:
+        df = CARREGADORES[nome](conn, tamanho_chunk)
+    tempo = time.perf_counter() - inicio
+    fila.put((nome, len(df), tempo, _pico_rss_mb() - base, df.memory_usage(deep=True).sum() / 2**20))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pico de RSS: carregador antigo x carregador em blocos")
+    parser.add_argument('--url', required=True, help="URL SQLAlchemy do banco (ex.: sqlite:///olist.db)")
+    parser.add_argument('--chunk', type=int, default=50_000)
+    args = parser.parse_args()
+
+    ctx = mp.get_context('spawn')
+    print(f"{'Carregador':<28}{'linhas':>10}{'tempo (s)':>11}{'pico RSS (MB)':>15}{'DataFrame (MB)':>16}")
+    for nome in CARREGADORES:
+        fila = ctx.Queue()
+        proc = ctx.Process(target=_medir, args=(nome, args.url, args.chunk, fila))
+        proc.start()
+        nome, linhas, tempo, pico, tamanho = fila.get()
+        proc.join()
+        print(f"{nome:<28}{linhas:>10,}{tempo:>11.2f}{pico:>15.1f}{tamanho:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
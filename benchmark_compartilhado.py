@@ -0,0 +1,127 @@
+import argparse
+import multiprocessing as mp
+import os
+import tempfile
+
+from olist_agregados import agregados_dashboard
+from olist_compartilhado import anexar_modelo, limpar_versoes, publicar_modelo
+from olist_conexao import criar_engine
+from olist_etl import construir_base
+from olist_modelo import ESQUEMAS, construir_modelo
+from olist_sintetico import gerar_sqlite
+from olist_snapshot import ler_snapshot, salvar_snapshot
+
+# --- MICRO-BENCHMARK: MODELO POR PROCESSO x MODELO COMPARTILHADO ---
+# Sobe N processos ao mesmo tempo, como os workers do Streamlit atrás do
+# balanceador, e mede a memória privada (RssAnon) que cada um ganha ao carregar
+# o modelo estrela:
+#   - cópia: lê o snapshot e monta o próprio modelo (caminho anterior);
+#   - compartilhado: anexa a versão publicada (memory map, ver olist_compartilhado).
+# Cada processo calcula os agregados do dashboard, conferidos entre os modos.
+# No fim, publica uma segunda versão com um processo ainda preso à primeira e
+# confere que a antiga só é apagada depois que ele a solta.
+# Uso: python benchmark_compartilhado.py --pedidos 200000 --processos 1 2 4 8
+
+PASTA_DADOS = os.environ.get('OLIST_BENCH_DIR', '.olist_bench')
+
+
+def _memoria_mb():
+    campos = {}
+    with open('/proc/self/status') as status:
+        for linha in status:
+            nome, _, valor = linha.partition(':')
+            if nome in ('RssAnon', 'RssFile', 'RssShmem'):
+                campos[nome] = int(valor.split()[0]) / 1024
+    return campos
+
+
+def _trabalhador(modo, caminho, pasta, pronto, sair, fila):
+    antes = _memoria_mb()
+    if modo == 'copia':
+        modelo = construir_modelo(ler_snapshot(caminho), ESQUEMAS['final'])
+    else:
+        modelo = anexar_modelo('final', pasta=pasta)
+    ag = agregados_dashboard(modelo)
+    depois = _memoria_mb()
+    fila.put({
+        'privada_mb': depois['RssAnon'] - antes['RssAnon'],
+        'arquivo_mb': depois['RssFile'] + depois['RssShmem'] - antes['RssFile'] - antes['RssShmem'],
+        'conferencia': (len(modelo), round(ag['media_dias'], 9), round(ag['nota_media'], 9),
+                        ag['recompra']['clientes'] if ag['recompra'] else 0),
+    })
+    pronto.release()
+    # Todos ficam vivos (e com o modelo) até o último medir
+    sair.wait()
+
+
+def medir(modo, processos, caminho, pasta):
+    contexto = mp.get_context('spawn')
+    pronto, sair, fila = contexto.Semaphore(0), contexto.Event(), contexto.Queue()
+    trabalhadores = [contexto.Process(target=_trabalhador, args=(modo, caminho, pasta, pronto, sair, fila))
+                     for _ in range(processos)]
+    for t in trabalhadores:
+        t.start()
+    resultados = [fila.get() for _ in trabalhadores]
+    for _ in trabalhadores:
+        pronto.acquire()
+    sair.set()
+    for t in trabalhadores:
+        t.join()
+    return resultados
+
+
+def verificar_troca(modelo, pasta):
+    """Versão antiga preservada enquanto um processo a tem anexada, apagada depois."""
+    contexto = mp.get_context('spawn')
+    pronto, sair, fila = contexto.Semaphore(0), contexto.Event(), contexto.Queue()
+    preso = contexto.Process(target=_trabalhador, args=('compartilhado', None, pasta, pronto, sair, fila))
+    preso.start()
+    fila.get()
+    pronto.acquire()
+    antiga = modelo.attrs['versao_dados']
+    modelo.attrs['versao_dados'] = f"{antiga}_nova"
+    publicar_modelo(modelo, 'final', pasta)
+    assert os.path.isdir(os.path.join(pasta, antiga)), "versão em uso apagada"
+    sair.set()
+    preso.join()
+    assert limpar_versoes('final', pasta) == [os.path.join(pasta, antiga)], "versão solta não foi apagada"
+    modelo.attrs['versao_dados'] = antiga
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memória por processo: modelo próprio x compartilhado")
+    parser.add_argument('--pedidos', type=int, default=200_000)
+    parser.add_argument('--processos', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    os.makedirs(PASTA_DADOS, exist_ok=True)
+    caminho_db = gerar_sqlite(os.path.join(PASTA_DADOS, f"olist_compartilhado_{args.pedidos}.db"), args.pedidos)
+    with criar_engine(f"sqlite:///{caminho_db}").connect() as conn:
+        df = construir_base(conn)
+    df.attrs['versao_dados'] = f"final_v0_bench{args.pedidos}"
+    modelo = construir_modelo(df, ESQUEMAS['final'])
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, 'snapshot.arrow')
+        salvar_snapshot(df, caminho)
+        del df
+        publicar_modelo(modelo, 'final', pasta)
+        print(f"{args.pedidos:,} pedidos, {len(modelo):,} itens; modelo em memória: {modelo.memoria_mb():,.0f} MB")
+        print(f"{'Modo':<15}{'Processos':>10}{'privada/proc (MB)':>19}{'privada total (MB)':>20}"
+              f"{'mapeada/proc (MB)':>19}")
+        conferencias = set()
+        for processos in args.processos:
+            for modo in ['copia', 'compartilhado']:
+                resultados = medir(modo, processos, caminho, pasta)
+                privada = [r['privada_mb'] for r in resultados]
+                arquivo = [r['arquivo_mb'] for r in resultados]
+                conferencias.update(r['conferencia'] for r in resultados)
+                print(f"{modo:<15}{processos:>10}{sum(privada) / processos:>19,.1f}{sum(privada):>20,.1f}"
+                      f"{sum(arquivo) / processos:>19,.1f}")
+        assert len(conferencias) == 1, f"agregados divergentes entre processos/modos: {conferencias}"
+        verificar_troca(modelo, pasta)
+    print("Agregados idênticos nos dois modos; troca de versão com contagem de referências: OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import argparse
+import sqlite3
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool, QueuePool
+
+from olist_conexao import CONFIG_POOL
+from olist_sql import COLUNAS_DASHBOARD, carregar_olist_pandas, carregar_olist_sql
+
+# --- BENCHMARK DE CONEXÃO: POOL + LEITURA PARALELA SOB LATÊNCIA ---
+# Usa um arquivo SQLite local como substituto do MySQL remoto e injeta
+# latência artificial: cada nova conexão, cada execute e cada fetch (um bloco
+# do cursor) esperam `--latencia-ms`, como uma ida e volta na rede. Compara a
+# leitura sequencial em uma conexão com a leitura paralela sobre o pool.
+# Atenção: no substituto o "servidor" roda no mesmo processo, então só a
+# latência se sobrepõe entre as threads; o custo de CPU da query não se
+# divide como se dividiria entre as conexões de um MySQL real.
+# Uso: python benchmark_conexao.py --db olist.db [--latencia-ms 30] [--particoes 4]
+
+
+def engine_com_latencia(caminho, latencia, com_pool):
+    class CursorLento(sqlite3.Cursor):
+        def execute(self, *args, **kwargs):
+            time.sleep(latencia)
+            return super().execute(*args, **kwargs)
+
+        def fetchmany(self, *args, **kwargs):
+            time.sleep(latencia)
+            return super().fetchmany(*args, **kwargs)
+
+        def fetchall(self):
+            time.sleep(latencia)
+            return super().fetchall()
+
+    class ConexaoLenta(sqlite3.Connection):
+        def cursor(self, factory=CursorLento):
+            return super().cursor(factory)
+
+    def conectar():
+        time.sleep(latencia * 3)  # handshake TCP + autenticação
+        return sqlite3.connect(caminho, factory=ConexaoLenta, check_same_thread=False)
+
+    if com_pool:
+        return create_engine('sqlite://', creator=conectar, poolclass=QueuePool,
+                             pool_size=CONFIG_POOL['pool_size'], max_overflow=CONFIG_POOL['max_overflow'],
+                             pool_pre_ping=CONFIG_POOL['pool_pre_ping'])
+    # Sem pool: cada connect() abre uma conexão nova (engine recriado a cada carga)
+    return create_engine('sqlite://', creator=conectar, poolclass=NullPool)
+
+
+def cenarios(args):
+    def tabelas(engine, paralelo):
+        with engine.connect() as conn:
+            return carregar_olist_pandas(conn, COLUNAS_DASHBOARD, paralelo=paralelo)
+
+    def query(engine, particoes):
+        with engine.connect() as conn:
+            return carregar_olist_sql(conn, COLUNAS_DASHBOARD, tamanho_chunk=args.chunk, particoes=particoes)
+
+    return [
+        ('7 tabelas, sequencial, sem pool', False, lambda e: tabelas(e, False)),
+        ('7 tabelas, paralelo, pool', True, lambda e: tabelas(e, True)),
+        ('JOIN único, sequencial, sem pool', False, lambda e: query(e, 1)),
+        (f'JOIN em {args.particoes} faixas, pool', True, lambda e: query(e, args.particoes)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Leitura sequencial x paralela com latência injetada")
+    parser.add_argument('--db', required=True, help="arquivo SQLite com as tabelas da Olist")
+    parser.add_argument('--latencia-ms', type=float, default=30)
+    parser.add_argument('--particoes', type=int, default=4)
+    parser.add_argument('--chunk', type=int, default=5_000)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+    latencia = args.latencia_ms / 1000
+
+    print(f"Latência injetada: {args.latencia_ms:.0f} ms por ida e volta")
+    print(f"{'Cenário':<36}{'linhas':>10}{'tempo (s)':>11}")
+    for nome, com_pool, carregar in cenarios(args):
+        engine = engine_com_latencia(args.db, latencia, com_pool)
+        tempos = []
+        for _ in range(args.repeticoes):
+            inicio = time.perf_counter()
+            df = carregar(engine)
+            tempos.append(time.perf_counter() - inicio)
+        engine.dispose()
+        print(f"{nome:<36}{len(df):>10,}{min(tempos):>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from olist_tipos import normalizar_datas
+
+# --- MICRO-BENCHMARK: NORMALIZAÇÃO DE DATAS x safe_date_parse ---
+# Gera colunas de datas em texto no formato do banco (ISO com segundos), com
+# uma fração em DD/MM/YYYY, datas sem hora, ausentes e lixo, e compara a
+# função antiga do dashboard v3 com normalizar_datas. Confere que as duas
+# concordam em todas as linhas ISO e que as linhas DD/MM/YYYY, que a antiga
+# transformava em NaT, agora são convertidas.
+# Uso: python benchmark_datas.py --linhas 2000000 [--fracao-br 0.05]
+
+
+# Implementação de referência (versão anterior, em olist_etl)
+def safe_date_parse(series):
+    """Tenta converter datas de forma robusta, lidando com formatos mistos."""
+    # Se já for data, retorna direto
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+
+    # Converte para string e limpa
+    s = series.astype(str).str.strip().replace('nan', pd.NA).replace('None', pd.NA)
+
+    # Tenta formato ISO (YYYY-MM-DD) primeiro (Padrão SQL)
+    # (errors='coerce' nunca lança: o fallback DD/MM/YYYY nunca roda)
+    try:
+        return pd.to_datetime(s, format='%Y-%m-%d %H:%M:%S', errors='coerce')
+    except:
+        # Se falhar, tenta formato BR (DD/MM/YYYY) com dayfirst=True
+        return pd.to_datetime(s, dayfirst=True, errors='coerce')
+
+
+def gerar_coluna(n, fracao_br, seed=42, segundos_distintos=True):
+    """Texto de datas: ISO, DD/MM/YYYY, ISO sem hora, ausentes e inválidas."""
+    rng = np.random.default_rng(seed)
+    inicio = np.datetime64('2016-09-01T00:00:00')
+    if segundos_distintos:
+        # Como order_purchase_timestamp: quase todo valor é único
+        datas = inicio + rng.integers(0, 2 * 365 * 86400, n).astype('timedelta64[s]')
+    else:
+        # Como order_estimated_delivery_date: poucas datas repetidas muitas vezes
+        datas = inicio + (rng.integers(0, 2 * 365, n) * 86400).astype('timedelta64[s]')
+    indice = pd.DatetimeIndex(datas)
+    texto = pd.Series(indice.strftime('%Y-%m-%d %H:%M:%S'), dtype=object)
+    sorteio = rng.random(n)
+    br = sorteio < fracao_br
+    texto[br] = indice[br].strftime('%d/%m/%Y %H:%M')
+    so_data = (sorteio >= fracao_br) & (sorteio < fracao_br + 0.01)
+    texto[so_data] = indice[so_data].strftime('%Y-%m-%d')
+    texto[(sorteio >= 0.97) & (sorteio < 0.99)] = None
+    texto[sorteio >= 0.999] = '0000-00-00 00:00:00'
+    return texto
+
+
+def cronometrar(func, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = func()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos), resultado
+
+
+def verificar(texto, antigo, novo):
+    """As duas funções concordam nas linhas ISO completas; DD/MM/YYYY só a nova converte."""
+    iso = texto.str.match(r'^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$', na=False).to_numpy()
+    a = antigo.to_numpy('datetime64[us]')
+    b = novo.to_numpy('datetime64[us]')
+    mesmos = (a[iso] == b[iso]) | (np.isnat(a[iso]) & np.isnat(b[iso]))
+    assert mesmos.all(), f"{(~mesmos).sum()} linhas ISO divergentes"
+    br = texto.str.match(r'^\d{2}/\d{2}/\d{4}', na=False).to_numpy()
+    assert not np.isnat(b[br]).any(), "linhas DD/MM/YYYY não convertidas"
+    return int(np.isnat(a[br]).sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="normalizar_datas x safe_date_parse")
+    parser.add_argument('--linhas', type=int, default=2_000_000)
+    parser.add_argument('--fracao-br', type=float, default=0.05)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{args.linhas:,} linhas, {args.fracao_br:.0%} em DD/MM/YYYY")
+    print(f"{'Coluna':<26}{'antiga (s)':>12}{'nova (s)':>10}{'ganho':>8}{'BR perdidas':>13}{'não conv.':>11}")
+    for nome, distintos in [('timestamps (únicos)', True), ('datas (repetidas)', False)]:
+        texto = gerar_coluna(args.linhas, args.fracao_br, segundos_distintos=distintos)
+        texto.name = 'data'
+        t_antigo, antigo = cronometrar(lambda: safe_date_parse(texto), args.repeticoes)
+        relatorio = {}
+        t_novo, novo = cronometrar(lambda: normalizar_datas(texto), args.repeticoes)
+        normalizar_datas(texto, relatorio)
+        perdidas = verificar(texto, antigo, novo)
+        print(f"{nome:<26}{t_antigo:>12.3f}{t_novo:>10.3f}{t_antigo / t_novo:>7.1f}x"
+              f"{perdidas:>13,}{relatorio['data']['nao_convertidas']:>11,}")
+    print("Equivalência OK nas linhas ISO; 'BR perdidas' = linhas DD/MM/YYYY que a função antiga deixava em NaT.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from olist_derivacoes import derivar_colunas, status_prazo, tipo_frete
+
+# --- MICRO-BENCHMARK: DERIVAÇÕES VETORIZADAS x df.apply(axis=1) ---
+# Gera uma base sintética com as colunas usadas nas derivações, confere que a
+# versão vetorizada produz exatamente as mesmas colunas que as lambdas antigas
+# e compara os tempos.
+# Uso: python benchmark_derivacoes.py --linhas 1000000
+
+# Ausentes como chegam das regras de qualidade (ver olist_qualidade): UF 'Desc', categoria 'nan'
+ESTADOS = ['SP', 'RJ', 'MG', 'RS', 'PR', 'BA', 'Desc']
+
+
+def gerar_base(n, seed=42):
+    rng = np.random.default_rng(seed)
+    aprovacao = pd.Timestamp('2017-01-01') + pd.to_timedelta(rng.integers(0, 700, n), unit='D')
+    entrega = aprovacao + pd.to_timedelta(rng.integers(-2, 60, n), unit='D')
+    prevista = aprovacao + pd.to_timedelta(rng.integers(5, 40, n), unit='D')
+    # ~3% de pedidos sem entrega (NaT)
+    entrega = entrega.where(rng.random(n) > 0.03)
+    return pd.DataFrame({
+        'Data Aprovação': aprovacao,
+        'Data Entrega Real': entrega,
+        'Data Entrega Prevista': prevista,
+        'Estado do Cliente': rng.choice(np.array(ESTADOS, dtype=object), n),
+        'Estado do Vendedor': rng.choice(np.array(ESTADOS, dtype=object), n),
+        'Comprimento (cm)': rng.integers(1, 100, n).astype(float),
+        'Altura (cm)': rng.integers(1, 100, n).astype(float),
+        'Largura (cm)': rng.integers(1, 100, n).astype(float),
+        'CEP Prefixo': rng.integers(1000, 99999, n),
+        'Cidade do Cliente': rng.choice(np.array(['sao paulo', 'rio de janeiro', 'curitiba'], dtype=object), n),
+        'Categoria do Produto': rng.choice(np.array(['cama_mesa_banho', 'beleza_saude', 'nan'], dtype=object), n),
+    })
+
+
+# Implementações de referência (versões anteriores com df.apply)
+def tipo_frete_apply(df):
+    return df.apply(lambda x: 'Local' if x['Estado do Cliente'] == x['Estado do Vendedor'] and x['Estado do Cliente'] != 'Desc' else 'Interestadual', axis=1)
+
+
+def status_prazo_apply(df):
+    return df.apply(lambda x: 'No Prazo' if x['Data Entrega Real'] <= x['Data Entrega Prevista'] else 'Atrasado', axis=1)
+
+
+def cronometrar(func, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        func()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+
+def verificar_equivalencia(df):
+    """Confere coluna a coluna que as derivações vetorizadas batem com as lambdas."""
+    base = df.copy()
+    base['Estado do Cliente'] = base['Estado do Cliente'].fillna('Desc')
+    base['Estado do Vendedor'] = base['Estado do Vendedor'].fillna('Desc')
+
+    def comparar(obtido, esperado):
+        # As derivações devolvem Categorical; a comparação é pelos rótulos
+        pd.testing.assert_series_equal(obtido.astype(object), esperado.astype(object), check_names=False)
+
+    derivado = derivar_colunas(df.copy())
+    comparar(derivado['Tipo de Frete'], tipo_frete_apply(base))
+    esperado_prazo = (base['Data Entrega Real'] <= base['Data Entrega Prevista']).map({True: 'No Prazo/Adiantado', False: 'Atrasado'})
+    comparar(derivado['Status do Prazo'], esperado_prazo)
+    comparar(status_prazo(base['Data Entrega Real'], base['Data Entrega Prevista'], rotulo_no_prazo='No Prazo'),
+             status_prazo_apply(base))
+    esperado_cat = base['Categoria do Produto'].fillna('nan').astype(str).str.replace('_', ' ').str.title()
+    comparar(derivado['Categoria do Produto'], esperado_cat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Derivações vetorizadas x df.apply(axis=1)")
+    parser.add_argument('--linhas', type=int, default=200_000)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    df = gerar_base(args.linhas)
+    verificar_equivalencia(df.head(min(len(df), 50_000)))
+    print(f"Equivalência OK. Base sintética: {len(df):,} linhas")
+
+    base = df.copy()
+    base['Estado do Cliente'] = base['Estado do Cliente'].fillna('Desc')
+    base['Estado do Vendedor'] = base['Estado do Vendedor'].fillna('Desc')
+
+    casos = [
+        ('Tipo de Frete', lambda: tipo_frete_apply(base),
+         lambda: tipo_frete(base['Estado do Cliente'], base['Estado do Vendedor'])),
+        ('status_prazo', lambda: status_prazo_apply(base),
+         lambda: status_prazo(base['Data Entrega Real'], base['Data Entrega Prevista'], rotulo_no_prazo='No Prazo')),
+    ]
+    print(f"{'Derivação':<16}{'apply (s)':>12}{'vetorizado (s)':>16}{'ganho':>10}")
+    for nome, antigo, novo in casos:
+        t_antigo = cronometrar(antigo, args.repeticoes)
+        t_novo = cronometrar(novo, args.repeticoes)
+        print(f"{nome:<16}{t_antigo:>12.3f}{t_novo:>16.4f}{t_antigo / t_novo:>9.0f}x")
+
+    t_total = cronometrar(lambda: derivar_colunas(df.copy()), args.repeticoes)
+    print(f"derivar_colunas completo: {t_total:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
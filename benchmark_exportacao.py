@@ -0,0 +1,84 @@
+import argparse
+import gzip
+import io
+import os
+import time
+import tracemalloc
+
+import pandas as pd
+
+from olist_conexao import criar_engine
+from olist_etl import construir_base
+from olist_exportacao import FORMATOS, blocos_modelo, colunas_exportaveis, exportar, traduzir
+from olist_modelo import ESQUEMAS, construir_modelo
+from olist_sintetico import gerar_sqlite
+
+# --- MICRO-BENCHMARK: EXPORTAÇÃO INGÊNUA x EM BLOCOS ---
+# Compara, sobre o modelo estrela de uma base sintética, o pico de memória
+# alocada (tracemalloc) para exportar todas as colunas no grão de item:
+#   - ingênua: itens_com (base plana inteira) + to_csv/to_parquet em memória;
+#   - em blocos: exportar(blocos_modelo(...)) (ver olist_exportacao).
+# Confere que os dois arquivos têm o mesmo conteúdo. Os tempos são medidos com o
+# tracemalloc ligado (mais lentos que o normal, sobretudo no CSV).
+# Uso: python benchmark_exportacao.py --pedidos 200000
+
+PASTA_DADOS = os.environ.get('OLIST_BENCH_DIR', '.olist_bench')
+
+
+def ingenua(modelo, colunas, formato):
+    df = traduzir(modelo.itens_com(colunas))
+    if formato == 'parquet':
+        buffer = io.BytesIO()
+        df.to_parquet(buffer, index=False, compression='zstd')
+        return buffer.getvalue()
+    return gzip.compress(df.to_csv(index=False).encode('utf-8'), mtime=0)
+
+
+def em_blocos(modelo, colunas, formato):
+    arquivo = exportar(blocos_modelo(modelo, colunas), formato)
+    return arquivo
+
+
+def medir(func, *args):
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    resultado = func(*args)
+    tempo = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resultado, tempo, pico / 2**20
+
+
+def _ler(conteudo, formato):
+    if formato == 'parquet':
+        return pd.read_parquet(conteudo)
+    return pd.read_csv(conteudo, compression='gzip', low_memory=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pico de memória da exportação: ingênua x em blocos")
+    parser.add_argument('--pedidos', type=int, default=200_000)
+    args = parser.parse_args()
+
+    os.makedirs(PASTA_DADOS, exist_ok=True)
+    caminho_db = gerar_sqlite(os.path.join(PASTA_DADOS, f"olist_exportacao_{args.pedidos}.db"), args.pedidos)
+    with criar_engine(f"sqlite:///{caminho_db}").connect() as conn:
+        modelo = construir_modelo(construir_base(conn), ESQUEMAS['final'])
+    colunas = colunas_exportaveis(modelo)
+    print(f"{args.pedidos:,} pedidos, {len(modelo):,} itens, {len(colunas)} colunas; "
+          f"modelo em memória: {modelo.memoria_mb():,.0f} MB")
+    print(f"{'Formato':<10}{'Modo':<11}{'tempo (s)':>11}{'pico (MB)':>11}{'arquivo (MB)':>14}")
+    for formato in FORMATOS:
+        bytes_ingenua, t_ing, pico_ing = medir(ingenua, modelo, colunas, formato)
+        arquivo, t_blo, pico_blo = medir(em_blocos, modelo, colunas, formato)
+        tamanho_blocos = arquivo.seek(0, io.SEEK_END) / 2**20
+        arquivo.seek(0)
+        print(f"{formato:<10}{'ingênua':<11}{t_ing:>11.2f}{pico_ing:>11.1f}{len(bytes_ingenua) / 2**20:>14.1f}")
+        print(f"{formato:<10}{'em blocos':<11}{t_blo:>11.2f}{pico_blo:>11.1f}{tamanho_blocos:>14.1f}")
+        pd.testing.assert_frame_equal(_ler(arquivo, formato), _ler(io.BytesIO(bytes_ingenua), formato),
+                                      check_dtype=False, check_categorical=False)
+    print("Arquivos com o mesmo conteúdo nos dois modos: OK")
+
+
+if __name__ == "__main__":
+    main()
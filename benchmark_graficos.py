@@ -0,0 +1,89 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+from olist_graficos import dispersao, figura_dispersao, figura_histograma, histograma
+
+# --- MICRO-BENCHMARK: GRÁFICOS COM LINHAS BRUTAS x PRÉ-AGREGADOS ---
+# Compara, em várias escalas, o tamanho do JSON que o Plotly envia ao
+# navegador e o tempo para montar a figura:
+#   - histograma: px.histogram sobre as linhas x barras de histograma();
+#   - dispersão: filtro + sample(2000) a cada rerun x dispersao() (grade + amostra);
+#     no dashboard os dados de dispersao() ficam nos agregados em cache, e a
+#     cada rerun só a figura é montada.
+# Confere também que a amostra estratificada é estável (mesma entrada, mesma
+# amostra) e que o histograma pré-agregado conta todas as linhas.
+# Uso: python benchmark_graficos.py --linhas 10000 100000 1000000
+
+
+def gerar_itens(n, seed=42):
+    """Peso, frete e dias de entrega com a forma aproximada da base real."""
+    rng = np.random.default_rng(seed)
+    peso = rng.lognormal(7, 1.2, n).astype('float32')
+    frete = (8 + peso / 400 + rng.gamma(2, 4, n)).astype('float32')
+    # Parte dos itens sem peso cadastrado (zero, como no dashboard final)
+    peso[rng.random(n) < 0.02] = 0
+    dias = rng.gamma(3, 4, n).round()
+    return pd.DataFrame({'Peso (g)': peso, 'Valor do Frete': frete, 'Dias para Entrega': dias})
+
+
+def medir(func, repeticoes=3):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = func()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos), resultado
+
+
+def tamanho_kb(fig):
+    return len(fig.to_json()) / 1024
+
+
+def antigo_dispersao(df):
+    # Versão anterior do dashboard: amostra nova a cada rerun
+    df_peso = df[(df['Peso (g)'] > 0) & (df['Valor do Frete'] > 0)]
+    return px.scatter(df_peso.sample(min(2000, len(df_peso))), x='Peso (g)', y='Valor do Frete', opacity=0.5)
+
+
+def novo_dispersao(df):
+    return figura_dispersao(dispersao(df, 'Peso (g)', 'Valor do Frete'), "Peso x Frete")
+
+
+def verificar(df):
+    a = dispersao(df, 'Peso (g)', 'Valor do Frete')
+    b = dispersao(df, 'Peso (g)', 'Valor do Frete')
+    assert a['amostra'].equals(b['amostra']), "amostra instável entre chamadas"
+    assert int(a['densidade'].to_numpy().sum()) == a['pontos'], "a grade não conta todos os pontos"
+    hist = histograma(df['Dias para Entrega'], 30)
+    assert int(hist['contagem'].sum()) == int(df['Dias para Entrega'].notna().sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gráficos com linhas brutas x pré-agregados")
+    parser.add_argument('--linhas', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'Linhas':>10} {'Gráfico':<12}{'antigo (s)':>12}{'novo (s)':>10}{'antigo (KB)':>13}{'novo (KB)':>11}")
+    for n in args.linhas:
+        df = gerar_itens(n)
+        verificar(df)
+        casos = {
+            'histograma': (lambda: px.histogram(df, x='Dias para Entrega', nbins=30),
+                           lambda: figura_histograma(histograma(df['Dias para Entrega'], 30), "Dias", 'Dias para Entrega')),
+            'dispersão': (lambda: antigo_dispersao(df), lambda: novo_dispersao(df)),
+        }
+        for nome, (antigo, novo) in casos.items():
+            t_antigo, fig_antiga = medir(antigo, args.repeticoes)
+            t_novo, fig_nova = medir(novo, args.repeticoes)
+            print(f"{n:>10,} {nome:<12}{t_antigo:>12.3f}{t_novo:>10.3f}"
+                  f"{tamanho_kb(fig_antiga):>13,.0f}{tamanho_kb(fig_nova):>11,.0f}")
+    print("Amostra estável e contagens completas: OK")
+
+
+if __name__ == "__main__":
+    main()
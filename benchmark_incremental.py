@@ -0,0 +1,113 @@
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+import pandas as pd
+from sqlalchemy import create_engine
+
+from olist_etl import carregar_base
+from olist_metricas import ultima_execucao
+from olist_sintetico import gerar_sqlite
+
+# --- ATUALIZAÇÃO INCREMENTAL x RECONSTRUÇÃO COMPLETA ---
+# Sobre uma base sintética com datas ISO e DD/MM/YYYY misturadas, grava o
+# snapshot de cada conjunto e aplica alterações uma a uma no banco. Depois
+# de cada uma, o snapshot atualizado (delta ou reconstrução, conforme a
+# conferência) tem de ser idêntico a uma reconstrução completa em pasta vazia,
+# inclusive na versão dos dados.
+# Uso: python benchmark_incremental.py [--pedidos 5000] [--conjunto final v3]
+
+
+def _linha(conn, sql, *params):
+    return conn.execute(sql, params).fetchone()
+
+
+def novo_pedido_no_dia_da_marca(conn):
+    """Pedido novo (datas ISO) com a review no mesmo dia da maior review já vista."""
+    modelo = _linha(conn, "SELECT order_id FROM olist_order_items_dataset LIMIT 1")[0]
+    dia = _linha(conn, "SELECT MAX(review_creation_date) FROM olist_order_reviews_dataset")[0][:10]
+    pedido, cliente = 'f' * 31 + '1', 'f' * 31 + '2'
+    conn.execute("INSERT INTO olist_customers_dataset SELECT ?, customer_unique_id, customer_zip_code_prefix, "
+                 "customer_city, customer_state FROM olist_customers_dataset LIMIT 1", (cliente,))
+    conn.execute("INSERT INTO olist_orders_dataset (order_id, customer_id, order_status, order_purchase_timestamp, "
+                 "order_approved_at, order_estimated_delivery_date) VALUES (?, ?, 'processing', ?, ?, ?)",
+                 (pedido, cliente, f"{dia} 10:00:00", f"{dia} 11:00:00", f"{dia} 00:00:00"))
+    conn.execute("INSERT INTO olist_order_items_dataset SELECT ?, order_item_id, product_id, seller_id, ?, price, "
+                 "freight_value FROM olist_order_items_dataset WHERE order_id = ?", (pedido, f"{dia} 12:00:00", modelo))
+    conn.execute("INSERT INTO olist_order_payments_dataset VALUES (?, 1, 'boleto', 1, '99.90')", (pedido,))
+    conn.execute("INSERT INTO olist_order_reviews_dataset VALUES (?, ?, 4, NULL, 'Chegou', ?, ?)",
+                 ('f' * 31 + '3', pedido, f"{dia} 00:00:00", f"{dia} 00:00:00"))
+
+
+def pagamento_extra_em_pedido_antigo(conn):
+    """Pagamento 'voucher' maior que os demais em um dos pedidos mais antigos."""
+    pedido, seq = _linha(conn, "SELECT order_id, MAX(payment_sequential) FROM olist_order_payments_dataset "
+                               "WHERE order_id = (SELECT order_id FROM olist_orders_dataset "
+                               "WHERE order_purchase_timestamp LIKE '2016-%' LIMIT 1)")
+    conn.execute("INSERT INTO olist_order_payments_dataset VALUES (?, ?, 'voucher', 1, '99999.00')", (pedido, seq + 1))
+
+
+def pedido_antigo_entregue(conn):
+    """Pedido antigo ainda em trânsito passa a entregue, com a data de entrega (UPDATE, sem linha nova)."""
+    pedido, compra = _linha(conn, "SELECT order_id, order_purchase_timestamp FROM olist_orders_dataset "
+                                  "WHERE order_status = 'shipped' ORDER BY order_purchase_timestamp LIMIT 1")
+    conn.execute("UPDATE olist_orders_dataset SET order_status = 'delivered', order_delivered_customer_date = ? "
+                 "WHERE order_id = ?", (compra, pedido))
+
+
+CENARIOS = [novo_pedido_no_dia_da_marca, pagamento_extra_em_pedido_antigo, pedido_antigo_entregue]
+
+
+def _comparavel(df):
+    # Categorias e textos comparados pelo valor: o delta concatenado pode vir com
+    # outra ordem de categorias ou outro dtype de texto (object x str)
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(df[col].dtype):
+            df[col] = df[col].astype(object).where(df[col].notna(), None)
+    chave = [c for c in ('order_id', 'order_item_id') if c in df.columns]
+    return df.sort_values(chave, kind='stable').reset_index(drop=True)
+
+
+def _carregar(nome, engine, pasta):
+    inicio = time.perf_counter()
+    df = carregar_base(nome, engine, pasta)
+    etapas = {e.nome for e in ultima_execucao(f'carga_{nome}').etapas}
+    caminho = 'incremental' if {'leitura_snapshot', 'consulta_sql'} <= etapas else 'completo'
+    return df, caminho, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot incremental x reconstrução completa")
+    parser.add_argument('--pedidos', type=int, default=5_000)
+    parser.add_argument('--conjunto', nargs='+', default=['final', 'v3'])
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp(prefix='olist_incremental_')
+    try:
+        caminho_db = gerar_sqlite(os.path.join(pasta, 'olist.db'), args.pedidos, fracao_datas_br=0.3)
+        engine = create_engine(f"sqlite:///{caminho_db}")
+        pasta_snapshot = os.path.join(pasta, 'incremental')
+        for nome in args.conjunto:
+            carregar_base(nome, engine, pasta_snapshot)
+
+        print(f"{'Cenário':<36}{'Conjunto':<10}{'Caminho':<13}{'Linhas':>8}{'tempo (s)':>11}")
+        for n, cenario in enumerate(CENARIOS):
+            with sqlite3.connect(caminho_db) as conn:
+                cenario(conn)
+            for nome in args.conjunto:
+                df, caminho, tempo = _carregar(nome, engine, pasta_snapshot)
+                completo = carregar_base(nome, engine, os.path.join(pasta, f'completo_{n}'))
+                assert df.attrs['versao_dados'] == completo.attrs['versao_dados'], (cenario.__name__, nome)
+                pd.testing.assert_frame_equal(_comparavel(df), _comparavel(completo), check_dtype=False,
+                                              obj=f"{cenario.__name__} ({nome})")
+                print(f"{cenario.__name__:<36}{nome:<10}{caminho:<13}{len(df):>8,}{tempo:>11.3f}")
+        print("\nSnapshot atualizado idêntico à reconstrução completa em todos os cenários: OK")
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from olist_agregados import agregados_dashboard, agregados_v3
+from olist_conexao import criar_engine
+from olist_etl import construir_base, construir_base_v3
+from olist_filtros import construir_indices, opcoes, posicoes_filtradas
+from olist_kpis import (COMPRESSAO, _reduzir, consultar, juntar_sketches, kpis_dashboard, kpis_v3, quantil,
+                        sketches_dashboard, sketches_v3)
+from olist_modelo import ESQUEMAS, construir_modelo, filtrar_modelo
+from olist_sintetico import gerar_sqlite
+
+# --- MICRO-BENCHMARK: KPIs EXATOS x SKETCHES ---
+# Sorteia combinações de filtros (meses, UF do cliente, categorias) e compara:
+#   - exato: filtra o modelo e calcula os agregados (o caminho das abas);
+#   - sketches: junta as partições selecionadas (olist_kpis).
+# Confere que médias, taxas e somas batem (são exatas) e mede o erro dos
+# quantis. Também confere que os sketches de duas metades da base, juntados,
+# dão o mesmo que os da base inteira, e mede o erro de posto do t-digest com
+# compressão (valores contínuos, sem repetição) contra o limite documentado.
+# Uso: python benchmark_kpis.py --pedidos 200000 --consultas 50
+
+PASTA_DADOS = os.environ.get('OLIST_BENCH_DIR', '.olist_bench')
+
+
+def _filtros(rng, indices, col_data, col_uf, col_cat):
+    meses = sorted(set(pd.to_datetime(indices['data']['ordenados'][indices['data']['ordenados'] > 0])
+                       .to_period('M').astype(str)))
+    ufs, cats = opcoes(indices, col_uf), opcoes(indices, col_cat)
+    escolha = {}
+    periodo = None
+    if rng.random() < 0.5:
+        a, b = sorted(rng.choice(len(meses), 2))
+        inicio, fim = pd.Period(meses[a]), pd.Period(meses[b])
+        periodo = (inicio.start_time.date(), fim.end_time.date())
+        escolha['meses'] = {str(p) for p in pd.period_range(inicio, fim, freq='M')}
+    escolha['ufs'] = list(rng.choice(ufs, rng.integers(0, 4), replace=False))
+    escolha['categorias'] = list(rng.choice(cats, rng.integers(0, 4), replace=False))
+    return periodo, {col_uf: escolha['ufs'], col_cat: escolha['categorias']}, escolha
+
+
+def comparar(nome, modelo, sketches, kpis, agregados, cols, consultas, rng):
+    col_data, col_uf, col_cat = cols
+    indices = construir_indices(modelo.itens_com([col_data, col_uf, col_cat]), col_data, [col_uf, col_cat])
+    t_exato = t_sketch = 0.0
+    erros = {}
+    for _ in range(consultas):
+        periodo, selecoes, escolha = _filtros(rng, indices, *cols)
+        inicio = time.perf_counter()
+        filtrado = filtrar_modelo(modelo, posicoes_filtradas(indices, periodo, selecoes))
+        if filtrado.empty:
+            continue
+        ag = agregados(filtrado)
+        t_exato += time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        kp = kpis(*consultar(sketches, escolha.get('meses'), escolha['ufs'], escolha['categorias']))
+        t_sketch += time.perf_counter() - inicio
+        for chave, valor in kp.items():
+            exato = ag.get(chave)
+            if chave == 'ticket_medio_recorrentes':
+                exato = ag['recompra']['ticket_medio'] if ag.get('recompra') else np.nan
+            if exato is None or pd.isna(exato):
+                continue
+            erros[chave] = max(erros.get(chave, 0), abs(valor - exato) / max(abs(exato), 1e-9))
+    print(f"\n{nome}: {consultas} consultas; exato {t_exato / consultas * 1000:.1f} ms/consulta, "
+          f"sketches {t_sketch / consultas * 1000:.2f} ms/consulta ({t_exato / t_sketch:.0f}x)")
+    for chave, erro in erros.items():
+        print(f"  {chave:<26} erro relativo máx. {erro:.2e}")
+    tolerancia = {'ticket_medio_recorrentes': 1e-4}
+    for chave, erro in erros.items():
+        if 'mediana' not in chave:
+            assert erro <= tolerancia.get(chave, 1e-9), f"{chave} diverge do cálculo exato"
+
+
+def verificar_juncao(modelo, construir, col_data):
+    """Sketches das duas metades (por data), juntados, iguais aos da base inteira."""
+    datas = modelo.itens_com([col_data])[col_data]
+    corte = datas.quantile(0.5)
+    metades = [np.flatnonzero((datas <= corte).to_numpy()), np.flatnonzero(~(datas <= corte).to_numpy())]
+    juntos = juntar_sketches(*[construir(filtrar_modelo(modelo, pos)) for pos in metades])
+    inteiro = construir(modelo)
+    for grao in inteiro:
+        assert len(juntos[grao]['chaves']) == len(inteiro[grao]['chaves']), "partições diferentes"
+    totais_j, digests_j = consultar(juntos)
+    totais_i, digests_i = consultar(inteiro)
+    for chave in totais_i:
+        np.testing.assert_allclose(totais_j[chave], totais_i[chave], err_msg=chave)
+    for nome in digests_i:
+        for q in [0.1, 0.5, 0.9]:
+            assert quantil(digests_j[nome], q) == quantil(digests_i[nome], q), f"quantil {q} de {nome}"
+
+
+def erro_tdigest(n, partes, rng):
+    """Erro de posto do t-digest com valores contínuos (acima de COMPRESSAO distintos)."""
+    valores = rng.lognormal(3, 1, n)
+    particoes = rng.integers(0, partes, n)
+    _, medias, pesos = _reduzir(particoes, valores, np.ones(n))
+    _, medias, pesos = _reduzir(np.zeros(len(medias), dtype=np.int64), medias, pesos)
+    ordenados = np.sort(valores)
+    print(f"\nt-digest: {n:,} valores em {partes} partições, {len(medias)} centróides após a junção")
+    print(f"{'q':>6}{'erro de posto':>15}{'limite':>9}")
+    for q in [0.01, 0.1, 0.5, 0.9, 0.99]:
+        estimado = quantil((medias, pesos), q)
+        erro = abs(np.searchsorted(ordenados, estimado) / n - q)
+        limite = 2 * np.pi * np.sqrt(q * (1 - q)) / COMPRESSAO
+        print(f"{q:>6}{erro:>15.4%}{limite:>9.4%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="KPIs: cálculo exato x sketches combináveis")
+    parser.add_argument('--pedidos', type=int, default=200_000)
+    parser.add_argument('--consultas', type=int, default=50)
+    args = parser.parse_args()
+    rng = np.random.default_rng(42)
+
+    os.makedirs(PASTA_DADOS, exist_ok=True)
+    caminho_db = gerar_sqlite(os.path.join(PASTA_DADOS, f"olist_kpis_{args.pedidos}.db"), args.pedidos)
+    with criar_engine(f"sqlite:///{caminho_db}").connect() as conn:
+        final = construir_modelo(construir_base(conn), ESQUEMAS['final'])
+        v3 = construir_modelo(construir_base_v3(conn), ESQUEMAS['v3'])
+
+    for nome, modelo, construir, kpis, agregados, cols in [
+        ("Dashboard final", final, sketches_dashboard, kpis_dashboard, agregados_dashboard,
+         ('Data da Compra', 'Estado do Cliente', 'Categoria do Produto')),
+        ("Dashboard v3", v3, sketches_v3, kpis_v3, agregados_v3,
+         ('order_purchase_timestamp', 'customer_state', 'product_category_name')),
+    ]:
+        inicio = time.perf_counter()
+        sketches = construir(modelo)
+        print(f"\n{nome}: sketches em {time.perf_counter() - inicio:.2f}s, "
+              f"{len(sketches['pedidos']['chaves']):,} partições de pedido e "
+              f"{len(sketches['itens']['chaves']):,} de item")
+        comparar(nome, modelo, sketches, kpis, agregados, cols, args.consultas, rng)
+        verificar_juncao(modelo, construir, cols[0])
+    erro_tdigest(1_000_000, 64, rng)
+    print("\nMédias, taxas e somas idênticas ao cálculo exato; junção de metades = base inteira: OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import argparse
+import multiprocessing as mp
+import os
+import resource
+import tempfile
+import time
+
+from olist_conexao import criar_engine
+from olist_motor import MOTORES, calcular_metricas, comparar_metricas
+from olist_sintetico import gerar_sqlite
+
+# --- SUÍTE DE PARIDADE E BENCHMARK DOS MOTORES (PANDAS x DUCKDB) ---
+# Gera bases sintéticas (com vírgula decimal e parte das datas em
+# DD/MM/YYYY) em várias escalas e roda cada motor em um processo novo,
+# medindo tempo e pico de RSS. As métricas de todos os motores são
+# comparadas com as do pandas (referência); qualquer divergência encerra
+# com código de saída 1.
+# Uso: python benchmark_motores.py --pedidos 10000 100000 [--memoria-duckdb 512MB]
+
+PASTA_DADOS = os.environ.get('OLIST_BENCH_DIR', '.olist_bench')
+
+
+def _executar(motor, caminho_db, opcoes, fila):
+    engine = criar_engine(f"sqlite:///{caminho_db}")
+    inicio = time.perf_counter()
+    with engine.connect() as conn:
+        resumo = calcular_metricas(conn, motor, **opcoes)
+    tempo = time.perf_counter() - inicio
+    # Pico de RSS do processo inteiro (KB no Linux)
+    fila.put((tempo, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, resumo))
+
+
+def medir_motor(motor, caminho_db, opcoes):
+    contexto = mp.get_context('spawn')
+    fila = contexto.Queue()
+    processo = contexto.Process(target=_executar, args=(motor, caminho_db, opcoes, fila))
+    processo.start()
+    resultado = fila.get()
+    processo.join()
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Paridade e desempenho dos motores de execução")
+    parser.add_argument('--pedidos', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--motores', nargs='+', choices=list(MOTORES), default=list(MOTORES))
+    parser.add_argument('--memoria-duckdb', default='1GB', help="memory_limit do DuckDB (despeja o excedente)")
+    parser.add_argument('--threads-duckdb', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    os.makedirs(PASTA_DADOS, exist_ok=True)
+    falhas = 0
+    print(f"{'Pedidos':>10} {'Motor':<8}{'tempo (s)':>11}{'pico RSS (MB)':>15}  paridade")
+    for pedidos in args.pedidos:
+        caminho_db = gerar_sqlite(os.path.join(PASTA_DADOS, f"olist_motores_{pedidos}.db"), pedidos,
+                                  fracao_datas_br=0.2)
+        referencia = None
+        with tempfile.TemporaryDirectory() as pasta:
+            for motor in ['pandas'] + [m for m in args.motores if m != 'pandas']:
+                opcoes = {}
+                if motor == 'duckdb':
+                    opcoes = {'caminho': os.path.join(pasta, 'olist.duckdb'),
+                              'memoria': args.memoria_duckdb, 'threads': args.threads_duckdb}
+                tempo, pico, resumo = medir_motor(motor, caminho_db, opcoes)
+                if referencia is None:
+                    referencia, situacao = resumo, 'referência'
+                else:
+                    erros = comparar_metricas(referencia, resumo)
+                    falhas += bool(erros)
+                    situacao = 'OK' if not erros else f"{len(erros)} divergências: {erros[:3]}"
+                print(f"{pedidos:>10,} {motor:<8}{tempo:>11.2f}{pico:>15,.0f}  {situacao}")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,87 @@
+import argparse
+import os
+import time
+
+import pandas as pd
+
+from olist_conexao import criar_engine
+from olist_etl import TAMANHO_CHUNK, tratar_chunk
+from olist_paralelo import LimpezaParalela, obter_pool
+from olist_sintetico import gerar_sqlite
+from olist_sql import COLUNAS_DASHBOARD, montar_query_olist
+from olist_tipos import concatenar, nao_convertidas
+
+# --- MICRO-BENCHMARK: LIMPEZA SERIAL x POOL DE PROCESSOS ---
+# Lê uma vez os blocos brutos de uma base sintética (vírgula decimal e 20%
+# das datas em DD/MM/YYYY) e mede a tipagem dos blocos (tratar_chunk):
+#   - serial, no próprio processo (OLIST_PROCESSOS_LIMPEZA=1);
+#   - LimpezaParalela com 1, 2, 4, ... processos (blocos via memória compartilhada).
+# Confere que cada execução paralela devolve exatamente a base serial e as
+# mesmas contagens do relatório de datas, e imprime a curva de speedup.
+# Os processos do pool são iniciados antes da medição (custo único por processo).
+# Uso: python benchmark_paralelo.py --pedidos 200000 --processos 1 2 4 8 16
+
+PASTA_DADOS = os.environ.get('OLIST_BENCH_DIR', '.olist_bench')
+
+
+def ler_blocos(caminho_db, tamanho_chunk):
+    engine = criar_engine(f"sqlite:///{caminho_db}")
+    with engine.connect() as conn:
+        return list(pd.read_sql(montar_query_olist(COLUNAS_DASHBOARD, dialeto=conn.dialect.name), conn, chunksize=tamanho_chunk))
+
+
+def serial(blocos):
+    relatorio = {}
+    return concatenar([tratar_chunk(b.copy(), relatorio=relatorio) for b in blocos]), relatorio
+
+
+def paralelo(blocos, processos):
+    limpeza = LimpezaParalela(tratar_chunk, {}, processos)
+    futuros = [limpeza(b) for b in blocos]
+    return concatenar([f.result() for f in futuros]), limpeza.relatorio
+
+
+def cronometrar(func, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = func()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos), resultado
+
+
+def _contagens(relatorio):
+    return {col: {k: v for k, v in r.items() if k != 'exemplos'} for col, r in relatorio.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tipagem dos blocos: serial x pool de processos")
+    parser.add_argument('--pedidos', type=int, default=200_000)
+    parser.add_argument('--processos', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--tamanho-chunk', type=int, default=TAMANHO_CHUNK)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    os.makedirs(PASTA_DADOS, exist_ok=True)
+    caminho_db = gerar_sqlite(os.path.join(PASTA_DADOS, f"olist_paralelo_{args.pedidos}.db"), args.pedidos,
+                              fracao_datas_br=0.2)
+    blocos = ler_blocos(caminho_db, args.tamanho_chunk)
+    print(f"{args.pedidos:,} pedidos, {sum(map(len, blocos)):,} linhas em {len(blocos)} blocos, "
+          f"{os.cpu_count()} núcleos")
+
+    t_serial, (base, relatorio) = cronometrar(lambda: serial(blocos), args.repeticoes)
+    print(f"{'Processos':>10}{'tempo (s)':>11}{'speedup':>9}{'eficiência':>12}")
+    print(f"{'serial':>10}{t_serial:>11.3f}{1:>9.2f}{1:>12.0%}")
+    for processos in args.processos:
+        # Sobe os processos fora da medição
+        list(obter_pool(processos).map(abs, range(processos)))
+        tempo, (df, rel) = cronometrar(lambda: paralelo(blocos, processos), args.repeticoes)
+        pd.testing.assert_frame_equal(df, base)
+        assert _contagens(rel) == _contagens(relatorio), "relatório de datas diverge do serial"
+        speedup = t_serial / tempo
+        print(f"{processos:>10}{tempo:>11.3f}{speedup:>9.2f}{speedup / processos:>12.0%}")
+    print(f"Bases idênticas ao serial; datas não convertidas: {nao_convertidas(relatorio) or 'nenhuma'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import platform
+import resource
+import subprocess
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from olist_agregados import ABAS_DASHBOARD
+from olist_conexao import criar_engine
+from olist_etl import DATAS, MEDIDAS, ZERAR, construir_base, preparar_base
+from olist_modelo import ESQUEMAS, construir_modelo
+from olist_sintetico import gerar_sqlite
+from olist_sql import (COLUNAS_DASHBOARD, carregar_olist_sql, deduplicar_pagamentos, deduplicar_reviews,
+                       juntar_tabelas, ler_tabelas)
+from olist_tipos import converter_categoricos, converter_datas, converter_numericos
+
+# --- SUÍTE DE BENCHMARK DO PIPELINE (BASE SINTÉTICA 1x / 10x / 100x) ---
+# Gera (uma vez, em cache) bases sintéticas no esquema da Olist em várias
+# escalas e mede cada etapa do pipeline do dashboard final: busca, junção,
+# deduplicação, conversão numérica, datas, derivações, modelo estrela e
+# agregação por aba.
+# Cada grupo de etapas roda em um processo novo, para que o pico de RSS de
+# um não contamine o outro. O resultado vai para um JSON; com --comparar,
+# as etapas mais lentas que o JSON anterior (acima da tolerância) são
+# apontadas como regressão e o código de saída é 1.
+# Uso: python benchmark_pipeline.py --base 10000 --escalas 1 10 100 --saida bench.json [--comparar anterior.json]
+
+PASTA_DADOS = os.environ.get('OLIST_BENCH_DIR', '.olist_bench')
+
+
+def _status_mb(campo):
+    # VmRSS (atual) / VmHWM (pico) do próprio processo, em MB
+    with open('/proc/self/status') as status:
+        for linha in status:
+            if linha.startswith(campo + ':'):
+                return int(linha.split()[1]) / 1024
+    raise KeyError(campo)
+
+
+def _pico_rss_mb():
+    try:
+        return _status_mb('VmHWM')
+    except (OSError, KeyError):
+        # Fora do Linux: ru_maxrss (KB no Linux, bytes no macOS) não zera entre etapas
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _zerar_pico():
+    """Zera o pico de RSS do processo (Linux 4+), para medir o pico de cada etapa."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except OSError:
+        return False
+
+
+class Cronometro:
+    """Tempo e pico de RSS de cada etapa (pico acumulado onde não dá para zerar)."""
+
+    def __init__(self):
+        self.etapas = {}
+
+    def medir(self, nome, funcao):
+        _zerar_pico()
+        rss_antes = _pico_rss_mb()
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempo = time.perf_counter() - inicio
+        pico = _pico_rss_mb()
+        self.etapas[nome] = {
+            'tempo_s': round(tempo, 4),
+            'pico_rss_mb': round(pico, 1),
+            'aumento_pico_mb': round(pico - rss_antes, 1),
+        }
+        return resultado
+
+
+def grupo_referencia(conn, crono):
+    """Caminho antigo: SELECT * das sete tabelas, deduplicação e merges no pandas."""
+    tabelas = crono.medir('busca_tabelas', lambda: ler_tabelas(conn))
+    pagamentos, reviews = crono.medir('deduplicacao', lambda: (
+        deduplicar_pagamentos(tabelas['pg']), deduplicar_reviews(tabelas['r'])))
+    df = crono.medir('juncao', lambda: juntar_tabelas(tabelas, pagamentos, reviews))
+    return len(df)
+
+
+def grupo_pipeline(conn, crono):
+    """Pipeline atual, etapa por etapa sobre a base inteira, e depois fim a fim."""
+    # JOIN e deduplicação no servidor, sem tipagem
+    df = crono.medir('consulta_sql', lambda: carregar_olist_sql(conn, COLUNAS_DASHBOARD))
+    crono.medir('conversao_numerica', lambda: converter_numericos(
+        converter_numericos(df, ZERAR, preencher_zero=True), MEDIDAS))
+    crono.medir('conversao_datas', lambda: converter_datas(df, DATAS))
+    crono.medir('categorias', lambda: converter_categoricos(df))
+    df = crono.medir('derivacoes', lambda: preparar_base(df))
+    modelo = crono.medir('modelo_estrela', lambda: construir_modelo(df, ESQUEMAS['final']))
+    for aba, montar in ABAS_DASHBOARD.items():
+        crono.medir(f'agregacao.{aba}', lambda montar=montar: montar(modelo))
+    linhas = len(df)
+    del df, modelo
+    # Como o dashboard roda: blocos tipados, faixas paralelas e derivações
+    crono.medir('pipeline_completo', lambda: construir_base(conn))
+    return linhas
+
+
+GRUPOS = {'referencia': grupo_referencia, 'pipeline': grupo_pipeline}
+
+
+def _executar_grupo(grupo, caminho_db, fila):
+    # Memória já ocupada pelos imports, antes da primeira etapa
+    pico_inicial = round(_pico_rss_mb(), 1)
+    pico_grupo = pico_inicial
+    engine = criar_engine(f"sqlite:///{caminho_db}")
+    crono = Cronometro()
+    with engine.connect() as conn:
+        linhas = GRUPOS[grupo](conn, crono)
+    engine.dispose()
+    pico_grupo = max([pico_grupo] + [etapa['pico_rss_mb'] for etapa in crono.etapas.values()])
+    fila.put({'linhas': linhas, 'etapas': crono.etapas,
+              'pico_rss_inicial_mb': pico_inicial, 'pico_rss_mb': pico_grupo})
+
+
+def medir(grupo, caminho_db, repeticoes):
+    """Roda o grupo em processos novos; de cada etapa fica a repetição mais rápida."""
+    ctx = mp.get_context('spawn')
+    melhor = None
+    for _ in range(repeticoes):
+        fila = ctx.Queue()
+        proc = ctx.Process(target=_executar_grupo, args=(grupo, caminho_db, fila))
+        proc.start()
+        resultado = fila.get()
+        proc.join()
+        if melhor is None:
+            melhor = resultado
+            continue
+        for nome, etapa in resultado['etapas'].items():
+            if etapa['tempo_s'] < melhor['etapas'][nome]['tempo_s']:
+                melhor['etapas'][nome] = etapa
+    return melhor
+
+
+def _commit_atual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(atual, anterior, tolerancia):
+    """Etapas mais lentas que no JSON anterior além da tolerância (razão de tempos)."""
+    def indexar(dados):
+        return {(r['escala'], r['grupo'], nome): etapa['tempo_s']
+                for r in dados['resultados'] for nome, etapa in r['etapas'].items()}
+
+    antes, depois = indexar(anterior), indexar(atual)
+    regressoes = []
+    for chave in sorted(antes.keys() & depois.keys()):
+        # Etapas muito curtas oscilam demais para comparar por razão
+        if antes[chave] < 0.01:
+            continue
+        razao = depois[chave] / antes[chave]
+        if razao > tolerancia:
+            regressoes.append((*chave, antes[chave], depois[chave], razao))
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo e memória por etapa do pipeline em várias escalas")
+    parser.add_argument('--base', type=int, default=10_000, help="pedidos na escala 1x (dataset público: 99441)")
+    parser.add_argument('--escalas', type=float, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--grupos', nargs='+', choices=list(GRUPOS), default=list(GRUPOS))
+    parser.add_argument('--itens-medio', type=float, default=1.15)
+    parser.add_argument('--pagamentos-extra', type=float, default=0.05)
+    parser.add_argument('--reviews-duplicadas', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeticoes', type=int, default=1)
+    parser.add_argument('--saida', default='benchmark_pipeline.json')
+    parser.add_argument('--comparar', help="JSON de uma execução anterior")
+    parser.add_argument('--tolerancia', type=float, default=1.2)
+    args = parser.parse_args()
+
+    opcoes = {'seed': args.seed, 'itens_medio': args.itens_medio,
+              'pagamentos_extra': args.pagamentos_extra, 'reviews_duplicadas': args.reviews_duplicadas}
+    os.makedirs(PASTA_DADOS, exist_ok=True)
+
+    resultado = {
+        'meta': {
+            'data': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': _commit_atual(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'cpus': os.cpu_count(),
+            'parametros': {'base': args.base, 'repeticoes': args.repeticoes, **opcoes},
+        },
+        'resultados': [],
+    }
+
+    for escala in args.escalas:
+        pedidos = int(args.base * escala)
+        nome_db = f"olist_{pedidos}_{args.seed}_{args.itens_medio}_{args.pagamentos_extra}_{args.reviews_duplicadas}.db"
+        inicio = time.perf_counter()
+        caminho_db = gerar_sqlite(os.path.join(PASTA_DADOS, nome_db), pedidos, **opcoes)
+        print(f"\n== Escala {escala:g}x: {pedidos:,} pedidos (base pronta em {time.perf_counter() - inicio:.1f}s)")
+        for grupo in args.grupos:
+            medida = medir(grupo, caminho_db, args.repeticoes)
+            resultado['resultados'].append({'escala': escala, 'pedidos': pedidos, 'grupo': grupo, **medida})
+            print(f"{grupo} ({medida['linhas']:,} linhas, pico RSS {medida['pico_rss_inicial_mb']:.0f} -> {medida['pico_rss_mb']:.0f} MB)")
+            for nome, etapa in medida['etapas'].items():
+                print(f"  {nome:<28}{etapa['tempo_s']:>10.3f}s{etapa['aumento_pico_mb']:>10.1f} MB")
+
+    with open(args.saida, 'w') as arquivo:
+        json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+    print(f"\nResultados gravados em {args.saida}")
+
+    if args.comparar:
+        with open(args.comparar) as arquivo:
+            regressoes = comparar(resultado, json.load(arquivo), args.tolerancia)
+        if not regressoes:
+            print(f"Sem regressões acima de {args.tolerancia:.2f}x em relação a {args.comparar}.")
+            return 0
+        print(f"Regressões acima de {args.tolerancia:.2f}x em relação a {args.comparar}:")
+        for escala, grupo, nome, antes, depois, razao in regressoes:
+            print(f"  {escala:g}x {grupo}/{nome}: {antes:.3f}s -> {depois:.3f}s ({razao:.2f}x)")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
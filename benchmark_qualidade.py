@@ -0,0 +1,90 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from olist_conexao import criar_engine
+from olist_etl import TAMANHO_CHUNK, ZERAR, tratar_chunk
+from olist_qualidade import REGRAS, aplicar_regras, avaliar, violou
+from olist_sintetico import gerar_sqlite
+from olist_sql import COLUNAS_DASHBOARD, carregar_olist_sql
+from olist_tipos import preencher_categoria
+
+# --- MICRO-BENCHMARK: LIMPEZA AD HOC x REGRAS DE QUALIDADE ---
+# Sobre a base tipada do dashboard final (como chega em preparar_base, com
+# os ausentes ainda ausentes), compara:
+#   - ad hoc: as passadas separadas de antes (fillna(0) nos numéricos, 'Desc'
+#     nas UFs, 'nan' na categoria, comentário vazio -> ausente e o filtro de
+#     prazo entre 0 e 180 dias), sem contar nada;
+#   - regras: aplicar_regras (todas as regras de REGRAS['final'], máscara por
+#     linha e correções).
+# Confere que as colunas corrigidas são as mesmas e que a regra 'prazo_entrega'
+# marca exatamente as linhas que o filtro de 0 a 180 dias descartava.
+# Uso: python benchmark_qualidade.py --pedidos 200000 [--db olist.db]
+
+PASTA_DADOS = os.environ.get('OLIST_BENCH_DIR', '.olist_bench')
+
+
+def ad_hoc(df):
+    for col in ZERAR:
+        df[col] = df[col].fillna(0)
+    df['customer_state'] = preencher_categoria(df['customer_state'], 'Desc')
+    df['seller_state'] = preencher_categoria(df['seller_state'], 'Desc')
+    df['product_category_name'] = preencher_categoria(df['product_category_name'], 'nan')
+    df['review_comment'] = df['review_comment'].replace('', pd.NA)
+    dias = (df['order_delivered_customer_date'] - df['order_approved_at']).dt.days
+    fora_do_prazo = (dias.notna() & ~((dias >= 0) & (dias <= 180))).to_numpy()
+    return df, fora_do_prazo
+
+
+def cronometrar(func, df, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        copia = df.copy()
+        inicio = time.perf_counter()
+        resultado = func(copia)
+        tempos.append(time.perf_counter() - inicio)
+    return resultado, min(tempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Limpeza ad hoc x regras de qualidade declarativas")
+    parser.add_argument('--pedidos', type=int, default=200_000)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--db', default=None, help="SQLite já existente (padrão: base sintética de --pedidos)")
+    args = parser.parse_args()
+
+    caminho_db = args.db
+    if caminho_db is None:
+        os.makedirs(PASTA_DADOS, exist_ok=True)
+        caminho_db = gerar_sqlite(os.path.join(PASTA_DADOS, f"olist_qualidade_{args.pedidos}.db"), args.pedidos)
+    with criar_engine(f"sqlite:///{caminho_db}").connect() as conn:
+        df = carregar_olist_sql(conn, COLUNAS_DASHBOARD, comentario_vazio_como_nulo=False,
+                                tamanho_chunk=TAMANHO_CHUNK, tratar_chunk=tratar_chunk)
+    regras = REGRAS['final']
+    print(f"{len(df):,} linhas, {len(regras)} regras")
+
+    (antigo, fora_do_prazo), t_ad_hoc = cronometrar(ad_hoc, df, args.repeticoes)
+    novo, t_regras = cronometrar(lambda d: aplicar_regras(d, 'final'), df, args.repeticoes)
+    _, t_avaliar = cronometrar(lambda d: avaliar(d, regras), df, args.repeticoes)
+    print(f"{'Caminho':<28}{'tempo (s)':>11}")
+    print(f"{'ad hoc (5 limpezas)':<28}{t_ad_hoc:>11.3f}")
+    print(f"{'regras (avaliar+corrigir)':<28}{t_regras:>11.3f}")
+    print(f"{'  só avaliar (máscara)':<28}{t_avaliar:>11.3f}")
+
+    for col in ZERAR + ['customer_state', 'seller_state', 'product_category_name', 'review_comment']:
+        pd.testing.assert_series_equal(novo[col].astype(object), antigo[col].astype(object), check_names=False,
+                                       obj=col)
+    assert np.array_equal(violou(novo['violacoes'], 'final', 'prazo_entrega'), fora_do_prazo), "prazo_entrega"
+
+    mascara = novo['violacoes'].to_numpy()
+    print(f"\n{'Regra':<26}{'linhas':>10}")
+    for bit, regra in enumerate(regras):
+        print(f"{regra['nome']:<26}{int(((mascara >> bit) & 1).sum()):>10,}")
+    print("\nColunas corrigidas iguais às da limpeza ad hoc; prazo_entrega = filtro de 0 a 180 dias: OK")
+
+
+if __name__ == "__main__":
+    main()
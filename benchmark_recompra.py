@@ -0,0 +1,98 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from olist_derivacoes import marcar_recorrentes
+from olist_recompra import chave_cliente, coortes, intervalos_recompra, pedidos_por_cliente
+
+# --- MICRO-BENCHMARK: RECOMPRA COM PROXY EM TEXTO x CHAVE INT64 ---
+# Base sintética no grão de item (vários itens por pedido, vários pedidos por
+# cliente). Compara as versões anteriores:
+#   - dashboard final: proxy 'CEP_Cidade' em texto + value_counts + isin,
+#     contando ITENS por cliente (pedido com 2 itens virava recompra);
+#   - dashboard v3: groupby(proxy)['order_id'].nunique() + isin;
+# com o motor de olist_recompra (chave int64 + np.unique/bincount, pedidos
+# distintos por cliente). Confere que a marca nova coincide com a do v3 e
+# mede também intervalos entre compras e coortes.
+# Uso: python benchmark_recompra.py --pedidos 1000000
+
+
+def gerar_itens(pedidos, seed=42):
+    rng = np.random.default_rng(seed)
+    n_clientes = int(pedidos * 0.9)
+    cliente = rng.integers(0, n_clientes, pedidos)
+    cidades = np.array([f"cidade_{i}" for i in range(4000)], dtype=object)
+    cep_cliente = rng.integers(1000, 99999, n_clientes)
+    cidade_cliente = cidades[rng.integers(0, len(cidades), n_clientes)]
+    data = np.datetime64('2016-09-01') + rng.integers(0, 2 * 365 * 86400, pedidos).astype('timedelta64[s]')
+    itens = rng.choice([1, 1, 1, 1, 1, 1, 2, 2, 3], pedidos)
+    linha_pedido = np.repeat(np.arange(pedidos), itens)
+    return pd.DataFrame({
+        'order_id': pd.Series(linha_pedido).map('{:08x}'.format).astype('str'),
+        'CEP Prefixo': cep_cliente[cliente][linha_pedido],
+        'Cidade do Cliente': pd.array(cidade_cliente[cliente][linha_pedido], dtype='str'),
+        'Data da Compra': data[linha_pedido],
+    })
+
+
+def antigo_final(df):
+    proxy = df['CEP Prefixo'].astype(str) + "_" + df['Cidade do Cliente']
+    contagem = proxy.value_counts()
+    return proxy.isin(contagem[contagem > 1].index).to_numpy()
+
+
+def antigo_v3(df):
+    proxy = df['CEP Prefixo'].astype(str) + df['Cidade do Cliente']
+    contagem = df.groupby(proxy)['order_id'].nunique()
+    return proxy.isin(contagem[contagem > 1].index).to_numpy()
+
+
+def novo(df):
+    base = df[['order_id']].copy()
+    base['ID Cliente (Proxy)'] = chave_cliente(df['CEP Prefixo'], df['Cidade do Cliente'])
+    return marcar_recorrentes(base)['Cliente Recorrente'].to_numpy()
+
+
+def cronometrar(func, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = func()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos), resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompra: proxy em texto x chave int64")
+    parser.add_argument('--pedidos', type=int, default=1_000_000)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    df = gerar_itens(args.pedidos)
+    print(f"{args.pedidos:,} pedidos, {len(df):,} itens")
+    t_final, marca_final = cronometrar(lambda: antigo_final(df), args.repeticoes)
+    t_v3, marca_v3 = cronometrar(lambda: antigo_v3(df), args.repeticoes)
+    t_novo, marca_nova = cronometrar(lambda: novo(df), args.repeticoes)
+    assert (marca_nova == marca_v3).all(), f"{(marca_nova != marca_v3).sum()} linhas divergentes do v3"
+    print(f"{'Marca de recorrente':<34}{'tempo (s)':>10}")
+    print(f"{'final (texto, conta itens)':<34}{t_final:>10.3f}")
+    print(f"{'v3 (texto, groupby nunique)':<34}{t_v3:>10.3f}")
+    print(f"{'chave int64 + bincount':<34}{t_novo:>10.3f}  ({t_v3 / t_novo:.1f}x sobre o v3)")
+    print(f"Linhas que a versão final marcava a mais (pedido com vários itens): {(marca_final & ~marca_nova).sum():,}")
+
+    # Saídas novas, no grão de pedido
+    pedidos = df.drop_duplicates('order_id')
+    chaves = chave_cliente(pedidos['CEP Prefixo'], pedidos['Cidade do Cliente'])
+    t_int, intervalos = cronometrar(lambda: intervalos_recompra(chaves, pedidos['Data da Compra']), args.repeticoes)
+    t_coo, tabela = cronometrar(lambda: coortes(chaves, pedidos['Data da Compra']), args.repeticoes)
+    clientes, _, contagem = pedidos_por_cliente(chaves)
+    assert len(intervalos) == int((contagem - 1).sum()), "um intervalo por compra após a primeira"
+    assert int(tabela[0].sum()) == len(clientes), "cada cliente em exatamente uma coorte"
+    print(f"intervalos entre compras: {t_int:.3f}s ({len(intervalos):,}, mediana {intervalos.median():.0f} dias)")
+    print(f"coortes: {t_coo:.3f}s ({tabela.shape[0]} coortes x {tabela.shape[1]} meses)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+from olist_derivacoes import status_prazo
+from olist_graficos import dispersao, histograma
+from olist_qualidade import violou
+from olist_recompra import chave_cliente, coortes, intervalos_recompra, pedidos_por_cliente
+from olist_tipos import contar, formatar_categoria, limpar_categorias
+
+# --- CAMADA DE AGREGADOS ---
+# Cada aba renderiza a partir de tabelas-resumo pequenas. Elas são montadas uma
+# vez por versão dos dados (ver modelo.attrs['versao_dados']) e ficam em cache, de
+# modo que um rerun do Streamlit não varre de novo a base item a item.
+# Recebem o modelo estrela (olist_modelo): métricas de pedido (prazo, nota,
+# cliente, pagamento) leem o fato de pedidos, uma linha por pedido, sem
+# drop_duplicates; métricas de produto e vendedor leem o fato de itens.
+# Linhas de dados sujos são separadas pela máscara de regras violadas
+# (coluna 'violacoes', ver olist_qualidade), não por comparações de texto.
+
+
+def _vendas_por_mes(df, col_data, agregacoes):
+    # Agrupa pelo Period (inteiro) e só converte os rótulos dos meses para texto
+    base = df.dropna(subset=[col_data])
+    mes = base[col_data].dt.to_period('M')
+    vendas = base.groupby(mes).agg(**agregacoes)
+    vendas.index = vendas.index.astype(str)
+    return vendas
+
+
+def _logistica(m):
+    ag = {}
+    pedidos = m.pedidos
+    cols = m.colunas
+    if 'Dias para Entrega' in cols:
+        ag['media_dias'] = pedidos['Dias para Entrega'].mean()
+        ag['mediana_dias'] = pedidos['Dias para Entrega'].median()
+        ag['hist_dias'] = histograma(pedidos['Dias para Entrega'], 30)
+    if 'Status do Prazo' in cols:
+        valid_prazos = pedidos['Status do Prazo'].dropna()
+        ag['pct_prazo'] = (valid_prazos == 'No Prazo/Adiantado').mean() * 100 if not valid_prazos.empty else None
+        ag['contagem_prazo'] = contar(pedidos['Status do Prazo']).reset_index()
+        if 'Tipo de Frete' in cols:
+            # O frete é do item (depende do vendedor): atrasos contados por item
+            itens = m.itens_com(['Status do Prazo', 'Tipo de Frete'])
+            ag['atrasos_por_frete'] = contar(itens.loc[itens['Status do Prazo'] == 'Atrasado', 'Tipo de Frete']).reset_index()
+    # Peso/volume x frete: grade de densidade + amostra fixa, no grão de item
+    for medida, chave in [('Peso (g)', 'dispersao_peso_frete'), ('Volume (cm3)', 'dispersao_volume_frete')]:
+        if {medida, 'Valor do Frete'} <= cols:
+            ag[chave] = dispersao(m.itens_com([medida, 'Valor do Frete']), medida, 'Valor do Frete')
+    return ag
+
+
+def _vendas(m):
+    ag = {}
+    if 'Data da Compra' in m.colunas:
+        # No fato de pedidos, Qtd_Pedidos conta pedidos (na base plana contava linhas de item)
+        vendas_mes = _vendas_por_mes(m.pedidos, 'Data da Compra', {
+            'Qtd_Pedidos': ('Status do Pedido', 'count'),
+            'Faturamento': ('Valor do Pedido', 'sum'),
+        })
+        ag['vendas_mes'] = vendas_mes.rename_axis('Mês/Ano').reset_index()
+    return ag
+
+
+def _satisfacao(m):
+    # Uma avaliação por pedido: lê direto o fato de pedidos
+    ag = {}
+    cols = m.colunas
+    if 'Nota de Avaliação' in cols:
+        df_satisfacao = m.pedidos
+        ag['nota_media'] = df_satisfacao['Nota de Avaliação'].mean()
+        if 'Comentário' in cols:
+            # Comentários Válidos / Total de Pedidos
+            ag['pct_comentaram'] = df_satisfacao['Comentário'].notna().sum() / len(df_satisfacao) * 100
+        ag['dist_notas'] = df_satisfacao['Nota de Avaliação'].dropna().value_counts().reset_index()
+        if 'Status do Prazo' in cols:
+            df_prazo_sat = df_satisfacao.dropna(subset=['Status do Prazo', 'Nota de Avaliação'])
+            ag['nota_por_prazo'] = df_prazo_sat.groupby('Status do Prazo', observed=True)['Nota de Avaliação'].mean().reset_index()
+            ag['dist_prazo_nota'] = df_prazo_sat.groupby(['Status do Prazo', 'Nota de Avaliação'], observed=True).size().reset_index(name='Quantidade')
+    return ag
+
+
+def _produtos(m):
+    ag = {}
+    cols = m.colunas
+    if 'Categoria do Produto' in cols:
+        df = m.itens_com([c for c in ['Categoria do Produto', 'Preço Unitário', 'Qtd Fotos', 'Status do Pedido'] if c in cols])
+        df_cat = df[~violou(m.itens['violacoes'], 'final', 'categoria_ausente')]
+        ag['contagem_categorias'] = contar(df_cat['Categoria do Produto'])
+        if 'Preço Unitário' in cols:
+            ag['preco_por_categoria'] = df_cat.groupby('Categoria do Produto', observed=True).agg(
+                Preco_Medio=('Preço Unitário', 'mean'),
+                Vendas=('Status do Pedido', 'count')
+            ).reset_index()
+        if 'Qtd Fotos' in cols:
+            df_fotos = df_cat[df_cat['Qtd Fotos'] > 0]
+            ag['fotos_perf'] = df_fotos.groupby('Qtd Fotos').agg(
+                Vendas=('Status do Pedido', 'count'),
+                Preco_Medio=('Preço Unitário', 'mean')
+            ).reset_index()
+    return ag
+
+
+def _geografia(m):
+    # Clientes contados por pedido; vendedores por item vendido
+    ag = {}
+    cols = m.colunas
+    if 'Estado do Cliente' in cols:
+        ag['top_uf_clientes'] = contar(m.pedidos['Estado do Cliente']).head(10)
+    if 'Estado do Vendedor' in cols:
+        ag['top_uf_vendedores'] = contar(m.itens_com(['Estado do Vendedor'])['Estado do Vendedor']).head(10)
+    return ag
+
+
+def _recompra(m):
+    if 'Tipo de Cliente' not in m.colunas:
+        return {}
+    ag = _coortes_e_intervalos(m.pedidos['ID Cliente (Proxy)'].to_numpy(), m.pedidos['Data da Compra'])
+    recorrente = (m.pedidos['Tipo de Cliente'] == 'Recorrente').to_numpy()
+    if not recorrente.any():
+        return {'recompra': None, **ag}
+    categorias_rec = None
+    if 'Categoria do Produto' in m.colunas:
+        itens = m.itens_com(['Categoria do Produto'])
+        com_categoria = ~violou(m.itens['violacoes'], 'final', 'categoria_ausente')
+        categorias_rec = itens.loc[recorrente[m.itens['pedido'].to_numpy()] & com_categoria, 'Categoria do Produto']
+    return {'recompra': _agregados_recompra(m.pedidos[recorrente], categorias_rec), **ag}
+
+
+def _coortes_e_intervalos(chaves, datas):
+    # Chaves e datas no grão de pedido (ver olist_recompra)
+    intervalos = intervalos_recompra(chaves, datas)
+    return {
+        'coortes': coortes(chaves, datas),
+        'intervalos_recompra': histograma(intervalos, 30),
+        'mediana_intervalo': intervalos.median() if not intervalos.empty else None,
+    }
+
+
+# Aba -> função que monta só os resumos daquela aba
+ABAS_DASHBOARD = {
+    'Logística': _logistica,
+    'Vendas': _vendas,
+    'Satisfação': _satisfacao,
+    'Produtos': _produtos,
+    'Geografia': _geografia,
+    'Recompra': _recompra,
+}
+
+
+def agregados_dashboard(modelo):
+    """Resumos usados pelas abas do dashboard final (projeto_final_SQL_final.py)."""
+    ag = {}
+    for montar in ABAS_DASHBOARD.values():
+        ag.update(montar(modelo))
+    return ag
+
+
+def _agregados_recompra(df_rec, categorias_rec=None):
+    # `df_rec`: pedidos de clientes recorrentes; `categorias_rec`: categoria de cada item desses pedidos (sem as ausentes)
+    cols = df_rec.columns
+    rec = {
+        'clientes': df_rec['ID Cliente (Proxy)'].nunique(),
+        'ticket_medio': df_rec['Valor do Pedido'].mean(),
+        'nota_media': df_rec['Nota de Avaliação'].mean(),
+    }
+    if 'Parcelas' in cols:
+        rec['media_parcelas'] = df_rec['Parcelas'].mean()
+        parcelas_dist = df_rec['Parcelas'].value_counts().sort_index().reset_index()
+        parcelas_dist.columns = ['Parcelas', 'Quantidade']
+        rec['parcelas_dist'] = parcelas_dist
+    if 'Status do Prazo' in cols:
+        prazo_rec = df_rec['Status do Prazo'].dropna()
+        rec['pct_prazo'] = (prazo_rec == 'No Prazo/Adiantado').mean() * 100 if not prazo_rec.empty else None
+    if 'Estado do Cliente' in cols:
+        estados = contar(df_rec['Estado do Cliente'])
+        rec['top_estado'] = estados.index[0]
+        rec['top_estados'] = estados.head(10).reset_index()
+    if 'Tipo de Pagamento' in cols:
+        rec['pagamentos'] = contar(df_rec['Tipo de Pagamento']).reset_index()
+    if categorias_rec is not None:
+        rec['top_categorias'] = contar(categorias_rec).head(5).reset_index()
+    return rec
+
+
+def entrega_limpa_v3(df):
+    """CAMADA 4 (base limpa): pedidos entregues, dias de entrega e os entregues com prazo entre 0 e 180 dias.
+
+    O prazo fora de 0 a 180 dias é a regra 'prazo_entrega' (ver olist_qualidade), lida da máscara do pedido.
+    """
+    entregue = (df['order_status'] == 'delivered').to_numpy()
+    dias = (df['order_delivered_customer_date'] - df['order_approved_at']).dt.days
+    validos = entregue & dias.notna().to_numpy() & ~violou(df['violacoes'], 'v3', 'prazo_entrega')
+    return entregue, dias, validos
+
+
+def _geral_v3(m):
+    ag = {}
+    # Prazo (média, histograma e pizza) e nota no grão de pedido (antes: uma linha por item)
+    df = m.pedidos
+
+    # CAMADA 4: filtro de dados sujos (apenas entregues, prazo entre 0 e 180 dias)
+    entregue, dias, validos = entrega_limpa_v3(df)
+    df_clean_logistics = df[validos]
+    ag['n_sujos'] = int(entregue.sum() - validos.sum())
+    dias_validos = dias[validos]
+    ag['hist_dias'] = histograma(dias_validos, 50)
+
+    # Métricas globais
+    ag['faturamento'] = m.itens['total_payment'].sum()
+    ag['pedidos'] = len(df)
+    ag['prazo_medio'] = dias_validos.mean()
+    ag['nota_media'] = df['review_score'].mean()
+
+    # Logística: status do prazo sobre a base limpa
+    status = status_prazo(df_clean_logistics['order_delivered_customer_date'],
+                          df_clean_logistics['order_estimated_delivery_date'], rotulo_no_prazo='No Prazo')
+    ag['contagem_status_prazo'] = contar(status.rename('status_prazo')).reset_index()
+    return ag
+
+
+def _vendas_v3(m):
+    # Soma de valor e contagem de pedidos por mês (uma linha por pedido)
+    vendas_mes = _vendas_por_mes(m.pedidos, 'order_purchase_timestamp', {
+        'total_payment': ('order_total', 'sum'),
+        'order_id': ('order_id', 'count'),
+    })
+    return {'vendas_mes': vendas_mes.rename_axis('mes_ano').reset_index()}
+
+
+def _satisfacao_v3(m):
+    # Nota e comentários contados por pedido (antes: uma linha por item)
+    df = m.pedidos
+    return {
+        'pct_comentarios': df['review_comment'].notna().mean() * 100,
+        'dist_notas': df['review_score'].value_counts().reset_index(),
+    }
+
+
+def _produtos_v3(m):
+    df = m.itens_com(['product_category_name', 'total_payment', 'price'])
+    df_cat = df.dropna(subset=['product_category_name'])
+    categoria = limpar_categorias(df_cat['product_category_name'], formatar_categoria).rename('Categoria')
+    return {
+        'top_categorias': df_cat.groupby(categoria, observed=True)['total_payment'].sum().nlargest(10).reset_index(),
+        'preco_por_categoria': df_cat.groupby(categoria, observed=True).agg(
+            price=('price', 'mean'),
+            order_id=('price', 'size')
+        ).reset_index(),
+    }
+
+
+def _geografia_v3(m):
+    # Clientes contados por pedido; vendedores por item vendido
+    return {
+        'top_uf_clientes': contar(m.pedidos['customer_state']).head(10),
+        'top_uf_vendedores': contar(m.itens_com(['seller_state'])['seller_state']).head(10),
+    }
+
+
+def _recompra_v3(m):
+    df = m.pedidos
+    if 'customer_zip_code_prefix' not in df.columns or 'customer_city' not in df.columns:
+        return {}
+    # Uma linha por pedido: pedidos por cliente = linhas com a mesma chave
+    chaves = chave_cliente(df['customer_zip_code_prefix'], df['customer_city'])
+    _, codigos, contagem = pedidos_por_cliente(chaves)
+    ag = _coortes_e_intervalos(chaves, df['order_purchase_timestamp'])
+    recorrente = contagem[codigos] > 1
+    if not recorrente.any():
+        return {'recompra': None, **ag}
+    df_rec = df[recorrente]
+    # Ticket por pedido (order_total), não mais pelo total_payment de cada item
+    return {'recompra': {
+        'clientes': int((contagem > 1).sum()),
+        'ticket_medio': df_rec['order_total'].mean(),
+        'pagamentos': contar(df_rec['payment_type']).reset_index(),
+    }, **ag}
+
+
+# Métricas do topo e logística compartilham a base limpa (CAMADA 4)
+ABAS_V3 = {
+    'Geral': _geral_v3,
+    'Vendas': _vendas_v3,
+    'Satisfação': _satisfacao_v3,
+    'Produtos': _produtos_v3,
+    'Geografia': _geografia_v3,
+    'Recompra': _recompra_v3,
+}
+
+
+def agregados_v3(modelo):
+    """Resumos usados pelo dashboard de tratamento avançado (projeto_final_SQL.py)."""
+    ag = {}
+    for montar in ABAS_V3.values():
+        ag.update(montar(modelo))
+    return ag
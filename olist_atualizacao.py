@@ -0,0 +1,85 @@
+import logging
+import threading
+import time
+
+# --- ATUALIZAÇÃO EM SEGUNDO PLANO (STALE-WHILE-REVALIDATE) ---
+# A base fica em um objeto compartilhado por todas as sessões do processo
+# (criado via st.cache_resource). Quando ela passa do intervalo de validade,
+# a sessão que percebe isso apenas dispara a reconstrução em uma thread e
+# continua recebendo a versão anterior; as demais sessões também. Um lock
+# não bloqueante garante uma única reconstrução por vez (single-flight), e a
+# troca é a atribuição de uma referência, atômica para quem lê.
+
+log = logging.getLogger(__name__)
+
+
+class AtualizadorEmSegundoPlano:
+    """Serve a última base carregada e a revalida em segundo plano.
+
+    `carregar()` devolve a base atual (ex.: carregar_com_snapshot); roda fora
+    da thread do Streamlit, então não deve chamar funções `st.*`.
+    `inicial()` (opcional) devolve rapidamente uma versão já existente, como
+    o último snapshot em disco, para que nem a primeira sessão espere a ETL.
+    """
+
+    def __init__(self, carregar, intervalo, inicial=None):
+        self._carregar = carregar
+        self._inicial = inicial
+        self.intervalo = intervalo
+        self._lock = threading.Lock()      # single-flight da reconstrução
+        self._primeira = threading.Lock()  # só a primeira sessão monta a versão inicial
+        self.dados = None
+        self.carregado_em = None
+        self.ultimo_erro = None
+
+    @property
+    def versao(self):
+        return self.dados.attrs.get('versao_dados') if self.dados is not None else None
+
+    def obter(self):
+        """Base atual; dispara a revalidação se ela estiver vencida."""
+        if self.dados is None:
+            self._carregar_primeira()
+        elif time.monotonic() - self.carregado_em >= self.intervalo:
+            self.revalidar()
+        return self.dados
+
+    def revalidar(self):
+        """Dispara a reconstrução em segundo plano; False se já houver uma em curso."""
+        if not self._lock.acquire(blocking=False):
+            return False
+        threading.Thread(target=self._executar, name='olist-atualizacao', daemon=True).start()
+        return True
+
+    def _carregar_primeira(self):
+        with self._primeira:
+            if self.dados is not None:
+                return
+            df = self._inicial() if self._inicial else None
+            if df is not None:
+                # Versão antiga servida já; a validada chega em segundo plano
+                self._trocar(df)
+                self.revalidar()
+                return
+            # Sem nenhuma versão anterior não há o que servir: esta carga bloqueia
+            with self._lock:
+                self._trocar(self._carregar())
+
+    def _executar(self):
+        try:
+            self._trocar(self._carregar())
+            self.ultimo_erro = None
+        except Exception as e:
+            # Mantém a versão anterior; nova tentativa após o próximo intervalo
+            log.exception("Falha na atualização em segundo plano")
+            self.ultimo_erro = e
+            self.carregado_em = time.monotonic()
+        finally:
+            self._lock.release()
+
+    def _trocar(self, df):
+        # Mesma versão: mantém o objeto atual (e os caches derivados dele)
+        nova = df.attrs.get('versao_dados')
+        if self.dados is None or nova is None or nova != self.versao:
+            self.dados = df
+        self.carregado_em = time.monotonic()
@@ -0,0 +1,215 @@
+import glob
+import json
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+
+import pandas as pd
+import pyarrow as pa
+
+from olist_modelo import ESQUEMAS, ModeloEstrela
+from olist_snapshot import PASTA_SNAPSHOT
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem flock, cada processo mantém a própria cópia
+    fcntl = None
+
+# --- MODELO COMPARTILHADO ENTRE PROCESSOS (ARROW + MEMORY MAP) ---
+# Com vários processos do Streamlit na mesma máquina, cada um montava a sua
+# cópia do modelo estrela, e quando os dados mudavam cada um refazia a carga.
+# Aqui cada versão do modelo é publicada uma única vez por máquina, como
+# arquivos Arrow IPC sem compressão (pedidos, itens e cada dimensão), e os
+# processos a anexam por memory map:
+#   - números, códigos e datas viram arrays numpy sobre as páginas do
+#     arquivo, e textos viram ArrowStringArray sobre os mesmos buffers: o
+#     page cache do SO guarda a única cópia; só os códigos dos Categorical e
+#     as colunas booleanas (1 byte por linha) são copiados;
+#   - ausentes ficam como NaN/NaT dentro dos próprios valores (as datas vão
+#     como int64), para que a volta ao pandas não precise de uma cópia;
+#   - um lock exclusivo por conjunto garante uma única carga por máquina: os
+#     outros processos esperam e anexam a versão publicada;
+#   - cada processo com uma versão anexada segura um lock compartilhado no
+#     uso.lock dela (contagem de referências feita pelo SO, liberada quando o
+#     modelo é coletado ou o processo morre). A troca de versão é a troca do
+#     ponteiro <conjunto>.atual; uma versão antiga só é apagada quando
+#     ninguém mais a segura.
+# Os arrays anexados são somente leitura: o modelo não deve ser alterado no
+# lugar (já era a regra, por ser compartilhado entre sessões).
+
+PASTA_COMPARTILHADA = os.environ.get('OLIST_PASTA_COMPARTILHADA', os.path.join(PASTA_SNAPSHOT, 'compartilhado'))
+
+# Desligável com OLIST_COMPARTILHADO=0; sem flock (Windows) fica sempre desligado
+COMPARTILHADO = fcntl is not None and os.environ.get('OLIST_COMPARTILHADO', '1') != '0'
+
+# Publicações interrompidas (diretório .tmp) são removidas depois deste tempo
+IDADE_TEMPORARIOS_S = 3600
+
+_META = b'olist_tipos_colunas'
+
+
+# --- ARQUIVOS ARROW SEM CÓPIA NA LEITURA ---
+
+def _coluna(serie):
+    """Array Arrow da coluna e o tipo usado na volta ao pandas."""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        codigos = serie.cat.codes.to_numpy()
+        categorias = pa.array(serie.cat.categories.to_numpy(dtype=object), from_pandas=True)
+        indices = pa.array(codigos, mask=codigos == -1)
+        return pa.DictionaryArray.from_arrays(indices, categorias, ordered=serie.cat.ordered), 'arrow'
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        # NaT como o próprio inteiro (o Arrow o transformaria em nulo)
+        return pa.array(serie.to_numpy('datetime64[us]').view('int64')), 'data'
+    if pd.api.types.is_bool_dtype(serie) or not pd.api.types.is_numeric_dtype(serie):
+        return pa.array(serie, from_pandas=True), 'arrow'
+    # Numpy direto: NaN continua valor, não vira nulo
+    return pa.array(serie.to_numpy()), 'numero'
+
+
+def gravar_tabela(df, caminho):
+    """Grava o DataFrame como Arrow IPC sem compressão, no formato lido por `ler_tabela`."""
+    colunas = {col: _coluna(df[col]) for col in df.columns}
+    tabela = pa.table({col: array for col, (array, _) in colunas.items()})
+    tabela = tabela.replace_schema_metadata({_META: json.dumps({col: tipo for col, (_, tipo) in colunas.items()})})
+    with pa.OSFile(caminho, 'wb') as arquivo, pa.ipc.new_file(arquivo, tabela.schema) as escritor:
+        escritor.write_table(tabela)
+
+
+def ler_tabela(caminho):
+    """DataFrame sobre o memory map do arquivo (colunas numéricas, datas e textos sem cópia)."""
+    tabela = pa.ipc.open_file(pa.memory_map(caminho)).read_all()
+    tipos = json.loads(tabela.schema.metadata[_META])
+    colunas = {}
+    for col, tipo in tipos.items():
+        dados = tabela.column(col)
+        if tipo == 'numero':
+            colunas[col] = dados.to_numpy()
+        elif tipo == 'data':
+            colunas[col] = dados.to_numpy().view('datetime64[us]')
+        else:
+            colunas[col] = dados.to_pandas()
+    return pd.DataFrame(colunas, copy=False)
+
+
+# --- PUBLICAÇÃO E ANEXAÇÃO ---
+
+def _ponteiro(nome, pasta):
+    return os.path.join(pasta, f"{nome}.atual")
+
+
+def versao_publicada(nome, pasta=None):
+    """Versão atual publicada do conjunto (None se não houver)."""
+    try:
+        with open(_ponteiro(nome, pasta or PASTA_COMPARTILHADA)) as arquivo:
+            return arquivo.read().strip() or None
+    except OSError:
+        return None
+
+
+@contextmanager
+def publicacao_exclusiva(nome, pasta=None):
+    """Lock exclusivo entre processos: uma carga do conjunto por vez na máquina."""
+    pasta = pasta or PASTA_COMPARTILHADA
+    os.makedirs(pasta, exist_ok=True)
+    with open(os.path.join(pasta, f"{nome}.lock"), 'a') as arquivo:
+        fcntl.flock(arquivo, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(arquivo, fcntl.LOCK_UN)
+
+
+def _escrever_atomico(caminho, texto):
+    tmp = f"{caminho}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as arquivo:
+        arquivo.write(texto)
+    os.replace(tmp, caminho)
+
+
+def publicar_modelo(modelo, nome, pasta=None):
+    """Grava a versão do modelo (se ainda não existir), aponta o conjunto para ela e limpa as antigas."""
+    pasta = pasta or PASTA_COMPARTILHADA
+    versao = modelo.attrs['versao_dados']
+    destino = os.path.join(pasta, versao)
+    if not os.path.isdir(destino):
+        tmp = f"{destino}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+        os.makedirs(tmp)
+        try:
+            gravar_tabela(modelo.pedidos, os.path.join(tmp, 'pedidos.arrow'))
+            gravar_tabela(modelo.itens, os.path.join(tmp, 'itens.arrow'))
+            for dim, tabela in modelo.dimensoes.items():
+                gravar_tabela(tabela, os.path.join(tmp, f"dim_{dim}.arrow"))
+            attrs = {k: v for k, v in modelo.attrs.items() if k != 'uso_compartilhado'}
+            _escrever_atomico(os.path.join(tmp, 'meta.json'),
+                              json.dumps({'dimensoes': list(modelo.dimensoes), 'attrs': attrs}, default=str))
+            open(os.path.join(tmp, 'uso.lock'), 'w').close()
+            os.replace(tmp, destino)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+    _escrever_atomico(_ponteiro(nome, pasta), versao)
+    limpar_versoes(nome, pasta)
+    return destino
+
+
+class _Uso:
+    """Lock compartilhado no uso.lock de uma versão, mantido enquanto o objeto existir."""
+
+    _arquivo = None
+
+    def __init__(self, caminho):
+        self._arquivo = open(caminho)
+        fcntl.flock(self._arquivo, fcntl.LOCK_SH)
+
+    def __del__(self):
+        # Fechar o arquivo solta o lock (None se a versão já não existia)
+        if self._arquivo is not None:
+            self._arquivo.close()
+
+
+def anexar_modelo(nome, versao=None, pasta=None):
+    """Modelo da versão publicada (a atual, sem `versao`), sem cópia; None se não estiver publicada."""
+    pasta = pasta or PASTA_COMPARTILHADA
+    versao = versao or versao_publicada(nome, pasta)
+    if versao is None:
+        return None
+    destino = os.path.join(pasta, versao)
+    try:
+        uso = _Uso(os.path.join(destino, 'uso.lock'))
+        with open(os.path.join(destino, 'meta.json')) as arquivo:
+            meta = json.load(arquivo)
+        pedidos = ler_tabela(os.path.join(destino, 'pedidos.arrow'))
+        itens = ler_tabela(os.path.join(destino, 'itens.arrow'))
+        dimensoes = {dim: ler_tabela(os.path.join(destino, f"dim_{dim}.arrow")) for dim in meta['dimensoes']}
+    except OSError:
+        # Versão inexistente ou removida pela limpeza entre o ponteiro e a leitura
+        return None
+    attrs = {**meta['attrs'], 'uso_compartilhado': uso}
+    return ModeloEstrela(pedidos, itens, dimensoes, ESQUEMAS[nome], attrs)
+
+
+def limpar_versoes(nome, pasta=None):
+    """Apaga as versões do conjunto que não são a atual e que nenhum processo tem anexadas."""
+    pasta = pasta or PASTA_COMPARTILHADA
+    atual = versao_publicada(nome, pasta)
+    removidas = []
+    for caminho in glob.glob(os.path.join(pasta, f"{nome}_v*")):
+        if os.path.basename(caminho) == atual or not os.path.isdir(caminho):
+            continue
+        if caminho.endswith('.tmp'):
+            if time.time() - os.path.getmtime(caminho) > IDADE_TEMPORARIOS_S:
+                shutil.rmtree(caminho, ignore_errors=True)
+            continue
+        try:
+            with open(os.path.join(caminho, 'uso.lock')) as arquivo:
+                fcntl.flock(arquivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                shutil.rmtree(caminho, ignore_errors=True)
+                removidas.append(caminho)
+        except BlockingIOError:
+            # Ainda anexada por algum processo: fica para a próxima limpeza
+            continue
+        except OSError:
+            continue
+    return removidas
@@ -0,0 +1,51 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+
+# --- CONEXÃO COM POOL ---
+# Contra um MySQL remoto, a maior parte do tempo de carga é latência de ida e
+# volta. Um único engine com pool (criado uma vez por processo) reaproveita as
+# conexões já abertas, e leituras independentes rodam em paralelo, cada uma em
+# uma conexão do pool. Os parâmetros podem ser ajustados por variável de ambiente.
+
+CONFIG_POOL = {
+    'pool_size': int(os.environ.get('OLIST_POOL_SIZE', 5)),
+    'max_overflow': int(os.environ.get('OLIST_POOL_MAX_OVERFLOW', 5)),
+    # Recicla conexões antes do wait_timeout do servidor derrubá-las
+    'pool_recycle': int(os.environ.get('OLIST_POOL_RECYCLE', 1800)),
+    # Testa a conexão ao retirá-la do pool (descarta as que caíram)
+    'pool_pre_ping': os.environ.get('OLIST_POOL_PRE_PING', '1') != '0',
+}
+
+# Leituras simultâneas por carga (partições da query ou tabelas)
+MAX_PARALELO = int(os.environ.get('OLIST_MAX_PARALELO', 4))
+
+
+def criar_engine(url, **config):
+    """create_engine com pool configurável (CONFIG_POOL, sobrescrito por `config`)."""
+    opcoes = {**CONFIG_POOL, **config}
+    url = make_url(url)
+    # SQLite em memória usa um pool próprio, sem tamanho configurável
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        opcoes = {}
+    return create_engine(url, **opcoes)
+
+
+def ler_em_paralelo(engine, tarefas, max_workers=None):
+    """Executa `tarefas` (nome -> função(conn)) em threads, uma conexão do pool cada.
+
+    Devolve um dict nome -> resultado na ordem de `tarefas`. Uma exceção em
+    qualquer tarefa é propagada.
+    """
+    def executar(funcao):
+        with engine.connect() as conn:
+            return funcao(conn)
+
+    if len(tarefas) <= 1:
+        return {nome: executar(funcao) for nome, funcao in tarefas.items()}
+
+    with ThreadPoolExecutor(max_workers=min(len(tarefas), max_workers or MAX_PARALELO)) as pool:
+        futuros = {nome: pool.submit(executar, funcao) for nome, funcao in tarefas.items()}
+        return {nome: futuro.result() for nome, futuro in futuros.items()}
@@ -0,0 +1,85 @@
+import numpy as np
+
+from olist_recompra import chave_cliente, recorrentes
+from olist_tipos import alinhar_categorias, categorica_binaria, formatar_categoria, limpar_categorias
+
+# --- ENGENHARIA DE NOVAS COLUNAS ---
+# Colunas derivadas do dashboard final. As de `derivar_colunas` dependem só da
+# própria linha e podem ser calculadas sobre um recorte (ex.: o delta de uma
+# atualização incremental); a recorrência depende da base inteira e tem uma
+# função própria que recalcula apenas os clientes afetados.
+# Todas as expressões são vetorizadas (sem df.apply(axis=1)). Ausentes já
+# chegam tratados pelas regras de qualidade (ver olist_qualidade): UF 'Desc'
+# e categoria 'nan'.
+
+
+def status_prazo(entrega_real, entrega_prevista, rotulo_no_prazo='No Prazo/Adiantado', rotulo_atrasado='Atrasado'):
+    """Rótulo de prazo por linha; datas ausentes contam como atraso (NaT <= x é False)."""
+    no_prazo = (entrega_real <= entrega_prevista).to_numpy()
+    return categorica_binaria(no_prazo, rotulo_no_prazo, rotulo_atrasado, entrega_real.index)
+
+
+def tipo_frete(estado_cliente, estado_vendedor):
+    """'Local' quando cliente e vendedor estão no mesmo estado conhecido, senão 'Interestadual'."""
+    local = ((estado_cliente == estado_vendedor) & (estado_cliente != 'Desc')).to_numpy()
+    return categorica_binaria(local, 'Local', 'Interestadual', estado_cliente.index)
+
+
+def derivar_colunas(df):
+    """Q1, Q4, Q6, Q8, proxy de cliente e tratamento de categoria."""
+    # Q1: Dias para Entrega
+    if {'Data Entrega Real', 'Data Aprovação'}.issubset(df.columns):
+        df['Dias para Entrega'] = (df['Data Entrega Real'] - df['Data Aprovação']).dt.days
+
+    # Q4: Status do Prazo
+    if {'Data Entrega Real', 'Data Entrega Prevista'}.issubset(df.columns):
+        df['Entregue no Prazo'] = df['Data Entrega Real'] <= df['Data Entrega Prevista']
+        df['Status do Prazo'] = status_prazo(df['Data Entrega Real'], df['Data Entrega Prevista'])
+
+    # Q6: Volume
+    if {'Comprimento (cm)', 'Altura (cm)', 'Largura (cm)'}.issubset(df.columns):
+        df['Volume (cm3)'] = df['Comprimento (cm)'] * df['Altura (cm)'] * df['Largura (cm)']
+
+    # Q8: Tipo de Frete
+    if {'Estado do Cliente', 'Estado do Vendedor'}.issubset(df.columns):
+        df['Estado do Cliente'], df['Estado do Vendedor'] = alinhar_categorias(df['Estado do Cliente'], df['Estado do Vendedor'])
+        df['Tipo de Frete'] = tipo_frete(df['Estado do Cliente'], df['Estado do Vendedor'])
+
+    # Q9: Proxy de cliente (CEP + Cidade) como chave int64 (ver olist_recompra)
+    if {'CEP Prefixo', 'Cidade do Cliente'}.issubset(df.columns):
+        df['ID Cliente (Proxy)'] = chave_cliente(df['CEP Prefixo'], df['Cidade do Cliente'])
+
+    # Tratamento de Categoria ('nan' da categoria ausente vira 'Nan', fora das abas).
+    # A formatação roda sobre as categorias distintas, não sobre cada linha
+    if 'Categoria do Produto' in df.columns:
+        df['Categoria do Produto'] = limpar_categorias(df['Categoria do Produto'], formatar_categoria)
+
+    return df
+
+
+def _recorrente(chaves, pedidos):
+    # Conta pedidos distintos (não itens) por cliente: uma linha por pedido
+    primeira = ~pedidos.duplicated().to_numpy()
+    return recorrentes(chaves, chaves[primeira])
+
+
+def marcar_recorrentes(df, proxies=None):
+    """Q9: marca clientes (proxy) com mais de um pedido na base.
+
+    Com `proxies`, só as linhas desses clientes são reavaliadas; as contagens
+    dos demais não mudam quando o delta não os contém.
+    """
+    if 'ID Cliente (Proxy)' not in df.columns:
+        return df
+
+    chaves = df['ID Cliente (Proxy)'].to_numpy()
+    if proxies is None:
+        df['Cliente Recorrente'] = _recorrente(chaves, df['order_id'])
+        df['Tipo de Cliente'] = categorica_binaria(df['Cliente Recorrente'], 'Recorrente', 'Novo', df.index)
+        return df
+
+    afetadas = np.isin(chaves, np.asarray(proxies, dtype=chaves.dtype))
+    recorrente = _recorrente(chaves[afetadas], df['order_id'][afetadas])
+    df.loc[afetadas, 'Cliente Recorrente'] = recorrente
+    df.loc[afetadas, 'Tipo de Cliente'] = np.where(recorrente, 'Recorrente', 'Novo')
+    return df
@@ -0,0 +1,373 @@
+import argparse
+import glob
+import logging
+import os
+import pickle
+import sys
+from functools import partial
+
+import olist_paralelo
+from olist_agregados import agregados_dashboard, agregados_v3
+from olist_compartilhado import COMPARTILHADO, anexar_modelo, publicacao_exclusiva, publicar_modelo
+from olist_conexao import MAX_PARALELO, criar_engine
+from olist_derivacoes import derivar_colunas, marcar_recorrentes
+from olist_metricas import etapa, execucao
+from olist_modelo import ESQUEMAS, construir_modelo
+from olist_paralelo import limpeza_em_blocos
+from olist_qualidade import aplicar_regras
+from olist_snapshot import (PASTA_SNAPSHOT, aplicar_delta, calcular_fingerprint, carregar_com_snapshot,
+                            ler_ultimo_snapshot, versao_dados)
+from olist_sql import COLUNAS_DASHBOARD, COLUNAS_V3, carregar_olist_sql
+from olist_tipos import COLUNAS_INTEIRAS, converter_numericos, nao_convertidas, normalizar_datas, tipar_chunk
+
+# --- ETL SEM STREAMLIT ---
+# JOIN, limpeza e engenharia de colunas dos dois dashboards, importáveis por
+# jobs em lote, benchmarks e pela linha de comando. Nada aqui chama `st.*`:
+# erros sobem como exceções e cada interface decide como exibi-los.
+#
+# Uso (job noturno): python olist_etl.py build --url mysql+pymysql://... [--conjunto final v3] [--processos 8]
+# Grava em OLIST_SNAPSHOT_DIR o snapshot Arrow de cada conjunto e seus agregados;
+# com OLIST_SOMENTE_LEITURA=1 os dashboards só leem esses arquivos.
+
+log = logging.getLogger(__name__)
+
+TAMANHO_CHUNK = 50_000
+
+# Dashboards sem acesso ao banco: servem o último build em disco
+SOMENTE_LEITURA = os.environ.get('OLIST_SOMENTE_LEITURA', '0') == '1'
+
+
+# --- DASHBOARD FINAL (projeto_final_SQL_final.py) ---
+# Numéricos com vírgula decimal; ausentes viram 0 pelas regras de qualidade (ver olist_qualidade)
+ZERAR = ['price', 'freight_value', 'product_weight_g', 'product_photos_qty', 'review_score', 'payment_installments']
+MEDIDAS = ['product_length_cm', 'product_height_cm', 'product_width_cm']
+DATAS = ['order_purchase_timestamp', 'order_approved_at',
+         'order_delivered_customer_date', 'order_estimated_delivery_date']
+
+
+# Nomes em português das colunas do banco (também usados na exportação)
+MAPA_COLUNAS = {
+    'order_status': 'Status do Pedido',
+    'order_purchase_timestamp': 'Data da Compra',
+    'order_approved_at': 'Data Aprovação',
+    'order_delivered_customer_date': 'Data Entrega Real',
+    'order_estimated_delivery_date': 'Data Entrega Prevista',
+    'customer_state': 'Estado do Cliente',
+    'seller_state': 'Estado do Vendedor',
+    'total_payment': 'Valor Total',
+    'payment_type': 'Tipo de Pagamento',
+    'payment_installments': 'Parcelas',
+    'review_score': 'Nota de Avaliação',
+    'review_comment': 'Comentário',
+    'product_category_name': 'Categoria do Produto',
+    'product_photos_qty': 'Qtd Fotos',
+    'product_weight_g': 'Peso (g)',
+    'price': 'Preço Unitário',
+    'freight_value': 'Valor do Frete',
+    'product_length_cm': 'Comprimento (cm)',
+    'product_height_cm': 'Altura (cm)',
+    'product_width_cm': 'Largura (cm)',
+    'customer_city': 'Cidade do Cliente',
+    'customer_zip_code_prefix': 'CEP Prefixo'
+}
+
+
+def registrar_datas(df, relatorio):
+    """Guarda nos attrs da base as datas que não puderam ser convertidas (ver normalizar_datas)."""
+    falhas = nao_convertidas(relatorio)
+    df.attrs['datas_nao_convertidas'] = falhas
+    for col, n in falhas.items():
+        log.warning("%s: %d datas não convertidas (ex.: %s)", col, n, relatorio[col]['exemplos'])
+    return df
+
+
+def tratar_chunk(chunk, relatorio=None):
+    """Limpeza e tipagem de cada bloco assim que chega do banco."""
+    # Os ausentes ficam para as regras de qualidade (preparar_base), que os contam antes de zerar
+    return tipar_chunk(chunk, numericos=ZERAR + MEDIDAS, datas=DATAS,
+                       parse_data=partial(normalizar_datas, relatorio=relatorio))
+
+
+def construir_base(conn, desde=None):
+    """Executa o JOIN no servidor e aplica limpeza, tipagem, renomeação e colunas derivadas.
+
+    Com `desde` (marcas d'água), processa apenas os pedidos novos.
+    """
+    # JOIN único no servidor: LEFT JOINs, maior pagamento e primeira review
+    # por pedido resolvidos no SQL, trazendo só as colunas do dashboard.
+    # Leitura em blocos, já tipados e compactados (ver tratar_chunk)
+    # Faixas de order_id lidas em paralelo, cada uma em uma conexão do pool,
+    # e a tipagem de cada bloco em um pool de processos (ver olist_paralelo)
+    relatorio = {}
+    with etapa('consulta_sql') as e:
+        df = e.saida(carregar_olist_sql(conn, COLUNAS_DASHBOARD, comentario_vazio_como_nulo=False, desde=desde,
+                                        tamanho_chunk=TAMANHO_CHUNK,
+                                        tratar_chunk=limpeza_em_blocos(tratar_chunk, relatorio),
+                                        particoes=MAX_PARALELO))
+    with etapa('preparar_base', df) as e:
+        return registrar_datas(e.saida(preparar_base(df)), relatorio)
+
+
+def preparar_base(df):
+    """Regras de qualidade, valor total, renomeação para português e colunas derivadas sobre a base tipada."""
+    # Uma passada marca as violações de cada linha (coluna 'violacoes') e aplica
+    # as correções declaradas: ausentes viram 0, UF 'Desc', categoria 'nan' e
+    # comentário vazio vira ausente. Sem ausentes, as contagens voltam a inteiros mínimos
+    df = aplicar_regras(df, 'final')
+    converter_numericos(df, [col for col in ZERAR if col in COLUNAS_INTEIRAS])
+
+    # Cálculo do Valor Total (Item + Frete), em float64 e arredondado ao centavo
+    df['total_payment'] = (df['price'].astype('float64') + df['freight_value'].astype('float64')).round(2)
+
+    # Renomear colunas para Português
+    df = df.rename(columns=MAPA_COLUNAS)
+
+    # Colunas derivadas (no delta, a recorrência é refeita depois sobre a base toda)
+    df = derivar_colunas(df)
+    df = marcar_recorrentes(df)
+    return df
+
+
+def atualizar_base(conn, df_base, marcas):
+    """Atualização incremental: busca só o delta e recalcula apenas os clientes afetados."""
+    df_delta = construir_base(conn, desde=marcas)
+    if df_delta.empty:
+        return df_base
+    with etapa('aplicar_delta', df_delta) as e:
+        df = e.saida(aplicar_delta(df_base, df_delta))
+    with etapa('recorrencia', df) as e:
+        df = e.saida(marcar_recorrentes(df, df_delta['ID Cliente (Proxy)'].dropna().unique()))
+    # Relatório de datas da última carga (o delta)
+    df.attrs['datas_nao_convertidas'] = df_delta.attrs['datas_nao_convertidas']
+    return df
+
+
+# --- DASHBOARD DE TRATAMENTO AVANÇADO (projeto_final_SQL.py) ---
+def tratar_chunk_v3(chunk, relatorio=None):
+    """Tipagem de cada bloco assim que chega do banco (só blocos compactos ficam em memória)."""
+    # CAMADA 1: datas (ISO e DD/MM/YYYY) | CAMADA 2: valores com vírgula -> float32
+    # (preço e frete ausentes viram 0 nas regras de qualidade, em construir_base_v3)
+    return tipar_chunk(
+        chunk,
+        numericos=['price', 'freight_value', 'review_score', 'payment_installments'],
+        datas=DATAS,
+        parse_data=partial(normalizar_datas, relatorio=relatorio),
+    )
+
+
+def construir_base_v3(conn, desde=None):
+    """JOIN no servidor seguido das camadas de tratamento de datas e valores."""
+    # JOIN único no servidor (pedidos, clientes, itens, produtos, vendedores,
+    # maior pagamento e primeira review por pedido). Com `desde`, só o delta.
+    # A deduplicação (maior pagamento / primeira review) já vem do SQL,
+    # evitando que um pedido de R$100 com 3 parcelas vire R$300
+    # Faixas de order_id lidas em paralelo, cada uma em uma conexão do pool,
+    # e a tipagem de cada bloco em um pool de processos (ver olist_paralelo)
+    relatorio = {}
+    with etapa('consulta_sql') as e:
+        df = e.saida(carregar_olist_sql(conn, COLUNAS_V3, comentario_vazio_como_nulo=False, desde=desde,
+                                        tamanho_chunk=TAMANHO_CHUNK,
+                                        tratar_chunk=limpeza_em_blocos(tratar_chunk_v3, relatorio),
+                                        particoes=MAX_PARALELO))
+
+    # Regras de qualidade: uma passada marca as violações (prazo fora de 0 a 180
+    # dias, a CAMADA 4, entre elas) e zera preço e frete ausentes
+    with etapa('qualidade', df) as e:
+        df = e.saida(aplicar_regras(df, 'v3'))
+
+    # Valor Total da Linha (Item + Frete), em float64 e arredondado ao centavo
+    with etapa('valor_total', df):
+        df['total_payment'] = (df['price'].astype('float64') + df['freight_value'].astype('float64')).round(2)
+
+    return registrar_datas(df, relatorio)
+
+
+def atualizar_base_v3(conn, df_base, marcas):
+    """Atualização incremental: processa só os pedidos novos desde as marcas d'água."""
+    df_delta = construir_base_v3(conn, desde=marcas)
+    with etapa('aplicar_delta', df_delta) as e:
+        df = e.saida(aplicar_delta(df_base, df_delta))
+    # Relatório de datas da última carga (o delta)
+    df.attrs['datas_nao_convertidas'] = df_delta.attrs['datas_nao_convertidas']
+    return df
+
+
+# --- CONJUNTOS ---
+# nome -> (construir(conn, desde), atualizar(conn, df_base, marcas), agregados(modelo))
+# O snapshot guarda a base plana; em memória ela vira o modelo estrela de
+# olist_modelo.ESQUEMAS[nome] (fato de pedidos, fato de itens e dimensões).
+CONJUNTOS = {
+    'final': (construir_base, atualizar_base, agregados_dashboard),
+    'v3': (construir_base_v3, atualizar_base_v3, agregados_v3),
+}
+
+
+def _carregar_base(nome, engine, pasta):
+    if engine is None:
+        with etapa('leitura_snapshot') as e:
+            df = e.saida(ler_ultimo_snapshot(nome, pasta))
+        if df is None:
+            raise FileNotFoundError(
+                f"Nenhum snapshot de '{nome}' em {pasta or PASTA_SNAPSHOT}; rode `python olist_etl.py build`.")
+        return df
+    construir, atualizar, _ = CONJUNTOS[nome]
+    with engine.connect() as conn:
+        return carregar_com_snapshot(conn, nome, construir, pasta, atualizar=atualizar)
+
+
+def carregar_base(nome, engine=None, pasta=None):
+    """Base plana (uma linha por item) do conjunto `nome`.
+
+    Com `engine`, valida o snapshot contra o banco (reconstruindo ou
+    atualizando se preciso). Sem `engine`, usa o último build em disco.
+    Os tempos de cada etapa ficam na execução 'carga_<nome>' (ver olist_metricas).
+    """
+    with execucao(f'carga_{nome}'):
+        return _carregar_base(nome, engine, pasta)
+
+
+def _montar_modelo(nome, engine, pasta):
+    df = _carregar_base(nome, engine, pasta)
+    with etapa('modelo', df) as e:
+        return e.saida(construir_modelo(df, ESQUEMAS[nome]))
+
+
+def carregar_modelo(nome, engine=None, pasta=None):
+    """Como carregar_base, já separada no modelo estrela (ver olist_modelo).
+
+    Com COMPARTILHADO, o modelo é publicado uma vez por máquina e anexado por
+    memory map (ver olist_compartilhado): com `engine`, a versão esperada vem
+    da impressão digital do banco e só um processo faz a carga que falta; sem
+    `engine`, vale a última versão publicada (ou o último snapshot).
+    """
+    with execucao(f'carga_{nome}'):
+        if not COMPARTILHADO:
+            return _montar_modelo(nome, engine, pasta)
+        pasta_compartilhada = os.path.join(pasta, 'compartilhado') if pasta else None
+        versao = None
+        if engine is not None:
+            with engine.connect() as conn, etapa('fingerprint'):
+                versao = versao_dados(nome, calcular_fingerprint(conn))
+        with etapa('anexar_modelo') as e:
+            modelo = e.saida(anexar_modelo(nome, versao, pasta_compartilhada))
+        if modelo is not None:
+            return modelo
+        with publicacao_exclusiva(nome, pasta_compartilhada):
+            # Outro processo pode ter publicado esta versão enquanto este esperava
+            modelo = anexar_modelo(nome, versao, pasta_compartilhada)
+            if modelo is None:
+                construido = _montar_modelo(nome, engine, pasta)
+                with etapa('publicacao', construido):
+                    publicar_modelo(construido, nome, pasta_compartilhada)
+                # A cópia privada é descartada em favor da publicada
+                modelo = anexar_modelo(nome, construido.attrs['versao_dados'], pasta_compartilhada)
+            return modelo
+
+
+def ultimo_modelo(nome, pasta=None):
+    """Modelo do último snapshot em disco, sem consultar o banco (None se não houver)."""
+    if COMPARTILHADO:
+        try:
+            return carregar_modelo(nome, None, pasta)
+        except FileNotFoundError:
+            return None
+    df = ler_ultimo_snapshot(nome, pasta)
+    return None if df is None else construir_modelo(df, ESQUEMAS[nome])
+
+
+# --- AGREGADOS EM DISCO ---
+# Gravados ao lado do snapshot, com a mesma versão dos dados no nome
+
+def caminho_agregados(versao, pasta=None):
+    return os.path.join(pasta or PASTA_SNAPSHOT, f"{versao}_agregados.pkl")
+
+
+def salvar_agregados(ag, nome, versao, pasta=None):
+    """Grava de forma atômica e remove os agregados de versões anteriores do conjunto."""
+    caminho = caminho_agregados(versao, pasta)
+    os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+    tmp = f"{caminho}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as arquivo:
+        pickle.dump(ag, arquivo, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, caminho)
+    for antigo in glob.glob(os.path.join(pasta or PASTA_SNAPSHOT, f"{nome}_v*_agregados.pkl")):
+        if antigo != caminho:
+            try:
+                os.remove(antigo)
+            except OSError:
+                pass
+    return caminho
+
+
+def ler_agregados(versao, pasta=None):
+    """Agregados gravados pelo build para esta versão dos dados (None se não houver)."""
+    if versao is None:
+        return None
+    try:
+        with open(caminho_agregados(versao, pasta), 'rb') as arquivo:
+            return pickle.load(arquivo)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+
+def build(engine, nomes=None, pasta=None):
+    """Prepara os conjuntos (snapshot + agregados) em disco; devolve {nome: versão}."""
+    versoes = {}
+    for nome in nomes or CONJUNTOS:
+        modelo = carregar_modelo(nome, engine, pasta)
+        if modelo.empty:
+            raise RuntimeError(f"O conjunto '{nome}' ficou vazio.")
+        versao = modelo.attrs['versao_dados']
+        if ler_agregados(versao, pasta) is None:
+            with execucao(f'build_{nome}'), etapa('agregados', modelo):
+                salvar_agregados(CONJUNTOS[nome][2](modelo), nome, versao, pasta)
+        versoes[nome] = versao
+    return versoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='olist-etl', description="ETL da base Olist (sem Streamlit)")
+    comandos = parser.add_subparsers(dest='comando', required=True)
+    cmd_build = comandos.add_parser('build', help="grava snapshot e agregados de cada conjunto em disco")
+    cmd_build.add_argument('--url', default=os.environ.get('OLIST_DB_URL'),
+                           help="URL SQLAlchemy do banco (padrão: $OLIST_DB_URL)")
+    cmd_build.add_argument('--conjunto', nargs='+', choices=list(CONJUNTOS), default=list(CONJUNTOS))
+    cmd_build.add_argument('--pasta', default=None, help="pasta de saída (padrão: $OLIST_SNAPSHOT_DIR)")
+    cmd_build.add_argument('--processos', type=int, default=min(os.cpu_count() or 1, 8),
+                           help="processos na tipagem dos blocos (1 = no próprio processo)")
+    cmd_metricas = comandos.add_parser('metricas', help="métricas do dashboard final por motor de execução")
+    cmd_metricas.add_argument('--url', default=os.environ.get('OLIST_DB_URL'),
+                              help="URL SQLAlchemy do banco (padrão: $OLIST_DB_URL)")
+    cmd_metricas.add_argument('--motor', choices=['pandas', 'duckdb'], default='pandas')
+    cmd_metricas.add_argument('--paridade', action='store_true', help="compara o motor com o pandas")
+    args = parser.parse_args(argv)
+
+    if not args.url:
+        parser.error("informe --url ou defina OLIST_DB_URL")
+    engine = criar_engine(args.url)
+    try:
+        if args.comando == 'metricas':
+            return _metricas(engine, args.motor, args.paridade)
+        olist_paralelo.PROCESSOS_LIMPEZA = args.processos
+        for nome, versao in build(engine, args.conjunto, args.pasta).items():
+            print(f"{nome}: {versao}")
+    finally:
+        engine.dispose()
+    return 0
+
+
+def _metricas(engine, motor, paridade):
+    # olist_motor importa este módulo (motor de referência)
+    from olist_motor import calcular_metricas, verificar_paridade
+    with engine.connect() as conn:
+        m = verificar_paridade(conn, motor) if paridade else calcular_metricas(conn, motor)
+    for chave in ['pedidos', 'itens', 'media_dias', 'mediana_dias', 'pct_prazo', 'nota_media', 'pct_comentaram']:
+        print(f"{chave}: {m[chave]}")
+    print(f"recompra: {m['recompra']}")
+    if paridade:
+        print(f"OK: motores pandas e {motor} com as mesmas métricas.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+import gzip
+import tempfile
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from olist_etl import MAPA_COLUNAS
+from olist_modelo import ModeloEstrela
+
+# --- EXPORTAÇÃO EM BLOCOS (CSV.GZ / PARQUET) ---
+# Os dados por trás dos gráficos são exportados sem montar a base plana
+# inteira: as linhas saem do modelo estrela em blocos de TAMANHO_BLOCO (as
+# colunas do pedido e das dimensões são buscadas pelos códigos só para o
+# bloco), e cada bloco é gravado e descartado antes do próximo:
+#   - CSV compactado com gzip, o cabeçalho só no primeiro bloco;
+#   - Parquet, um row group por bloco, com o esquema do primeiro bloco.
+# Sem linhas, sai um único bloco vazio com as colunas pedidas: o CSV fica com o
+# cabeçalho e o Parquet com o esquema (um arquivo de 0 bytes não é Parquet).
+# O destino é um arquivo temporário que fica em memória até LIMITE_MEMORIA e
+# depois vai para o disco, então a memória usada não depende do número de
+# linhas (fica em um bloco + o buffer). O arquivo só é lido, já compactado,
+# quando o usuário clica em baixar (`conteudo`). As colunas saem com os nomes
+# em português de MAPA_COLUNAS (as do dashboard final já estão em português).
+# Nada aqui chama `st.*`: o progresso é informado por uma função opcional.
+
+TAMANHO_BLOCO = 20_000
+
+# Acima disto o arquivo temporário sai da memória e vai para o disco
+LIMITE_MEMORIA = 16 * 2**20
+
+# Formato -> tipo MIME do arquivo
+FORMATOS = {
+    'csv.gz': 'application/gzip',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+# Códigos inteiros do fato de itens e a máscara de regras violadas (não são dados para o analista)
+_CODIGOS = {'pedido', 'produto', 'vendedor', 'violacoes'}
+
+
+def colunas_exportaveis(modelo, grao='itens'):
+    """Colunas do grão, na ordem: pedido, dimensões e itens (sem os códigos internos)."""
+    colunas = [c for c in modelo.pedidos.columns if c not in _CODIGOS]
+    if grao == 'pedidos':
+        return colunas
+    for nome, (chave, cols) in modelo.esquema['dimensoes'].items():
+        if nome in modelo.dimensoes:
+            colunas += [c for c in [chave, *cols] if c in modelo.dimensoes[nome].columns]
+    return colunas + [c for c in modelo.itens.columns if c not in _CODIGOS and c not in colunas]
+
+
+def blocos_modelo(modelo, colunas, grao='itens', tamanho=TAMANHO_BLOCO):
+    """Blocos de linhas do modelo no grão pedido ('pedidos') ou item ('itens'), só com `colunas`."""
+    if grao == 'pedidos':
+        yield from blocos_tabela(modelo.pedidos[colunas], tamanho)
+        return
+    for inicio in range(0, max(len(modelo.itens), 1), tamanho):
+        # Modelo de um bloco de itens: itens_com busca pedido e dimensões só para ele
+        bloco = ModeloEstrela(modelo.pedidos, modelo.itens.iloc[inicio:inicio + tamanho], modelo.dimensoes,
+                              modelo.esquema)
+        yield bloco.itens_com(colunas)
+
+
+def blocos_tabela(df, tamanho=TAMANHO_BLOCO):
+    """Blocos de uma tabela já pronta (ex.: um resumo dos agregados)."""
+    for inicio in range(0, max(len(df), 1), tamanho):
+        yield df.iloc[inicio:inicio + tamanho]
+
+
+def traduzir(df):
+    """Renomeia para português as colunas do banco (sem sobrescrever nomes já existentes)."""
+    # Nomes que não são texto (ex.: centros das faixas de uma densidade) viram texto
+    mapa = {col: MAPA_COLUNAS.get(col, str(col)) for col in df.columns
+            if not isinstance(col, str) or (col in MAPA_COLUNAS and MAPA_COLUNAS[col] not in df.columns)}
+    return df.rename(columns=mapa) if mapa else df
+
+
+def _gravar_csv_gz(blocos, destino, progresso):
+    linhas = 0
+    with gzip.GzipFile(fileobj=destino, mode='wb', mtime=0) as arquivo:
+        for bloco in blocos:
+            arquivo.write(bloco.to_csv(index=False, header=linhas == 0).encode('utf-8'))
+            linhas += len(bloco)
+            progresso(linhas)
+    return linhas
+
+
+def _gravar_parquet(blocos, destino, progresso):
+    linhas = 0
+    escritor = None
+    try:
+        for bloco in blocos:
+            if escritor is None:
+                tabela = pa.Table.from_pandas(bloco, preserve_index=False)
+                escritor = pq.ParquetWriter(destino, tabela.schema, compression='zstd')
+            else:
+                # Mesmo esquema em todos os blocos (um bloco só com ausentes não muda o tipo)
+                tabela = pa.Table.from_pandas(bloco, schema=escritor.schema, preserve_index=False)
+            escritor.write_table(tabela)
+            linhas += len(bloco)
+            progresso(linhas)
+    finally:
+        if escritor is not None:
+            escritor.close()
+    return linhas
+
+
+def exportar(blocos, formato, progresso=None):
+    """Grava os blocos no `formato` (ver FORMATOS) e devolve o arquivo temporário, no início.
+
+    `progresso(linhas)` é chamada após cada bloco com o total de linhas gravadas.
+    """
+    gravar = {'csv.gz': _gravar_csv_gz, 'parquet': _gravar_parquet}[formato]
+    destino = tempfile.SpooledTemporaryFile(max_size=LIMITE_MEMORIA, suffix=f".{formato}")
+    try:
+        gravar((traduzir(bloco) for bloco in blocos), destino, progresso or (lambda linhas: None))
+    except BaseException:
+        destino.close()
+        raise
+    destino.seek(0)
+    return destino
+
+
+def conteudo(arquivo):
+    """Bytes do arquivo exportado, do início (para downloads adiados, que o leem só no clique)."""
+    arquivo.seek(0)
+    return arquivo.read()
+
+
+def tabelas_resumo(ag):
+    """Tabelas (DataFrame/Series) de um dicionário de agregados, inclusive os aninhados (ex.: recompra)."""
+    tabelas = {}
+    for chave, valor in ag.items():
+        if isinstance(valor, dict):
+            tabelas.update({f"{chave}.{nome}": tabela for nome, tabela in tabelas_resumo(valor).items()})
+        elif isinstance(valor, pd.Series):
+            tabelas[chave] = valor.reset_index()
+        elif isinstance(valor, pd.DataFrame):
+            tabelas[chave] = valor if isinstance(valor.index, pd.RangeIndex) else valor.reset_index()
+    return tabelas
@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+
+# --- FILTROS INDEXADOS ---
+# Os filtros da barra lateral (período, UF, categoria, status) não varrem a base
+# a cada mudança de widget. Uma vez por versão dos dados são montados:
+#   - a coluna de data em int64 ordenada (período = duas buscas binárias);
+#   - para cada dimensão categórica, as posições das linhas agrupadas por
+#     categoria (categoria -> fatia contígua de posições);
+#   - a máscara de regras de qualidade violadas por linha (ver olist_qualidade),
+#     para excluir as linhas de uma regra com um AND de inteiros.
+# Um filtro começa pelo conjunto de posições mais seletivo e só confere as
+# demais condições nessas posições, com custo proporcional ao resultado.
+
+NAT = np.iinfo('int64').min
+
+
+def _datas_int64(serie):
+    return serie.to_numpy(dtype='datetime64[ns]').view('int64')
+
+
+def construir_indices(df, col_data, colunas, violacoes=None):
+    """Índices de filtro sobre a ordem atual das linhas de `df` (`violacoes`: máscara por linha)."""
+    valores = _datas_int64(df[col_data])
+    ordem = np.argsort(valores, kind='stable')
+    indices = {
+        'n': len(df),
+        'data': {'coluna': col_data, 'valores': valores, 'ordem': ordem, 'ordenados': valores[ordem]},
+        'categorias': {},
+        'violacoes': None if violacoes is None else np.asarray(violacoes),
+    }
+    for col in colunas:
+        if col not in df.columns:
+            continue
+        serie = df[col]
+        if not isinstance(serie.dtype, pd.CategoricalDtype):
+            serie = serie.astype('category')
+        codigos = serie.cat.codes.to_numpy()
+        ordem = np.argsort(codigos, kind='stable')
+        # limites[c]:limites[c + 1] = fatia de `ordem` com as linhas da categoria c
+        limites = np.searchsorted(codigos[ordem], np.arange(len(serie.cat.categories) + 1))
+        indices['categorias'][col] = {
+            'categorias': serie.cat.categories,
+            'codigos': codigos,
+            'ordem': ordem,
+            'limites': limites,
+        }
+    return indices
+
+
+def periodo_disponivel(indices):
+    """(primeira, última) data da base, ignorando ausentes."""
+    ordenados = indices['data']['ordenados']
+    validos = ordenados[ordenados != NAT]
+    if validos.size == 0:
+        return None
+    return pd.Timestamp(validos[0]), pd.Timestamp(validos[-1])
+
+
+def opcoes(indices, coluna):
+    """Categorias com pelo menos uma linha, para os widgets de seleção."""
+    idx = indices['categorias'][coluna]
+    presentes = np.diff(idx['limites']) > 0
+    return list(idx['categorias'][presentes])
+
+
+def _intervalo(inicio, fim):
+    # Período por dia, fim inclusivo: [inicio, fim + 1 dia)
+    ini = pd.Timestamp(inicio).normalize().as_unit('ns').value
+    fim = (pd.Timestamp(fim).normalize() + pd.Timedelta(days=1)).as_unit('ns').value
+    return ini, fim
+
+
+def posicoes_filtradas(indices, periodo=None, selecoes=None, excluir=0):
+    """Posições (ordenadas) das linhas que passam em todos os filtros.
+
+    `periodo` é (inicio, fim) em datas; `selecoes` mapeia coluna -> valores
+    aceitos (lista vazia = sem filtro); `excluir` são os bits das regras de
+    qualidade cujas linhas violadas saem (ver olist_qualidade.bits). Devolve
+    None quando nenhum filtro está ativo, para que o chamador use a base
+    inteira sem cópia.
+    """
+    candidatos = []
+
+    if periodo is not None:
+        ini, fim = _intervalo(*periodo)
+        dados = indices['data']
+        a, b = np.searchsorted(dados['ordenados'], [ini, fim], side='left')
+        valores = dados['valores']
+        candidatos.append((dados['ordem'][a:b], lambda pos, v=valores: (v[pos] >= ini) & (v[pos] < fim)))
+
+    for col, aceitos in (selecoes or {}).items():
+        if not aceitos:
+            continue
+        idx = indices['categorias'][col]
+        codigos_aceitos = idx['categorias'].get_indexer(list(aceitos))
+        codigos_aceitos = codigos_aceitos[codigos_aceitos >= 0]
+        posicoes = np.concatenate([idx['ordem'][idx['limites'][c]:idx['limites'][c + 1]] for c in codigos_aceitos]
+                                  or [np.empty(0, dtype=np.intp)])
+        # Tabela de consulta por código; a posição extra no fim absorve o código -1 (ausente)
+        permitido = np.zeros(len(idx['categorias']) + 1, dtype=bool)
+        permitido[codigos_aceitos] = True
+        candidatos.append((posicoes, lambda pos, c=idx['codigos'], p=permitido: p[c[pos]]))
+
+    if excluir and indices['violacoes'] is not None:
+        mascara = indices['violacoes']
+        candidatos.append((np.flatnonzero((mascara & excluir) == 0), lambda pos, m=mascara: (m[pos] & excluir) == 0))
+
+    if not candidatos:
+        return None
+
+    candidatos.sort(key=lambda item: len(item[0]))
+    posicoes = candidatos[0][0]
+    for _, conferir in candidatos[1:]:
+        if posicoes.size == 0:
+            break
+        posicoes = posicoes[conferir(posicoes)]
+    return np.sort(posicoes)
+
@@ -0,0 +1,173 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# --- DADOS DOS GRÁFICOS (PRÉ-AGREGADOS) ---
+# Histogramas e dispersões não mandam as linhas brutas para o Plotly: o
+# navegador recebia uma linha por pedido/item a cada rerun, e a dispersão
+# sorteava uma amostra nova a cada vez (gráfico instável). Aqui ficam:
+#   - histograma: contagem por faixa, pronta para um gráfico de barras;
+#   - dispersao: contagem por célula de uma grade (heatmap) e, por cima, uma
+#     amostra_estratificada: posições sorteadas com semente fixa, na
+#     proporção de cada célula e com pelo menos uma linha por célula.
+# Os resultados entram nos agregados (olist_agregados), então são montados uma
+# vez por versão dos dados e combinação de filtros, e o tamanho enviado ao
+# navegador depende do número de faixas, não do número de linhas.
+
+SEMENTE = 42
+PONTOS_AMOSTRA = 2000
+FAIXAS_2D = 40
+
+
+def histograma(serie, faixas):
+    """Contagem por faixa de valores: colunas inicio, fim, centro e contagem."""
+    valores = serie.dropna().to_numpy(dtype='float64')
+    if not len(valores):
+        return pd.DataFrame({'inicio': [], 'fim': [], 'centro': [], 'contagem': []})
+    contagem, bordas = np.histogram(valores, bins=faixas)
+    return pd.DataFrame({
+        'inicio': bordas[:-1],
+        'fim': bordas[1:],
+        'centro': (bordas[:-1] + bordas[1:]) / 2,
+        'contagem': contagem,
+    })
+
+
+def _celulas(x, y, faixas):
+    # Célula da grade de cada ponto (índice linear) e os centros das faixas
+    bordas_x = np.histogram_bin_edges(x, bins=faixas)
+    bordas_y = np.histogram_bin_edges(y, bins=faixas)
+    # A borda final é inclusiva, como em np.histogram
+    ix = np.clip(np.searchsorted(bordas_x, x, side='right') - 1, 0, faixas - 1)
+    iy = np.clip(np.searchsorted(bordas_y, y, side='right') - 1, 0, faixas - 1)
+    centros_x = (bordas_x[:-1] + bordas_x[1:]) / 2
+    centros_y = (bordas_y[:-1] + bordas_y[1:]) / 2
+    return iy * faixas + ix, centros_x, centros_y
+
+
+def _densidade(x, y, faixas, nome_x, nome_y):
+    celulas, centros_x, centros_y = _celulas(x, y, faixas)
+    contagem = np.bincount(celulas, minlength=faixas * faixas).reshape(faixas, faixas)
+    return celulas, pd.DataFrame(contagem, index=pd.Index(centros_y, name=nome_y),
+                                 columns=pd.Index(centros_x, name=nome_x))
+
+
+def amostra_estratificada(estratos, n, semente=SEMENTE):
+    """Posições (ordenadas) de cerca de `n` linhas, proporcional a cada estrato.
+
+    `estratos` são códigos inteiros >= 0. Todo estrato não vazio contribui com
+    pelo menos uma linha, para que regiões raras (outliers) continuem visíveis.
+    A mesma entrada e semente devolvem sempre a mesma amostra.
+    """
+    estratos = np.asarray(estratos)
+    total = len(estratos)
+    if total <= n:
+        return np.arange(total)
+    # Sorteio de Bernoulli por linha (sem ordenar a base): cada estrato entra
+    # com a taxa global ou com a taxa que lhe dá um ponto esperado, a maior
+    tamanhos = np.bincount(estratos)
+    taxas = np.maximum(n / total, 1 / np.maximum(tamanhos, 1))
+    manter = np.random.default_rng(semente).random(total) < taxas[estratos]
+    # Estratos que ficaram sem ponto entram com a primeira linha
+    vazios = (tamanhos > 0) & (np.bincount(estratos[manter], minlength=len(tamanhos)) == 0)
+    if vazios.any():
+        primeiras = np.full(len(tamanhos), total, dtype=np.int64)
+        np.minimum.at(primeiras, estratos, np.arange(total))
+        manter[primeiras[vazios]] = True
+    return np.flatnonzero(manter)
+
+
+def dispersao(df, x, y, faixas=FAIXAS_2D, pontos=PONTOS_AMOSTRA, semente=SEMENTE):
+    """Densidade em grade e amostra estratificada pela grade dos pontos com x > 0 e y > 0.
+
+    Devolve None quando não há pontos válidos.
+    """
+    validos = df[(df[x] > 0) & (df[y] > 0)]
+    if validos.empty:
+        return None
+    celulas, densidade = _densidade(validos[x].to_numpy(dtype='float64'), validos[y].to_numpy(dtype='float64'),
+                                    faixas, x, y)
+    amostra = validos.iloc[amostra_estratificada(celulas, pontos, semente)][[x, y]].reset_index(drop=True)
+    return {'densidade': densidade, 'amostra': amostra, 'pontos': len(validos)}
+
+
+# --- FIGURAS ---
+# plotly só é importado pelos dashboards (o ETL em lote não precisa dele)
+
+def figura_histograma(hist, titulo, rotulo_x):
+    """Barras contíguas a partir da saída de `histograma`."""
+    import plotly.express as px
+    fig = px.bar(hist, x='centro', y='contagem', title=titulo, labels={'centro': rotulo_x, 'contagem': 'Quantidade'})
+    fig.update_traces(width=(hist['fim'] - hist['inicio']).to_numpy())
+    fig.update_layout(bargap=0)
+    return fig
+
+
+def figura_dispersao(disp, titulo):
+    """Heatmap da densidade com os pontos da amostra estratificada por cima."""
+    import plotly.express as px
+    densidade, amostra = disp['densidade'], disp['amostra']
+    x, y = densidade.columns.name, densidade.index.name
+    fig = px.imshow(densidade, origin='lower', aspect='auto', color_continuous_scale='Blues',
+                    labels={'x': x, 'y': y, 'color': 'Itens'}, title=titulo)
+    fig.add_scatter(x=amostra[x], y=amostra[y], mode='markers', name='Amostra',
+                    marker={'size': 3, 'color': 'black', 'opacity': 0.4})
+    return fig
+
+
+
+def figura_coortes(retencao, titulo):
+    """Heatmap de % de clientes ativos por coorte x meses desde a 1ª compra."""
+    import plotly.express as px
+    fig = px.imshow(retencao, aspect='auto', color_continuous_scale='Greens', text_auto='.0f', title=titulo,
+                    labels={'color': '% ativos'})
+    fig.update_yaxes(type='category')
+    return fig
+
+# --- CACHE DE FIGURAS ---
+# Montar uma figura no plotly express custa dezenas de ms, e a página monta
+# cerca de 20 por rerun mesmo quando nem os dados nem os filtros mudaram. As
+# figuras prontas ficam em um LRU limitado, compartilhado entre sessões, por
+# (versão dos dados, filtros, gráfico). Guarda o objeto Figure, e não o JSON:
+# o st.plotly_chart valida e serializa a figura de qualquer forma, e recriar
+# a Figure a partir do JSON custaria quase o mesmo que montá-la de novo.
+# As figuras do cache não devem ser alteradas depois de montadas.
+
+class CacheFiguras:
+    """LRU de figuras prontas, com contagem de acertos e faltas."""
+
+    def __init__(self, max_entradas=256):
+        self.max_entradas = max_entradas
+        self._figuras = OrderedDict()
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.faltas = 0
+        self.descartes = 0
+
+    def obter(self, chave, montar):
+        """Figura de `chave`; na falta, `montar()` roda fora do lock e o resultado é guardado."""
+        with self._lock:
+            fig = self._figuras.get(chave)
+            if fig is not None:
+                self._figuras.move_to_end(chave)
+                self.acertos += 1
+                return fig
+            self.faltas += 1
+        fig = montar()
+        with self._lock:
+            self._figuras[chave] = fig
+            self._figuras.move_to_end(chave)
+            while len(self._figuras) > self.max_entradas:
+                self._figuras.popitem(last=False)
+                self.descartes += 1
+        return fig
+
+    def taxa_acerto(self):
+        total = self.acertos + self.faltas
+        return self.acertos / total if total else None
+
+    def estatisticas(self):
+        return {'entradas': len(self._figuras), 'max_entradas': self.max_entradas, 'acertos': self.acertos,
+                'faltas': self.faltas, 'descartes': self.descartes, 'taxa_acerto': self.taxa_acerto()}
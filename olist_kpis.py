@@ -0,0 +1,317 @@
+import numpy as np
+import pandas as pd
+
+from olist_agregados import entrega_limpa_v3
+
+# --- KPIs POR SKETCHES COMBINÁVEIS ---
+# Os números do topo (prazo médio/mediano, % no prazo, nota média, %
+# comentaram, ticket médio, faturamento) eram recalculados varrendo a base
+# filtrada a cada rerun. Aqui eles saem de resumos pequenos, montados uma vez
+# por versão dos dados e por partição mês x UF do cliente x categoria:
+#   - momentos (contagens e somas): médias e taxas são razões de somas, e a
+#     soma das partições selecionadas é exata;
+#   - t-digest (centróides média/peso, escala k1) para os quantis dos dias de
+#     entrega: enquanto a seleção tiver até COMPRESSAO valores distintos os
+#     centróides são os próprios valores com a contagem, e o quantil é exato
+#     (os dias são inteiros, então é o caso comum). Acima disso os centróides
+#     são agrupados e cada um cobre no máximo uma fração 2π·√(q(1−q))/COMPRESSAO
+#     do total: o erro de posto fica em ~0,6% na mediana e menos nas caudas.
+#     Como em todo t-digest, após várias fusões o limite é por construção, não
+#     garantido; benchmark_kpis.py mede o erro real contra o cálculo exato.
+# Grãos e filtros (a mesma semântica de filtrar_modelo):
+#   - medidas do pedido (contagens, prazos, notas) ficam na partição mês x UF
+#     x conjunto de categorias do pedido: um filtro de categorias junta os
+#     conjuntos que tocam as categorias escolhidas, sem contar duas vezes o
+#     pedido com itens de categorias diferentes;
+#   - somas de valores (faturamento, ticket) ficam no grão de item, por
+#     categoria do item, como os totais refeitos do pedido filtrado.
+# Só os filtros de período (em meses inteiros), UF do cliente e categoria são
+# respondidos pelos sketches; outros filtros usam o cálculo exato.
+
+COMPRESSAO = 500
+
+
+# --- T-DIGEST (VETORIZADO) ---
+
+def _comprimir(medias, pesos, compressao=COMPRESSAO):
+    """Agrupa centróides ordenados pela escala k1 (≤ compressao/2 + 1 centróides)."""
+    inicio = (np.cumsum(pesos) - pesos) / pesos.sum()
+    k = compressao / (2 * np.pi) * np.arcsin(np.clip(2 * inicio - 1, -1, 1))
+    grupos = np.floor(k - k[0]).astype(np.int64)
+    novos_pesos = np.bincount(grupos, weights=pesos)
+    somas = np.bincount(grupos, weights=medias * pesos)
+    usados = novos_pesos > 0
+    return somas[usados] / novos_pesos[usados], novos_pesos[usados]
+
+
+def _reduzir(particoes, medias, pesos, compressao=COMPRESSAO):
+    """Centróides por partição: junta valores iguais e comprime as partições grandes.
+
+    Devolve (particoes, medias, pesos) ordenados por partição e média.
+    """
+    ordem = np.lexsort((medias, particoes))
+    particoes, medias, pesos = particoes[ordem], medias[ordem], pesos[ordem]
+    novo = np.ones(len(medias), dtype=bool)
+    novo[1:] = (particoes[1:] != particoes[:-1]) | (medias[1:] != medias[:-1])
+    grupos = np.cumsum(novo) - 1
+    particoes, medias = particoes[novo], medias[novo]
+    pesos = np.bincount(grupos, weights=pesos)
+
+    limites = np.flatnonzero(np.r_[True, particoes[1:] != particoes[:-1], True])
+    grandes = np.flatnonzero(np.diff(limites) > compressao)
+    if not grandes.size:
+        return particoes, medias, pesos
+    # Só as partições acima do limite passam pela compressão (poucas)
+    partes, inicio = [], 0
+    for g in grandes:
+        a, b = limites[g], limites[g + 1]
+        partes.append((particoes[inicio:a], medias[inicio:a], pesos[inicio:a]))
+        m, p = _comprimir(medias[a:b], pesos[a:b], compressao)
+        partes.append((np.full(len(m), particoes[a]), m, p))
+        inicio = b
+    partes.append((particoes[inicio:], medias[inicio:], pesos[inicio:]))
+    return tuple(np.concatenate(cols) for cols in zip(*partes))
+
+
+def quantil(digest, q):
+    """Quantil `q` (0 a 1) como pandas (interpolação linear entre postos); NaN se vazio."""
+    medias, pesos = digest
+    n = pesos.sum()
+    if n == 0:
+        return np.nan
+    acumulado = np.cumsum(pesos)
+    posicao = q * (n - 1)
+    baixo, alto = np.floor(posicao), np.ceil(posicao)
+    # Valor da observação de posto j (0-based): centróide cujo acumulado passa de j
+    v_baixo, v_alto = medias[np.searchsorted(acumulado, [baixo, alto], side='right')]
+    return v_baixo + (v_alto - v_baixo) * (posicao - baixo)
+
+
+# --- PARTIÇÕES ---
+
+def _codigos(serie):
+    codigos, rotulos = pd.factorize(serie, use_na_sentinel=True)
+    return codigos.astype(np.int64), np.asarray(rotulos, dtype=object)
+
+
+def _particionar(*codigos):
+    """Id de partição por linha e os códigos de cada partição (−1 = ausente)."""
+    chave = np.zeros(len(codigos[0]), dtype=np.int64)
+    for c in codigos:
+        chave = chave * (int(c.max(initial=-1)) + 2) + (c + 1)
+    unicas, ids = np.unique(chave, return_inverse=True)
+    primeiras = np.full(len(unicas), len(chave), dtype=np.int64)
+    np.minimum.at(primeiras, ids, np.arange(len(chave)))
+    return ids, [c[primeiras] for c in codigos]
+
+
+def _rotulos(codigos, rotulos):
+    # O código −1 cai na posição extra do fim (None)
+    return np.append(rotulos, None)[codigos]
+
+
+def _combinacoes(pedido, categorias, n_pedidos):
+    """Conjunto de categorias de cada pedido: código por pedido e o conjunto de cada código."""
+    validos = categorias >= 0
+    n_cat = int(categorias.max(initial=0)) + 1
+    # Pares (pedido, categoria) distintos, ordenados por pedido
+    pares = np.unique(pedido[validos] * n_cat + categorias[validos])
+    pares_pedido, pares_cat = pares // n_cat, pares % n_cat
+    qtd = np.bincount(pares_pedido, minlength=n_pedidos)
+    # Pedido de uma categoria só: o código é o da própria categoria
+    combinacao = np.full(n_pedidos, -1, dtype=np.int64)
+    unica = qtd[pares_pedido] == 1
+    combinacao[pares_pedido[unica]] = pares_cat[unica]
+    conjuntos = [frozenset([c]) for c in range(n_cat)]
+    # Pedidos com várias categorias (poucos): um código por conjunto distinto
+    varios = pares_pedido[~unica]
+    if varios.size:
+        limites = np.flatnonzero(np.r_[True, varios[1:] != varios[:-1], True])
+        cats = pares_cat[~unica]
+        por_conjunto = {}
+        for a, b in zip(limites[:-1], limites[1:]):
+            conjunto = frozenset(cats[a:b].tolist())
+            combinacao[varios[a]] = por_conjunto.setdefault(conjunto, n_cat + len(por_conjunto))
+        conjuntos.extend(por_conjunto)
+    return combinacao, conjuntos
+
+
+def _grao(ids, chaves, momentos, digests):
+    """Sketches de um grão: chaves por partição, momentos somados e centróides."""
+    chaves = pd.DataFrame(chaves)
+    n = len(chaves)
+    tabela = {nome: np.bincount(ids, weights=np.nan_to_num(valores), minlength=n) for nome, valores in momentos.items()}
+    centroides = {}
+    for nome, valores in digests.items():
+        valores = np.asarray(valores, dtype='float64')
+        ok = ~np.isnan(valores)
+        centroides[nome] = _reduzir(ids[ok], valores[ok], np.ones(ok.sum()))
+    return {'chaves': chaves, 'momentos': pd.DataFrame(tabela), 'digests': centroides}
+
+
+def construir_sketches(pedidos, itens, col_data, col_uf, col_categoria, momentos_pedido, digests_pedido,
+                       momentos_item):
+    """Sketches por mês x UF x categoria.
+
+    `pedidos`: DataFrame no grão de pedido com `col_data` e `col_uf`.
+    `itens`: DataFrame no grão de item com 'pedido' (código do pedido) e `col_categoria`.
+    `momentos_pedido`/`momentos_item`: nome -> valores somados por partição
+    (NaN conta como 0); `digests_pedido`: nome -> valores dos quantis (NaN ignorado).
+    """
+    mes, meses = _codigos(pedidos[col_data].dt.to_period('M').astype(str).where(pedidos[col_data].notna()))
+    uf, ufs = _codigos(pedidos[col_uf])
+    cod_pedido = itens['pedido'].to_numpy().astype(np.int64)
+    categoria, categorias = _codigos(itens[col_categoria])
+
+    combinacao, conjuntos = _combinacoes(cod_pedido, categoria, len(pedidos))
+    ids, (p_mes, p_uf, p_comb) = _particionar(mes, uf, combinacao)
+    nomes_conjuntos = np.array([frozenset(categorias[list(c)]) for c in conjuntos] + [frozenset()], dtype=object)
+    grao_pedido = _grao(ids, {
+        'mes': _rotulos(p_mes, meses), 'uf': _rotulos(p_uf, ufs), 'categorias': nomes_conjuntos[p_comb],
+    }, momentos_pedido, digests_pedido)
+
+    ids, (i_mes, i_uf, i_cat) = _particionar(mes[cod_pedido], uf[cod_pedido], categoria)
+    grao_item = _grao(ids, {
+        'mes': _rotulos(i_mes, meses), 'uf': _rotulos(i_uf, ufs), 'categoria': _rotulos(i_cat, categorias),
+    }, momentos_item, {})
+    return {'pedidos': grao_pedido, 'itens': grao_item}
+
+
+def _juntar_grao(a, b):
+    chaves = pd.concat([a['chaves'], b['chaves']], ignore_index=True)
+    ids = chaves.groupby(list(chaves.columns), dropna=False, sort=False).ngroup().to_numpy()
+    n = int(ids.max()) + 1 if len(ids) else 0
+    primeiras = np.full(n, len(ids), dtype=np.int64)
+    np.minimum.at(primeiras, ids, np.arange(len(ids)))
+    momentos = pd.concat([a['momentos'], b['momentos']], ignore_index=True).fillna(0)
+    tabela = pd.DataFrame({col: np.bincount(ids, weights=momentos[col].to_numpy(), minlength=n) for col in momentos})
+    deslocamento = len(a['chaves'])
+    digests = {}
+    for nome in a['digests'].keys() | b['digests'].keys():
+        vazio = (np.empty(0, dtype=np.int64), np.empty(0), np.empty(0))
+        pa, ma, wa = a['digests'].get(nome, vazio)
+        pb, mb, wb = b['digests'].get(nome, vazio)
+        digests[nome] = _reduzir(ids[np.concatenate([pa, pb + deslocamento])], np.concatenate([ma, mb]),
+                                 np.concatenate([wa, wb]))
+    return {'chaves': chaves.take(primeiras).reset_index(drop=True), 'momentos': tabela, 'digests': digests}
+
+
+def juntar_sketches(a, b):
+    """Sketches de duas partes disjuntas da base (ex.: blocos da carga ou meses novos)."""
+    return {grao: _juntar_grao(a[grao], b[grao]) for grao in a}
+
+
+# --- CONSULTA ---
+
+def _selecao(chaves, meses, ufs, categorias, col_categoria):
+    manter = np.ones(len(chaves), dtype=bool)
+    if meses is not None:
+        manter &= chaves['mes'].isin(list(meses)).to_numpy()
+    if ufs:
+        manter &= chaves['uf'].isin(list(ufs)).to_numpy()
+    if categorias:
+        if col_categoria == 'categorias':
+            aceitas = frozenset(categorias)
+            manter &= np.fromiter((not c.isdisjoint(aceitas) for c in chaves['categorias']), bool, len(chaves))
+        else:
+            manter &= chaves['categoria'].isin(list(categorias)).to_numpy()
+    return manter
+
+
+def consultar(sketches, meses=None, ufs=None, categorias=None):
+    """Totais (momentos somados) e digests da seleção, juntando as partições.
+
+    `meses` são rótulos 'AAAA-MM'; None = sem filtro de período.
+    """
+    totais = {}
+    digests = {}
+    for grao, col_categoria in [('pedidos', 'categorias'), ('itens', 'categoria')]:
+        g = sketches[grao]
+        manter = _selecao(g['chaves'], meses, ufs, categorias, col_categoria)
+        totais.update(g['momentos'][manter].sum().to_dict())
+        for nome, (particoes, medias, pesos) in g['digests'].items():
+            sel = manter[particoes]
+            _, m, p = _reduzir(np.zeros(sel.sum(), dtype=np.int64), medias[sel], pesos[sel])
+            digests[nome] = (m, p)
+    return totais, digests
+
+
+def meses_do_periodo(periodo):
+    """Rótulos dos meses quando o período cobre meses inteiros; None se não cobrir."""
+    inicio, fim = (pd.Timestamp(d) for d in periodo)
+    if inicio.day != 1 or not fim.is_month_end:
+        return None
+    return set(pd.period_range(inicio, fim, freq='M').astype(str))
+
+
+def _razao(num, den, escala=1):
+    return num / den * escala if den else np.nan
+
+
+# --- KPIs DE CADA DASHBOARD ---
+
+def sketches_dashboard(m):
+    """Sketches dos KPIs do dashboard final (olist_agregados.ABAS_DASHBOARD)."""
+    p = m.pedidos
+    recorrente = (p['Tipo de Cliente'] == 'Recorrente').to_numpy()
+    valores = m.itens_com(['Valor Total'])['Valor Total'].to_numpy(dtype='float64')
+    return construir_sketches(
+        p, m.itens_com(['Categoria do Produto']).assign(pedido=m.itens['pedido'].to_numpy()),
+        'Data da Compra', 'Estado do Cliente', 'Categoria do Produto',
+        momentos_pedido={
+            'pedidos': np.ones(len(p)),
+            'soma_dias': p['Dias para Entrega'].to_numpy(dtype='float64'),
+            'n_dias': p['Dias para Entrega'].notna().to_numpy(dtype='float64'),
+            'n_prazo': p['Status do Prazo'].notna().to_numpy(dtype='float64'),
+            'n_no_prazo': (p['Status do Prazo'] == 'No Prazo/Adiantado').to_numpy(dtype='float64'),
+            'soma_nota': p['Nota de Avaliação'].to_numpy(dtype='float64'),
+            'n_nota': p['Nota de Avaliação'].notna().to_numpy(dtype='float64'),
+            'n_comentario': p['Comentário'].notna().to_numpy(dtype='float64'),
+            'n_recorrentes': recorrente.astype('float64'),
+        },
+        digests_pedido={'dias': p['Dias para Entrega'].to_numpy(dtype='float64')},
+        momentos_item={'valor_recorrentes': np.where(recorrente[m.itens['pedido'].to_numpy()], valores, 0)},
+    )
+
+
+def kpis_dashboard(totais, digests):
+    """KPIs com as mesmas chaves dos agregados do dashboard final."""
+    return {
+        'media_dias': _razao(totais['soma_dias'], totais['n_dias']),
+        'mediana_dias': quantil(digests['dias'], 0.5),
+        'pct_prazo': _razao(totais['n_no_prazo'], totais['n_prazo'], 100) if totais['n_prazo'] else None,
+        'nota_media': _razao(totais['soma_nota'], totais['n_nota']),
+        'pct_comentaram': _razao(totais['n_comentario'], totais['pedidos'], 100),
+        'ticket_medio_recorrentes': _razao(totais['valor_recorrentes'], totais['n_recorrentes']),
+    }
+
+
+def sketches_v3(m):
+    """Sketches das métricas do topo do dashboard v3 (olist_agregados._geral_v3)."""
+    p = m.pedidos
+    _, dias, validos = entrega_limpa_v3(p)
+    dias_validos = np.where(validos, dias.to_numpy(dtype='float64'), np.nan)
+    return construir_sketches(
+        p, m.itens_com(['product_category_name']).assign(pedido=m.itens['pedido'].to_numpy()),
+        'order_purchase_timestamp', 'customer_state', 'product_category_name',
+        momentos_pedido={
+            'pedidos': np.ones(len(p)),
+            'soma_dias': dias_validos,
+            'n_dias': validos.astype('float64'),
+            'soma_nota': p['review_score'].to_numpy(dtype='float64'),
+            'n_nota': p['review_score'].notna().to_numpy(dtype='float64'),
+        },
+        digests_pedido={'dias': dias_validos},
+        momentos_item={'faturamento': m.itens['total_payment'].to_numpy(dtype='float64')},
+    )
+
+
+def kpis_v3(totais, digests):
+    """Métricas do topo com as mesmas chaves de agregados_v3."""
+    return {
+        'faturamento': totais['faturamento'],
+        'pedidos': int(totais['pedidos']),
+        'prazo_medio': _razao(totais['soma_dias'], totais['n_dias']),
+        'mediana_dias': quantil(digests['dias'], 0.5),
+        'nota_media': _razao(totais['soma_nota'], totais['n_nota']),
+    }
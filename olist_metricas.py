@@ -0,0 +1,187 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+# --- INSTRUMENTAÇÃO POR ETAPA ---
+# Cada etapa nomeada (carga, agregados, renderização de cada aba...) registra
+# tempo, linhas de entrada/saída e variação de memória (RSS). As etapas são
+# agrupadas em execuções ('carga' na ETL, 'render' a cada rerun do Streamlit);
+# a execução corrente fica em uma ContextVar, então funções internas só
+# precisam de `with etapa(...)` e a thread de atualização em segundo plano
+# tem a sua própria execução.
+#
+# Exportação opcional para monitoramento:
+#   OLIST_METRICAS_LOG=1      uma linha JSON por etapa no logger 'olist_metricas'
+#   OLIST_METRICAS_PROM=arq   arquivo no formato texto do Prometheus (textfile collector)
+
+log = logging.getLogger(__name__)
+
+LOG_ESTRUTURADO = os.environ.get('OLIST_METRICAS_LOG', '0') == '1'
+ARQUIVO_PROMETHEUS = os.environ.get('OLIST_METRICAS_PROM')
+
+_atual = contextvars.ContextVar('olist_execucao', default=None)
+_lock = threading.Lock()
+ULTIMAS = {}   # tipo -> última Execucao concluída
+TOTAIS = {}    # (tipo, etapa) -> acumulados para o Prometheus
+
+
+def _rss_mb():
+    # RSS atual em MB (Linux); None onde /proc não existe
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _linhas(obj):
+    forma = getattr(obj, 'shape', None)
+    if forma:
+        return int(forma[0])
+    # Objetos sem shape com tamanho próprio (ex.: olist_modelo.ModeloEstrela)
+    if hasattr(obj, '__len__') and not isinstance(obj, (dict, str)):
+        return len(obj)
+    return None
+
+
+class Etapa:
+    def __init__(self, nome, linhas_entrada=None):
+        self.nome = nome
+        self.linhas_entrada = linhas_entrada
+        self.linhas_saida = None
+        self.tempo_s = None
+        self.memoria_delta_mb = None
+
+    def saida(self, obj):
+        """Registra as linhas do resultado e o devolve (uso: df = e.saida(df))."""
+        self.linhas_saida = _linhas(obj)
+        return obj
+
+    def como_dict(self):
+        return {'etapa': self.nome, 'tempo_s': self.tempo_s, 'linhas_entrada': self.linhas_entrada,
+                'linhas_saida': self.linhas_saida, 'memoria_delta_mb': self.memoria_delta_mb}
+
+
+class Execucao:
+    def __init__(self, tipo):
+        self.tipo = tipo
+        self.inicio = time.time()
+        self.duracao_s = None
+        self.etapas = []
+        self._token = None
+
+
+def iniciar_execucao(tipo):
+    """Abre uma execução e a torna a corrente (para scripts sem bloco `with`)."""
+    ex = Execucao(tipo)
+    ex._token = _atual.set(ex)
+    return ex
+
+
+def concluir_execucao(ex):
+    ex.duracao_s = time.time() - ex.inicio
+    if ex._token is not None:
+        _atual.reset(ex._token)
+        ex._token = None
+    with _lock:
+        ULTIMAS[ex.tipo] = ex
+        for e in ex.etapas:
+            total = TOTAIS.setdefault((ex.tipo, e.nome), {'execucoes': 0, 'segundos': 0.0})
+            total['execucoes'] += 1
+            total['segundos'] += e.tempo_s
+            total['ultima'] = e
+    if LOG_ESTRUTURADO:
+        for e in ex.etapas:
+            log.info(json.dumps({'evento': 'olist_etapa', 'tipo': ex.tipo, 'inicio': ex.inicio, **e.como_dict()},
+                                ensure_ascii=False))
+    if ARQUIVO_PROMETHEUS:
+        gravar_prometheus(ARQUIVO_PROMETHEUS)
+    return ex
+
+
+@contextmanager
+def execucao(tipo):
+    ex = iniciar_execucao(tipo)
+    try:
+        yield ex
+    finally:
+        concluir_execucao(ex)
+
+
+@contextmanager
+def etapa(nome, entrada=None):
+    """Mede o bloco e o registra na execução corrente (sem execução, só mede)."""
+    registro = Etapa(nome, _linhas(entrada))
+    ex = _atual.get()
+    rss_antes = _rss_mb()
+    inicio = time.perf_counter()
+    try:
+        yield registro
+    finally:
+        registro.tempo_s = time.perf_counter() - inicio
+        rss_depois = _rss_mb()
+        if rss_antes is not None and rss_depois is not None:
+            registro.memoria_delta_mb = rss_depois - rss_antes
+        if ex is not None:
+            ex.etapas.append(registro)
+
+
+def ultima_execucao(tipo):
+    """Última execução concluída do tipo (ex.: a carga feita em segundo plano), ou None."""
+    with _lock:
+        return ULTIMAS.get(tipo)
+
+
+def tabela_etapas(ex):
+    """DataFrame de exibição das etapas de uma execução."""
+    tabela = pd.DataFrame([e.como_dict() for e in ex.etapas],
+                          columns=['etapa', 'tempo_s', 'linhas_entrada', 'linhas_saida', 'memoria_delta_mb'])
+    return tabela.rename(columns={
+        'etapa': 'Etapa', 'tempo_s': 'Tempo (s)', 'linhas_entrada': 'Linhas Entrada',
+        'linhas_saida': 'Linhas Saída', 'memoria_delta_mb': 'Δ Memória (MB)',
+    })
+
+
+# --- EXPORTAÇÃO PROMETHEUS ---
+
+def _rotulo(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def texto_prometheus():
+    """Métricas acumuladas no formato texto de exposição do Prometheus."""
+    metricas = [
+        ('olist_etapa_execucoes_total', 'counter', "Execuções de cada etapa.", lambda t: t['execucoes']),
+        ('olist_etapa_segundos_total', 'counter', "Tempo acumulado em cada etapa.", lambda t: t['segundos']),
+        ('olist_etapa_ultima_duracao_segundos', 'gauge', "Duração da última execução da etapa.",
+         lambda t: t['ultima'].tempo_s),
+        ('olist_etapa_ultimas_linhas_saida', 'gauge', "Linhas de saída na última execução da etapa.",
+         lambda t: t['ultima'].linhas_saida),
+        ('olist_etapa_ultima_memoria_delta_bytes', 'gauge', "Variação de RSS na última execução da etapa.",
+         lambda t: None if t['ultima'].memoria_delta_mb is None else t['ultima'].memoria_delta_mb * 2**20),
+    ]
+    with _lock:
+        totais = sorted(TOTAIS.items())
+    linhas = []
+    for nome, tipo, ajuda, valor in metricas:
+        linhas.append(f"# HELP {nome} {ajuda}")
+        linhas.append(f"# TYPE {nome} {tipo}")
+        for (tipo_execucao, nome_etapa), total in totais:
+            v = valor(total)
+            if v is not None:
+                linhas.append(f'{nome}{{tipo="{_rotulo(tipo_execucao)}",etapa="{_rotulo(nome_etapa)}"}} {v:.6g}')
+    return "\n".join(linhas) + "\n"
+
+
+def gravar_prometheus(caminho):
+    """Grava de forma atômica (o coletor nunca lê um arquivo pela metade)."""
+    tmp = f"{caminho}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as arquivo:
+        arquivo.write(texto_prometheus())
+    os.replace(tmp, caminho)
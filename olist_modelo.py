@@ -0,0 +1,173 @@
+import numpy as np
+import pandas as pd
+
+# --- MODELO ESTRELA (GRÃO DE PEDIDO + GRÃO DE ITEM) ---
+# O JOIN devolve uma linha por item: cada pedido aparece repetido uma vez por
+# item, com cliente, pagamento e review copiados em todas as linhas, e as abas
+# precisavam de drop_duplicates('order_id') a cada cálculo. A base plana é
+# separada uma vez por versão dos dados em:
+#   - fato de pedidos: uma linha por pedido (atributos do pedido + totais dos itens);
+#   - fato de itens: uma linha por item, com códigos inteiros para o pedido
+#     e para as dimensões;
+#   - dimensões compartilhadas (produto, vendedor), uma linha por chave.
+# Pedidos sem itens (LEFT JOIN) mantêm uma linha no fato de itens, com o
+# produto/vendedor ausentes como membro próprio da dimensão, como na base plana.
+# Cada aba lê o grão de que precisa; `itens_com` leva colunas do pedido ou das
+# dimensões para o grão de item quando um resumo cruza os dois.
+
+# Colunas de cada grão por conjunto (ver olist_etl.CONJUNTOS); o que não está
+# no pedido nem em uma dimensão fica no fato de itens
+ESQUEMAS = {
+    'final': {
+        'chave': 'order_id',
+        'pedido': [
+            'Status do Pedido', 'Data da Compra', 'Data Aprovação', 'Data Entrega Real', 'Data Entrega Prevista',
+            'CEP Prefixo', 'Cidade do Cliente', 'Estado do Cliente', 'Tipo de Pagamento', 'Parcelas',
+            'Nota de Avaliação', 'Comentário', 'Dias para Entrega', 'Entregue no Prazo', 'Status do Prazo',
+            'ID Cliente (Proxy)', 'Cliente Recorrente', 'Tipo de Cliente',
+        ],
+        'dimensoes': {
+            'produto': ('product_id', ['Categoria do Produto', 'Qtd Fotos', 'Peso (g)', 'Comprimento (cm)',
+                                       'Altura (cm)', 'Largura (cm)', 'Volume (cm3)']),
+            'vendedor': ('seller_id', ['Estado do Vendedor']),
+        },
+        # Totais do pedido calculados a partir dos itens: nome -> (coluna do item, 'count' | 'sum' | 'or')
+        # ('violacoes': regras de qualidade violadas em algum item; ver olist_qualidade)
+        'totais': {'Qtd Itens': ('order_item_id', 'count'), 'Valor do Pedido': ('Valor Total', 'sum'),
+                   'violacoes': ('violacoes', 'or')},
+    },
+    'v3': {
+        'chave': 'order_id',
+        'pedido': [
+            'order_status', 'order_purchase_timestamp', 'order_approved_at', 'order_delivered_customer_date',
+            'order_estimated_delivery_date', 'customer_zip_code_prefix', 'customer_city', 'customer_state',
+            'payment_type', 'payment_installments', 'review_score', 'review_comment',
+        ],
+        'dimensoes': {
+            'produto': ('product_id', ['product_category_name']),
+            'vendedor': ('seller_id', ['seller_state']),
+        },
+        'totais': {'order_items': ('order_item_id', 'count'), 'order_total': ('total_payment', 'sum'),
+                   'violacoes': ('violacoes', 'or')},
+    },
+}
+
+
+class ModeloEstrela:
+    """Fato de pedidos, fato de itens e dimensões, com a versão dos dados em `attrs`."""
+
+    def __init__(self, pedidos, itens, dimensoes, esquema, attrs=None):
+        self.pedidos = pedidos
+        self.itens = itens
+        self.dimensoes = dimensoes
+        self.esquema = esquema
+        self.attrs = dict(attrs or {})
+
+    @property
+    def empty(self):
+        return self.itens.empty
+
+    @property
+    def colunas(self):
+        """Todas as colunas do modelo, de qualquer grão."""
+        cols = set(self.pedidos.columns) | set(self.itens.columns)
+        for dim in self.dimensoes.values():
+            cols.update(dim.columns)
+        return cols
+
+    def __len__(self):
+        # Linhas no grão da base plana (uma por item)
+        return len(self.itens)
+
+    def itens_com(self, colunas):
+        """Colunas no grão de item, buscando as do pedido e das dimensões pelos códigos."""
+        dados = {}
+        for col in colunas:
+            if col in self.itens.columns:
+                dados[col] = self.itens[col].reset_index(drop=True)
+            elif col in self.pedidos.columns:
+                dados[col] = self.pedidos[col].take(self.itens['pedido'].to_numpy()).reset_index(drop=True)
+            else:
+                nome = next(n for n, (chave, cols) in self.esquema['dimensoes'].items() if col == chave or col in cols)
+                dados[col] = self.dimensoes[nome][col].take(self.itens[nome].to_numpy()).reset_index(drop=True)
+        return pd.DataFrame(dados)
+
+    def memoria_mb(self):
+        tabelas = [self.pedidos, self.itens, *self.dimensoes.values()]
+        return sum(t.memory_usage(deep=True).sum() for t in tabelas) / 2**20
+
+
+def _primeiras(codigos, n):
+    # Posição da primeira linha de cada código 0..n-1
+    primeiras = np.full(n, len(codigos), dtype=np.int64)
+    np.minimum.at(primeiras, codigos, np.arange(len(codigos)))
+    return primeiras
+
+
+def _totais(itens, n_pedidos, totais):
+    """Totais por pedido a partir das linhas de item (bincount sobre o código do pedido)."""
+    codigos = itens['pedido'].to_numpy()
+    colunas = {}
+    for nome, (col, funcao) in totais.items():
+        if col not in itens.columns:
+            continue
+        if funcao == 'count':
+            colunas[nome] = np.bincount(codigos, weights=itens[col].notna().to_numpy(), minlength=n_pedidos).astype('int16')
+        elif funcao == 'or':
+            # Máscaras de bits: OU dos itens de cada pedido
+            valores = itens[col].to_numpy()
+            colunas[nome] = np.zeros(n_pedidos, dtype=valores.dtype)
+            np.bitwise_or.at(colunas[nome], codigos, valores)
+        else:
+            valores = itens[col].fillna(0).to_numpy(dtype='float64')
+            colunas[nome] = np.bincount(codigos, weights=valores, minlength=n_pedidos).round(2)
+    return colunas
+
+
+def construir_modelo(df, esquema):
+    """Separa a base plana (uma linha por item) no modelo estrela do `esquema`."""
+    chave = esquema['chave']
+    codigos_pedido, _ = pd.factorize(df[chave])
+    n_pedidos = int(codigos_pedido.max()) + 1 if len(codigos_pedido) else 0
+    cols_pedido = [chave] + [c for c in esquema['pedido'] if c in df.columns]
+    pedidos = df[cols_pedido].take(_primeiras(codigos_pedido, n_pedidos)).reset_index(drop=True)
+
+    usadas = set(cols_pedido)
+    itens = {'pedido': codigos_pedido.astype('int32')}
+    dimensoes = {}
+    for nome, (col_chave, colunas) in esquema['dimensoes'].items():
+        colunas = [c for c in colunas if c in df.columns]
+        if col_chave not in df.columns:
+            continue
+        # Chave ausente (item inexistente no LEFT JOIN) vira um membro próprio da dimensão
+        codigos, _ = pd.factorize(df[col_chave], use_na_sentinel=False)
+        # Base vazia: dimensão vazia (sem códigos não há máximo)
+        n_membros = int(codigos.max()) + 1 if len(codigos) else 0
+        dimensoes[nome] = df[[col_chave] + colunas].take(_primeiras(codigos, n_membros)).reset_index(drop=True)
+        itens[nome] = codigos.astype('int32')
+        usadas.update([col_chave, *colunas])
+    for col in df.columns:
+        if col not in usadas:
+            itens[col] = df[col].reset_index(drop=True)
+    itens = pd.DataFrame(itens)
+
+    for nome, valores in _totais(itens, n_pedidos, esquema['totais']).items():
+        pedidos[nome] = valores
+    return ModeloEstrela(pedidos, itens, dimensoes, esquema, df.attrs)
+
+
+def filtrar_modelo(modelo, posicoes):
+    """Recorte pelas posições de item filtradas (o próprio modelo quando não há filtro).
+
+    Ficam os pedidos com pelo menos um item selecionado; os totais do pedido
+    são refeitos só com esses itens. As dimensões são compartilhadas.
+    """
+    if posicoes is None:
+        return modelo
+    itens = modelo.itens.take(posicoes).reset_index(drop=True)
+    usados, codigos = np.unique(itens['pedido'].to_numpy(), return_inverse=True)
+    itens['pedido'] = codigos.astype('int32')
+    pedidos = modelo.pedidos.take(usados).reset_index(drop=True)
+    for nome, valores in _totais(itens, len(pedidos), modelo.esquema['totais']).items():
+        pedidos[nome] = valores
+    return ModeloEstrela(pedidos, itens, modelo.dimensoes, modelo.esquema, modelo.attrs)
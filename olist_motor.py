@@ -0,0 +1,371 @@
+import math
+import os
+
+import pandas as pd
+from sqlalchemy import text
+
+from olist_agregados import agregados_dashboard
+from olist_etl import construir_base
+from olist_metricas import etapa, execucao
+from olist_modelo import ESQUEMAS, construir_modelo
+from olist_snapshot import PASTA_SNAPSHOT
+from olist_sql import TABELAS
+from olist_tipos import FORMATOS_BR, FORMATOS_ISO, formatar_categoria
+
+# --- MOTOR DE EXECUÇÃO PLUGÁVEL (PANDAS | DUCKDB) ---
+# As mesmas etapas lógicas do dashboard final (junção, deduplicação de
+# pagamentos/reviews, limpeza de números e datas, colunas derivadas e os
+# resumos das abas) em dois motores:
+#   - pandas: o caminho de referência (construir_base + modelo estrela +
+#     agregados_dashboard), com a base inteira em memória;
+#   - duckdb: as sete tabelas são copiadas em blocos para um arquivo DuckDB e
+#     todo o resto roda em SQL colunar, com limite de memória e pasta de
+#     despejo (spill) configuráveis; só os resumos voltam para o Python.
+# Os dois devolvem as métricas no mesmo formato (ver resumir), comparadas por
+# verificar_paridade. Os dashboards continuam no pandas, que também atende
+# os filtros; o DuckDB serve para jobs em lote sobre históricos que não
+# cabem na memória.
+# Uso: python olist_etl.py metricas --url sqlite:///olist.db [--motor duckdb] [--paridade]
+
+TAMANHO_CHUNK = 50_000
+
+# Configuração do DuckDB (memória no formato do DuckDB, ex.: '2GB')
+MEMORIA_DUCKDB = os.environ.get('OLIST_DUCKDB_MEMORIA', '2GB')
+THREADS_DUCKDB = int(os.environ.get('OLIST_DUCKDB_THREADS', os.cpu_count() or 1))
+
+# Tolerância relativa na comparação de valores float (somas em outra ordem)
+TOLERANCIA = 1e-9
+
+
+# --- RESUMO COMUM ---
+
+def resumir(ag, pedidos, itens):
+    """Métricas comparáveis entre motores a partir dos agregados do dashboard final."""
+    rec = ag.get('recompra') or {}
+    vendas = ag['vendas_mes'].set_index('Mês/Ano')
+    return {
+        'pedidos': pedidos,
+        'itens': itens,
+        'media_dias': ag.get('media_dias'),
+        'mediana_dias': ag.get('mediana_dias'),
+        'pct_prazo': ag.get('pct_prazo'),
+        'nota_media': ag.get('nota_media'),
+        'pct_comentaram': ag.get('pct_comentaram'),
+        'vendas_mes': vendas[['Qtd_Pedidos', 'Faturamento']],
+        'categorias': ag['contagem_categorias'],
+        'uf_clientes': ag['top_uf_clientes'],
+        'uf_vendedores': ag['top_uf_vendedores'],
+        'recompra': {chave: rec.get(chave) for chave in
+                     ['clientes', 'ticket_medio', 'nota_media', 'media_parcelas', 'pct_prazo']},
+    }
+
+
+# --- MOTOR PANDAS (REFERÊNCIA) ---
+
+def metricas_pandas(conn):
+    """Pipeline de referência: base plana em memória, modelo estrela e agregados."""
+    with execucao('motor_pandas'):
+        df = construir_base(conn)
+        with etapa('modelo', df) as e:
+            modelo = e.saida(construir_modelo(df, ESQUEMAS['final']))
+        with etapa('agregados', modelo):
+            ag = agregados_dashboard(modelo)
+        return resumir(ag, len(modelo.pedidos), len(modelo))
+
+
+# --- MOTOR DUCKDB ---
+# As tabelas chegam como texto (VARCHAR): o driver de cada banco devolve
+# tipos diferentes e o mesmo campo pode vir com vírgula decimal ou datas em
+# DD/MM/YYYY; toda conversão é explícita no SQL, como no tipar_chunk.
+
+def _numero(expr, zerar=False, float32=False):
+    # Vírgula decimal aceita; inválidos viram NULL (ou 0 com `zerar`)
+    sql = f"TRY_CAST(REPLACE(TRIM({expr}), ',', '.') AS DOUBLE)"
+    if float32:
+        # Preço e frete ficam em float32 no pandas: o total parte dos mesmos valores
+        sql = f"CAST(CAST({sql} AS FLOAT) AS DOUBLE)"
+    return f"COALESCE({sql}, 0)" if zerar else sql
+
+
+def _data(expr):
+    # Formatos explícitos de normalizar_datas; o TRY_CAST cobre o ISO8601 restante
+    formatos = ", ".join(f"'{f}'" for f in FORMATOS_ISO + FORMATOS_BR)
+    return f"COALESCE(TRY_STRPTIME(TRIM({expr}), [{formatos}]), TRY_CAST(TRIM({expr}) AS TIMESTAMP))"
+
+
+# Uma linha por item, já limpa e com as colunas derivadas de linha
+SQL_ITENS_DUCKDB = f"""
+CREATE OR REPLACE TABLE itens AS
+WITH pg AS (
+    SELECT order_id, payment_installments FROM (
+        SELECT order_id, payment_installments,
+               ROW_NUMBER() OVER (
+                   PARTITION BY order_id
+                   ORDER BY {_numero('payment_value')} DESC NULLS LAST,
+                            {_numero('payment_sequential')} NULLS FIRST
+               ) AS rn
+        FROM {TABELAS['pg']}
+    ) WHERE rn = 1
+),
+r AS (
+    SELECT order_id, review_score, NULLIF(review_comment_message, '') AS comentario FROM (
+        SELECT order_id, review_score, review_comment_message,
+               ROW_NUMBER() OVER (
+                   PARTITION BY order_id
+                   ORDER BY {_data('review_creation_date')} NULLS FIRST, review_id NULLS FIRST
+               ) AS rn
+        FROM {TABELAS['r']}
+    ) WHERE rn = 1
+),
+base AS (
+    SELECT
+        o.order_id,
+        o.order_status,
+        i.order_item_id,
+        {_data('o.order_purchase_timestamp')} AS data_compra,
+        {_data('o.order_approved_at')} AS data_aprovacao,
+        {_data('o.order_delivered_customer_date')} AS entrega_real,
+        {_data('o.order_estimated_delivery_date')} AS entrega_prevista,
+        ROUND({_numero('i.price', True, True)} + {_numero('i.freight_value', True, True)}, 2) AS valor_total,
+        COALESCE(p.product_category_name, 'nan') AS categoria,
+        {_numero('c.customer_zip_code_prefix')} AS cep,
+        c.customer_city AS cidade,
+        COALESCE(c.customer_state, 'Desc') AS estado_cliente,
+        COALESCE(s.seller_state, 'Desc') AS estado_vendedor,
+        {_numero('pg.payment_installments', True)} AS parcelas,
+        {_numero('r.review_score', True)} AS nota,
+        r.comentario
+    FROM {TABELAS['o']} o
+    LEFT JOIN {TABELAS['i']} i ON i.order_id = o.order_id
+    LEFT JOIN {TABELAS['p']} p ON p.product_id = i.product_id
+    LEFT JOIN {TABELAS['c']} c ON c.customer_id = o.customer_id
+    LEFT JOIN {TABELAS['s']} s ON s.seller_id = i.seller_id
+    LEFT JOIN pg ON pg.order_id = o.order_id
+    LEFT JOIN r ON r.order_id = o.order_id
+)
+SELECT *,
+       FLOOR(DATE_DIFF('second', data_aprovacao, entrega_real) / 86400) AS dias_entrega,
+       COALESCE(entrega_real <= entrega_prevista, FALSE) AS no_prazo
+FROM base
+"""
+
+# Uma linha por pedido (totais dos itens) com a marca de cliente recorrente
+SQL_PEDIDOS_DUCKDB = """
+CREATE OR REPLACE TABLE pedidos AS
+WITH p AS (
+    SELECT order_id,
+           ANY_VALUE(order_status) AS order_status,
+           ANY_VALUE(data_compra) AS data_compra,
+           ANY_VALUE(dias_entrega) AS dias_entrega,
+           ANY_VALUE(no_prazo) AS no_prazo,
+           ANY_VALUE(cep) AS cep,
+           ANY_VALUE(cidade) AS cidade,
+           ANY_VALUE(estado_cliente) AS estado_cliente,
+           ANY_VALUE(parcelas) AS parcelas,
+           ANY_VALUE(nota) AS nota,
+           ANY_VALUE(comentario) AS comentario,
+           ROUND(SUM(valor_total), 2) AS valor_pedido
+    FROM itens
+    GROUP BY order_id
+)
+SELECT *, COUNT(*) OVER (PARTITION BY cep, cidade) > 1 AS recorrente
+FROM p
+"""
+
+SQL_METRICAS_DUCKDB = {
+    'escalares': """
+        SELECT COUNT(*) AS pedidos,
+               AVG(dias_entrega) AS media_dias,
+               MEDIAN(dias_entrega) AS mediana_dias,
+               AVG(no_prazo::INTEGER) * 100 AS pct_prazo,
+               AVG(nota) AS nota_media,
+               COUNT(comentario) / COUNT(*) * 100 AS pct_comentaram
+        FROM pedidos""",
+    'recompra': """
+        SELECT COUNT(DISTINCT (cep, cidade)) AS clientes,
+               AVG(valor_pedido) AS ticket_medio,
+               AVG(nota) AS nota_media,
+               AVG(parcelas) AS media_parcelas,
+               AVG(no_prazo::INTEGER) * 100 AS pct_prazo
+        FROM pedidos WHERE recorrente""",
+    'vendas_mes': """
+        SELECT STRFTIME(data_compra, '%Y-%m') AS "Mês/Ano",
+               COUNT(order_status) AS Qtd_Pedidos,
+               SUM(valor_pedido) AS Faturamento
+        FROM pedidos WHERE data_compra IS NOT NULL
+        GROUP BY 1 ORDER BY 1""",
+    'categorias': "SELECT categoria, COUNT(*) AS n FROM itens GROUP BY 1",
+    'uf_clientes': "SELECT estado_cliente, COUNT(*) AS n FROM pedidos GROUP BY 1 ORDER BY 2 DESC LIMIT 10",
+    'uf_vendedores': "SELECT estado_vendedor, COUNT(*) AS n FROM itens GROUP BY 1 ORDER BY 2 DESC LIMIT 10",
+    'itens': "SELECT COUNT(*) AS itens FROM itens",
+}
+
+
+def _conectar_duckdb(caminho, memoria, threads, pasta_temporaria):
+    try:
+        import duckdb
+    except ImportError as erro:
+        raise ImportError("O motor 'duckdb' requer o pacote duckdb (pip install duckdb).") from erro
+    os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+    con = duckdb.connect(caminho)
+    con.execute(f"SET memory_limit = '{memoria}'")
+    con.execute(f"SET threads = {int(threads)}")
+    con.execute(f"SET temp_directory = '{pasta_temporaria or caminho + '.tmp'}'")
+    # Sem garantia de ordem de inserção o DuckDB pode despejar e reordenar à vontade
+    con.execute("SET preserve_insertion_order = false")
+    return con
+
+
+def copiar_tabelas(conn, con, tamanho_chunk=TAMANHO_CHUNK):
+    """Copia as sete tabelas do banco de origem para o DuckDB, em blocos de texto."""
+    linhas = 0
+    conn = conn.execution_options(stream_results=True)
+    for tabela in TABELAS.values():
+        con.execute(f"DROP TABLE IF EXISTS {tabela}")
+        criada = False
+        for chunk in pd.read_sql(text(f"SELECT * FROM {tabela}"), conn, chunksize=tamanho_chunk):
+            bloco = chunk.astype('string')
+            con.register('bloco', bloco)
+            if criada:
+                con.execute(f"INSERT INTO {tabela} SELECT * FROM bloco")
+            else:
+                con.execute(f"CREATE TABLE {tabela} AS SELECT * FROM bloco")
+                criada = True
+            con.unregister('bloco')
+            linhas += len(bloco)
+        if not criada:
+            vazia = pd.read_sql(text(f"SELECT * FROM {tabela} WHERE 1 = 0"), conn).astype('string')
+            con.register('bloco', vazia)
+            con.execute(f"CREATE TABLE {tabela} AS SELECT * FROM bloco")
+            con.unregister('bloco')
+    return linhas
+
+
+def _contagem(df, rotulo):
+    return df.set_index(df.columns[0])['n'].rename_axis(rotulo).rename('count')
+
+
+def metricas_duckdb(conn, caminho=None, memoria=MEMORIA_DUCKDB, threads=THREADS_DUCKDB, pasta_temporaria=None):
+    """Pipeline no DuckDB: cópia das tabelas, limpeza e resumos em SQL.
+
+    `caminho` é o arquivo do banco DuckDB (padrão: na pasta do snapshot);
+    `memoria` e `threads` limitam o DuckDB, que despeja em `pasta_temporaria`
+    o que passar do limite.
+    """
+    caminho = caminho or os.path.join(PASTA_SNAPSHOT, 'olist_motor.duckdb')
+    with execucao('motor_duckdb'):
+        con = _conectar_duckdb(caminho, memoria, threads, pasta_temporaria)
+        try:
+            with etapa('copia_tabelas') as e:
+                e.linhas_saida = copiar_tabelas(conn, con)
+            with etapa('itens'):
+                con.execute(SQL_ITENS_DUCKDB)
+            with etapa('pedidos'):
+                con.execute(SQL_PEDIDOS_DUCKDB)
+            with etapa('agregados'):
+                res = {nome: con.execute(sql).df() for nome, sql in SQL_METRICAS_DUCKDB.items()}
+        finally:
+            con.close()
+
+    escalares = res['escalares'].iloc[0]
+    recompra = res['recompra'].iloc[0]
+    # Rótulo de categoria formatado só sobre as categorias distintas, como no pandas
+    categorias = res['categorias']
+    categorias['categoria'] = formatar_categoria(categorias['categoria'].astype(str))
+    categorias = categorias[categorias['categoria'] != 'Nan'].groupby('categoria')['n'].sum()
+    return {
+        'pedidos': int(escalares['pedidos']),
+        'itens': int(res['itens'].iloc[0]['itens']),
+        **{chave: _valor(escalares[chave]) for chave in
+           ['media_dias', 'mediana_dias', 'pct_prazo', 'nota_media', 'pct_comentaram']},
+        'vendas_mes': res['vendas_mes'].set_index('Mês/Ano'),
+        'categorias': categorias.sort_values(ascending=False).rename_axis('Categoria do Produto').rename('count'),
+        'uf_clientes': _contagem(res['uf_clientes'], 'Estado do Cliente'),
+        'uf_vendedores': _contagem(res['uf_vendedores'], 'Estado do Vendedor'),
+        'recompra': {chave: (None if not recompra['clientes'] else _valor(recompra[chave])) for chave in
+                     ['clientes', 'ticket_medio', 'nota_media', 'media_parcelas', 'pct_prazo']},
+    }
+
+
+def _valor(v):
+    return None if v is None or pd.isna(v) else float(v)
+
+
+MOTORES = {
+    'pandas': metricas_pandas,
+    'duckdb': metricas_duckdb,
+}
+
+
+def calcular_metricas(conn, motor='pandas', **opcoes):
+    """Métricas do dashboard final pelo motor escolhido (ver MOTORES)."""
+    if motor not in MOTORES:
+        raise ValueError(f"Motor desconhecido: {motor!r} (opções: {', '.join(MOTORES)})")
+    return MOTORES[motor](conn, **opcoes)
+
+
+# --- PARIDADE ENTRE MOTORES ---
+
+def _proximos(a, b):
+    if a is None or b is None:
+        return a is None and b is None
+    return math.isclose(float(a), float(b), rel_tol=TOLERANCIA, abs_tol=1e-9)
+
+
+def _comparar_top(nome, a, b):
+    # Top N com empates: mesmas contagens em ordem e mesma contagem nas UFs em comum
+    a, b = a.astype('int64'), b.astype('int64')
+    erros = []
+    if sorted(a.to_numpy(), reverse=True) != sorted(b.to_numpy(), reverse=True):
+        erros.append(f"{nome}: contagens {a.to_dict()} x {b.to_dict()}")
+    for chave in set(a.index.astype(str)) & set(b.index.astype(str)):
+        if a[chave] != b[chave]:
+            erros.append(f"{nome}[{chave}]: {a[chave]} x {b[chave]}")
+    return erros
+
+
+def comparar_metricas(ref, outra):
+    """Lista de divergências entre dois resumos (vazia quando batem)."""
+    erros = []
+    for chave in ['pedidos', 'itens']:
+        if ref[chave] != outra[chave]:
+            erros.append(f"{chave}: {ref[chave]} x {outra[chave]}")
+    for chave in ['media_dias', 'mediana_dias', 'pct_prazo', 'nota_media', 'pct_comentaram']:
+        if not _proximos(ref[chave], outra[chave]):
+            erros.append(f"{chave}: {ref[chave]} x {outra[chave]}")
+    for chave, valor in ref['recompra'].items():
+        if not _proximos(valor, outra['recompra'][chave]):
+            erros.append(f"recompra.{chave}: {valor} x {outra['recompra'][chave]}")
+
+    va, vb = ref['vendas_mes'], outra['vendas_mes']
+    if list(va.index) != list(vb.index):
+        erros.append(f"vendas_mes: meses {list(va.index)} x {list(vb.index)}")
+    else:
+        for mes in va.index:
+            if int(va.at[mes, 'Qtd_Pedidos']) != int(vb.at[mes, 'Qtd_Pedidos']) or \
+                    not _proximos(va.at[mes, 'Faturamento'], vb.at[mes, 'Faturamento']):
+                erros.append(f"vendas_mes[{mes}]: {va.loc[mes].to_dict()} x {vb.loc[mes].to_dict()}")
+
+    ca = ref['categorias'].astype('int64').sort_index()
+    cb = outra['categorias'].astype('int64').sort_index()
+    ca.index, cb.index = ca.index.astype(str), cb.index.astype(str)
+    if not ca.equals(cb):
+        erros.append(f"categorias: {len(ca)} x {len(cb)} categorias, {(ca != cb.reindex(ca.index)).sum()} divergentes")
+    erros += _comparar_top('uf_clientes', ref['uf_clientes'], outra['uf_clientes'])
+    erros += _comparar_top('uf_vendedores', ref['uf_vendedores'], outra['uf_vendedores'])
+    return erros
+
+
+def verificar_paridade(conn, motor='duckdb', **opcoes):
+    """Roda o motor pandas e `motor` sobre o mesmo banco e compara as métricas.
+
+    Levanta RuntimeError se divergirem (não um assert, que `python -O` removeria);
+    devolve o resumo do motor de referência.
+    """
+    ref = metricas_pandas(conn)
+    outra = calcular_metricas(conn, motor, **opcoes)
+    erros = comparar_metricas(ref, outra)
+    if erros:
+        raise RuntimeError(f"Motor {motor} diverge do pandas:\n  " + "\n  ".join(erros))
+    return ref
+
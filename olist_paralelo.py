@@ -0,0 +1,143 @@
+import multiprocessing as mp
+import os
+import tempfile
+import threading
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
+
+import pyarrow as pa
+
+from olist_tipos import juntar_relatorios
+
+# --- LIMPEZA EM PARALELO (POOL DE PROCESSOS) ---
+# A tipagem de cada bloco (números com vírgula, datas em formatos mistos,
+# categorias) é CPU pura e, em threads, disputa o GIL: a carga usava um
+# núcleo só. Aqui cada bloco lido do banco vai para um pool de processos
+# enquanto o leitor já busca o próximo:
+#   - o bloco bruto é gravado como Arrow IPC em /dev/shm (memória
+#     compartilhada) e o processo o abre por memory map, sem cópia pickle;
+#   - o bloco tratado volta pelo mesmo caminho, já tipado (float32,
+#     Categorical, datetime64), junto com o relatório de datas do bloco;
+#   - no máximo BLOCOS_POR_PROCESSO blocos por processo ficam em voo: o
+#     leitor espera quando o pool está cheio, e a memória continua limitada.
+# O resultado é o mesmo do caminho serial (ver benchmark_paralelo.py).
+# O pool é para o job de build (python olist_etl.py build --processos N): os
+# processos novos importam de novo o __main__, e no Streamlit o __main__ é o
+# próprio script do dashboard, que não pode rodar em cada processo. Por isso
+# o padrão é 1 (tipagem no próprio processo, como antes); os dashboards devem
+# servir o build em disco (OLIST_SOMENTE_LEITURA=1) quando a base é grande.
+
+PROCESSOS_LIMPEZA = int(os.environ.get('OLIST_PROCESSOS_LIMPEZA', 1))
+BLOCOS_POR_PROCESSO = 2
+
+# tmpfs do Linux; onde não existe, a pasta temporária comum
+PASTA_COMPARTILHADA = '/dev/shm' if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK) \
+    else tempfile.gettempdir()
+
+# fork não é seguro em processos com threads (pool de conexões, leitura
+# particionada); o forkserver cria cada processo a partir de um servidor limpo
+METODO_INICIO = 'forkserver' if 'forkserver' in mp.get_all_start_methods() else 'spawn'
+
+_pool = None
+_lock_pool = threading.Lock()
+
+
+def _gravar_bloco(df):
+    """Grava o bloco como Arrow IPC na memória compartilhada; devolve o caminho."""
+    caminho = os.path.join(PASTA_COMPARTILHADA, f"olist_bloco_{os.getpid()}_{uuid.uuid4().hex}.arrow")
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    try:
+        with pa.OSFile(caminho, 'wb') as arquivo, pa.ipc.new_file(arquivo, tabela.schema) as escritor:
+            escritor.write_table(tabela)
+    except BaseException:
+        _remover(caminho)
+        raise
+    return caminho
+
+
+def _ler_bloco(caminho):
+    """Abre o bloco por memory map (sem cópia) e remove o arquivo; o mapa vive enquanto houver referência."""
+    try:
+        tabela = pa.ipc.open_file(pa.memory_map(caminho)).read_all()
+    finally:
+        _remover(caminho)
+    return tabela.to_pandas()
+
+
+def _remover(caminho):
+    try:
+        os.remove(caminho)
+    except OSError:
+        pass
+
+
+def _tratar_bloco(caminho, tratar):
+    # Roda no processo do pool: `tratar(chunk, relatorio=...)` como tratar_chunk
+    chunk = _ler_bloco(caminho)
+    relatorio = {}
+    chunk = tratar(chunk, relatorio=relatorio)
+    return _gravar_bloco(chunk), relatorio
+
+
+def obter_pool(processos):
+    """Pool de processos compartilhado (recriado se o tamanho pedido mudar)."""
+    global _pool
+    with _lock_pool:
+        if _pool is None or _pool._max_workers != processos:
+            if _pool is not None:
+                _pool.shutdown(wait=True)
+            _pool = ProcessPoolExecutor(max_workers=processos, mp_context=mp.get_context(METODO_INICIO))
+        return _pool
+
+
+class LimpezaParalela:
+    """`tratar_chunk` para carregar_olist_sql que envia cada bloco ao pool de processos.
+
+    Cada chamada devolve um Future com o bloco tratado; o relatório de datas
+    de todos os blocos é somado em `relatorio`.
+    """
+
+    def __init__(self, tratar, relatorio=None, processos=2):
+        self.tratar = tratar
+        self.relatorio = relatorio if relatorio is not None else {}
+        self.processos = processos
+        self._vagas = threading.BoundedSemaphore(processos * BLOCOS_POR_PROCESSO)
+
+    def __call__(self, chunk):
+        self._vagas.acquire()
+        try:
+            caminho = _gravar_bloco(chunk)
+        except BaseException:
+            self._vagas.release()
+            raise
+        futuro = Future()
+        try:
+            tarefa = obter_pool(self.processos).submit(_tratar_bloco, caminho, self.tratar)
+        except BaseException:
+            _remover(caminho)
+            self._vagas.release()
+            raise
+        tarefa.add_done_callback(partial(self._concluir, futuro))
+        return futuro
+
+    def _concluir(self, futuro, tarefa):
+        try:
+            caminho, relatorio = tarefa.result()
+            futuro.set_result(_ler_bloco(caminho))
+            juntar_relatorios(self.relatorio, relatorio)
+        except BaseException as erro:
+            futuro.set_exception(erro)
+        finally:
+            self._vagas.release()
+
+
+def limpeza_em_blocos(tratar, relatorio, processos=None):
+    """Função de tratamento por bloco: serial com 1 processo, senão no pool (LimpezaParalela).
+
+    Sem `processos`, usa PROCESSOS_LIMPEZA (ajustado pelo build com --processos).
+    """
+    processos = processos or PROCESSOS_LIMPEZA
+    if processos <= 1:
+        return partial(tratar, relatorio=relatorio)
+    return LimpezaParalela(tratar, relatorio, processos)
@@ -0,0 +1,236 @@
+import numpy as np
+import pandas as pd
+
+# --- REGRAS DE QUALIDADE DOS DADOS ---
+# A limpeza que antes ficava espalhada (ausentes viram 0, UF ausente vira
+# 'Desc', categoria ausente vira 'nan', comentário vazio vira ausente, prazo
+# de entrega entre 0 e 180 dias) é declarada aqui, uma lista de regras por
+# conjunto (ver olist_etl.CONJUNTOS), sobre os nomes de coluna do banco:
+#   - obrigatoria: valor ausente;
+#   - faixa: valor fora de [minimo, maximo] (ausentes ficam com a obrigatoria);
+#   - dominio: valor fora dos `validos` ou entre os `invalidos`;
+#   - ordem_datas: `depois` antes de `antes`, ou mais de `max_dias` depois.
+# `avaliar` confere todas as regras de uma vez, cada uma vetorizada sobre a
+# coluna inteira (em Categorical, sobre as categorias distintas, espalhadas
+# pelos códigos), acumulando no lugar uma só máscara de bits por linha com as
+# regras violadas: o bit de cada regra é a posição dela na lista.
+# A máscara fica na coluna 'violacoes' da base e vai para o fato de itens (e,
+# por pedido, para o fato de pedidos; ver olist_modelo.ESQUEMAS), de modo que
+# abas e filtros separam as linhas de uma regra com um AND de inteiros.
+# Regras com `corrigir` ainda trocam o valor das linhas violadas, depois da
+# avaliação (ex.: ausente -> 0); as demais só marcam.
+# Mudar as regras muda a máscara gravada: incrementar VERSAO_SNAPSHOT.
+
+COLUNA = 'violacoes'
+
+# Sem correção: a regra só marca as linhas
+MARCAR = object()
+
+
+def obrigatoria(nome, coluna, descricao, corrigir=MARCAR):
+    return {'nome': nome, 'tipo': 'obrigatoria', 'colunas': [coluna], 'descricao': descricao, 'corrigir': corrigir}
+
+
+def faixa(nome, coluna, descricao, minimo=None, maximo=None):
+    return {'nome': nome, 'tipo': 'faixa', 'colunas': [coluna], 'descricao': descricao, 'corrigir': MARCAR,
+            'minimo': minimo, 'maximo': maximo}
+
+
+def dominio(nome, coluna, descricao, validos=None, invalidos=None, corrigir=MARCAR):
+    return {'nome': nome, 'tipo': 'dominio', 'colunas': [coluna], 'descricao': descricao, 'corrigir': corrigir,
+            'validos': validos, 'invalidos': invalidos}
+
+
+def ordem_datas(nome, antes, depois, descricao, max_dias=None):
+    return {'nome': nome, 'tipo': 'ordem_datas', 'colunas': [antes, depois], 'descricao': descricao,
+            'corrigir': MARCAR, 'max_dias': max_dias}
+
+
+STATUS_PEDIDO = ['delivered', 'shipped', 'canceled', 'unavailable', 'invoiced', 'processing', 'created', 'approved']
+
+# Regras comuns aos dois conjuntos
+_DATAS = [
+    ordem_datas('aprovacao_antes_compra', 'order_purchase_timestamp', 'order_approved_at',
+                "Pedido aprovado antes da compra"),
+    # CAMADA 4 do dashboard v3: prazo negativo ou acima de 180 dias fica fora das médias
+    ordem_datas('prazo_entrega', 'order_approved_at', 'order_delivered_customer_date',
+                "Entrega antes da aprovação ou mais de 180 dias depois", max_dias=180),
+]
+_DOMINIOS = [
+    faixa('nota_fora_faixa', 'review_score', "Nota fora de 1 a 5", minimo=1, maximo=5),
+    faixa('preco_negativo', 'price', "Preço negativo", minimo=0),
+    faixa('frete_negativo', 'freight_value', "Frete negativo", minimo=0),
+    dominio('status_desconhecido', 'order_status', "Status de pedido desconhecido", validos=STATUS_PEDIDO),
+]
+
+REGRAS = {
+    'final': [
+        obrigatoria('preco_ausente', 'price', "Preço ausente (vira 0)", corrigir=0),
+        obrigatoria('frete_ausente', 'freight_value', "Frete ausente (vira 0)", corrigir=0),
+        obrigatoria('peso_ausente', 'product_weight_g', "Peso ausente (vira 0)", corrigir=0),
+        obrigatoria('fotos_ausente', 'product_photos_qty', "Qtd de fotos ausente (vira 0)", corrigir=0),
+        obrigatoria('nota_ausente', 'review_score', "Nota ausente (vira 0)", corrigir=0),
+        obrigatoria('parcelas_ausente', 'payment_installments', "Parcelas ausentes (vira 0)", corrigir=0),
+        obrigatoria('uf_cliente_ausente', 'customer_state', "UF do cliente ausente (vira 'Desc')", corrigir='Desc'),
+        obrigatoria('uf_vendedor_ausente', 'seller_state', "UF do vendedor ausente (vira 'Desc')", corrigir='Desc'),
+        # 'nan' vira 'Nan' na formatação das categorias; fica fora das abas de produto
+        obrigatoria('categoria_ausente', 'product_category_name', "Categoria ausente (vira 'Nan')", corrigir='nan'),
+        dominio('comentario_vazio', 'review_comment', "Comentário vazio (vira ausente)", invalidos=[''],
+                corrigir=None),
+        *_DOMINIOS,
+        *_DATAS,
+    ],
+    'v3': [
+        obrigatoria('preco_ausente', 'price', "Preço ausente (vira 0)", corrigir=0),
+        obrigatoria('frete_ausente', 'freight_value', "Frete ausente (vira 0)", corrigir=0),
+        obrigatoria('nota_ausente', 'review_score', "Nota ausente"),
+        obrigatoria('uf_cliente_ausente', 'customer_state', "UF do cliente ausente"),
+        obrigatoria('categoria_ausente', 'product_category_name', "Categoria ausente"),
+        # O v3 conta o comentário vazio como comentário: só marca
+        dominio('comentario_vazio', 'review_comment', "Comentário vazio", invalidos=['']),
+        *_DOMINIOS,
+        *_DATAS,
+    ],
+}
+
+# Conjunto -> {regra: posição do bit}
+_POSICOES = {conjunto: {regra['nome']: i for i, regra in enumerate(regras)} for conjunto, regras in REGRAS.items()}
+assert all(len(regras) <= 32 for regras in REGRAS.values()), "a máscara de violações tem 32 bits"
+
+
+def bits(conjunto, *nomes):
+    """Máscara com os bits das regras `nomes` do conjunto."""
+    return sum(1 << _POSICOES[conjunto][nome] for nome in nomes)
+
+
+def violou(mascara, conjunto, *nomes):
+    """Linhas que violam alguma das regras `nomes` (array booleano)."""
+    return (np.asarray(mascara) & bits(conjunto, *nomes)) != 0
+
+
+# --- AVALIAÇÃO (UMA PASSADA) ---
+
+def _ausentes(serie):
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie.cat.codes.to_numpy() == -1
+    return serie.isna().to_numpy()
+
+
+def _por_categoria(serie, condicao):
+    """`condicao` (Index -> array booleano) sobre as categorias distintas, espalhada pelos códigos."""
+    # Código -1 (ausente) aponta para a posição extra no fim, que fica False
+    return np.append(condicao(serie.cat.categories), False)[serie.cat.codes.to_numpy()]
+
+
+def _fora_da_faixa(regra, serie):
+    valores = serie.to_numpy(dtype='float64', na_value=np.nan)
+    fora = np.zeros(len(valores), dtype=bool)
+    # Comparações com NaN são falsas: ausentes não violam a faixa
+    if regra['minimo'] is not None:
+        fora |= valores < regra['minimo']
+    if regra['maximo'] is not None:
+        fora |= valores > regra['maximo']
+    return fora
+
+
+def _fora_do_dominio(regra, serie):
+    def condicao(valores):
+        valores = pd.Index(valores)
+        fora = np.zeros(len(valores), dtype=bool)
+        if regra['validos'] is not None:
+            fora |= ~valores.isin(regra['validos'])
+        if regra['invalidos'] is not None:
+            fora |= valores.isin(regra['invalidos'])
+        return fora
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return _por_categoria(serie, condicao)
+    return condicao(serie) & ~_ausentes(serie)
+
+
+def _fora_de_ordem(regra, antes, depois):
+    # NaT em qualquer lado: comparação falsa, não viola (a ausência é outra regra)
+    delta = depois.to_numpy(dtype='datetime64[ns]') - antes.to_numpy(dtype='datetime64[ns]')
+    fora = delta < np.timedelta64(0, 'ns')
+    if regra['max_dias'] is not None:
+        # Em dias inteiros, como `.dt.days`: 180 dias e 23h ainda são 180 dias
+        fora |= delta >= np.timedelta64(regra['max_dias'] + 1, 'D')
+    return fora
+
+
+def _violacoes(regra, df):
+    tipo = regra['tipo']
+    if tipo == 'obrigatoria':
+        return _ausentes(df[regra['colunas'][0]])
+    if tipo == 'faixa':
+        return _fora_da_faixa(regra, df[regra['colunas'][0]])
+    if tipo == 'dominio':
+        return _fora_do_dominio(regra, df[regra['colunas'][0]])
+    return _fora_de_ordem(regra, *(df[col] for col in regra['colunas']))
+
+
+def avaliar(df, regras):
+    """Máscara uint32 por linha com o bit de cada regra violada (regras sem as colunas ficam zeradas)."""
+    mascara = np.zeros(len(df), dtype=np.uint32)
+    for bit, regra in enumerate(regras):
+        if not set(regra['colunas']) <= set(df.columns):
+            continue
+        np.bitwise_or(mascara, np.uint32(1 << bit), out=mascara, where=_violacoes(regra, df))
+    return mascara
+
+
+def corrigir(df, regras, mascara):
+    """Troca, nas linhas violadas, o valor das colunas das regras com `corrigir`."""
+    for bit, regra in enumerate(regras):
+        if regra['corrigir'] is MARCAR:
+            continue
+        linhas = (mascara & np.uint32(1 << bit)) != 0
+        if not linhas.any():
+            continue
+        col, valor = regra['colunas'][0], regra['corrigir']
+        serie = df[col]
+        if valor is None:
+            df[col] = serie.mask(linhas)
+            continue
+        if isinstance(serie.dtype, pd.CategoricalDtype) and valor not in serie.cat.categories:
+            serie = serie.cat.add_categories([valor])
+        df[col] = serie.mask(linhas, valor)
+    return df
+
+
+def aplicar_regras(df, conjunto):
+    """Avalia as regras do conjunto, grava a máscara em df['violacoes'] e aplica as correções."""
+    regras = REGRAS[conjunto]
+    mascara = avaliar(df, regras)
+    df = corrigir(df, regras, mascara)
+    df[COLUNA] = mascara
+    return df
+
+
+# --- RELATÓRIO ---
+
+def _acao(regra):
+    if regra['corrigir'] is MARCAR:
+        return "marcada"
+    if regra['corrigir'] is None:
+        return "vira ausente"
+    return f"vira {regra['corrigir']!r}"
+
+
+def relatorio_qualidade(modelo, conjunto):
+    """Linhas violadas por regra, no grão de item e de pedido (a partir das máscaras do modelo)."""
+    graos = {'Itens': modelo.itens, 'Pedidos': modelo.pedidos}
+    linhas = []
+    for bit, regra in enumerate(REGRAS[conjunto]):
+        linha = {
+            'Regra': regra['nome'],
+            'Tipo': regra['tipo'],
+            'Colunas': ", ".join(regra['colunas']),
+            'Descrição': regra['descricao'],
+            'Ação': _acao(regra),
+        }
+        for grao, tabela in graos.items():
+            n = int(((tabela[COLUNA].to_numpy() & np.uint32(1 << bit)) != 0).sum()) if COLUNA in tabela else 0
+            linha[grao] = n
+            linha[f'% {grao}'] = round(n / len(tabela) * 100, 2) if len(tabela) else 0.0
+        linhas.append(linha)
+    return pd.DataFrame(linhas)
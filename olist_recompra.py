@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+# --- MOTOR DE RECOMPRA ---
+# A Olist anonimiza o cliente; o dashboard usa CEP + cidade como proxy. Antes o
+# proxy era um texto montado linha a linha (CEP como string + cidade) e a
+# recorrência saía de value_counts/groupby + isin sobre esses textos. Aqui:
+#   - chave_cliente: CEP + cidade em uma chave int64. Só as cidades distintas
+#     passam pelo hash; a chave não depende da ordem das linhas, então bate
+#     entre a base e o delta de uma atualização incremental;
+#   - pedidos_por_cliente: contagem por cliente com np.unique + bincount;
+#   - intervalos_recompra: dias entre compras seguidas do mesmo cliente;
+#   - coortes: clientes ativos por mês da primeira compra x meses depois dela.
+# Todas as funções recebem arrays no grão de pedido (uma linha por pedido).
+
+# Constantes do splitmix64 (mistura dos bits da chave)
+_OURO = np.uint64(0x9E3779B97F4A7C15)
+_M1 = np.uint64(0xBF58476D1CE4E5B9)
+_M2 = np.uint64(0x94D049BB133111EB)
+
+
+def _misturar(x):
+    x = x ^ (x >> np.uint64(30))
+    x = x * _M1
+    x = x ^ (x >> np.uint64(27))
+    x = x * _M2
+    return x ^ (x >> np.uint64(31))
+
+
+def chave_cliente(cep, cidade):
+    """Chave int64 do cliente (proxy CEP + cidade), igual para os mesmos valores em qualquer base."""
+    codigos, cidades = pd.factorize(cidade)
+    # Cidade ausente (código -1) pega o último elemento: hash 0
+    h = np.append(pd.util.hash_array(np.asarray(cidades, dtype=object)), np.uint64(0))[codigos]
+    cep = pd.to_numeric(pd.Series(cep), errors='coerce').fillna(-1).to_numpy('int64').view('uint64')
+    with np.errstate(over='ignore'):
+        return _misturar(h + cep * _OURO).view('int64')
+
+
+def pedidos_por_cliente(chaves):
+    """Clientes distintos (ordenados), código do cliente de cada linha e linhas por cliente."""
+    clientes, codigos = np.unique(chaves, return_inverse=True)
+    return clientes, codigos, np.bincount(codigos, minlength=len(clientes))
+
+
+def recorrentes(chaves, chaves_pedidos):
+    """Para cada chave de `chaves`: o cliente tem mais de um pedido em `chaves_pedidos`?
+
+    `chaves_pedidos` tem uma linha por pedido; `chaves` pode estar em qualquer
+    grão (ex.: item), e a marca é ligada pela chave com busca binária.
+    """
+    clientes, _, contagem = pedidos_por_cliente(chaves_pedidos)
+    if not len(clientes):
+        return np.zeros(len(chaves), dtype=bool)
+    posicao = np.minimum(np.searchsorted(clientes, chaves), len(clientes) - 1)
+    return (clientes[posicao] == chaves) & (contagem[posicao] > 1)
+
+
+def _ordenar(chaves, datas):
+    # Pedidos com data, ordenados por cliente e data
+    datas = np.asarray(datas, dtype='datetime64[s]')
+    validas = ~np.isnat(datas)
+    chaves, datas = np.asarray(chaves)[validas], datas[validas]
+    ordem = np.lexsort((datas, chaves))
+    return chaves[ordem], datas[ordem]
+
+
+def intervalos_recompra(chaves, datas):
+    """Dias entre cada compra e a anterior do mesmo cliente (só clientes com 2+ compras)."""
+    chaves, datas = _ordenar(chaves, datas)
+    mesmo_cliente = chaves[1:] == chaves[:-1]
+    dias = (datas[1:] - datas[:-1])[mesmo_cliente].astype('int64') / 86400
+    return pd.Series(dias, name='Dias entre Compras')
+
+
+def coortes(chaves, datas):
+    """Clientes ativos por coorte (mês da 1ª compra) e meses desde a 1ª compra.
+
+    Linhas = coorte ('AAAA-MM'), colunas = 0, 1, 2, ... meses depois; a coluna
+    0 é o tamanho da coorte. Cada cliente conta uma vez por mês em que comprou.
+    """
+    chaves, datas = _ordenar(chaves, datas)
+    if not len(chaves):
+        return pd.DataFrame()
+    meses = datas.astype('datetime64[M]').astype('int64')
+    inicio = np.ones(len(chaves), dtype=bool)
+    inicio[1:] = chaves[1:] != chaves[:-1]
+    grupo = np.cumsum(inicio) - 1
+    primeiro = meses[inicio][grupo]
+    # Um registro por (cliente, mês): linhas já ordenadas por cliente e data
+    distinto = inicio.copy()
+    distinto[1:] |= meses[1:] != meses[:-1]
+    coorte, deslocamento = primeiro[distinto], (meses - primeiro)[distinto]
+    largura = int(deslocamento.max()) + 1
+    base = int(coorte.min())
+    tabela = np.bincount((coorte - base) * largura + deslocamento,
+                         minlength=(int(coorte.max()) - base + 1) * largura).reshape(-1, largura)
+    rotulos = pd.PeriodIndex.from_ordinals(np.arange(base, base + len(tabela)), freq='M').astype(str)
+    tabela = pd.DataFrame(tabela, index=pd.Index(rotulos, name='Coorte'),
+                          columns=pd.Index(range(largura), name='Meses desde a 1ª compra'))
+    # Meses sem nenhuma primeira compra não formam coorte
+    return tabela[tabela[0] > 0]
+
+
+def retencao(tabela):
+    """% da coorte ativa em cada mês (a partir da saída de `coortes`)."""
+    return tabela.div(tabela[0], axis=0) * 100
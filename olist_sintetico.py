@@ -0,0 +1,247 @@
+import argparse
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+# --- GERADOR DE BASE SINTÉTICA (ESQUEMA OLIST) ---
+# Gera as sete tabelas com os mesmos nomes e colunas do dataset público da
+# Olist, em escala configurável, para medir o pipeline sem o banco de produção.
+# Reproduz as particularidades que o pipeline trata: vários itens por pedido,
+# vários pagamentos por pedido, reviews duplicadas, números com vírgula
+# decimal, comentários vazios, categorias e estados ausentes.
+# Uso: python olist_sintetico.py --pedidos 100000 --saida olist_100k.db
+
+# Tamanho do dataset público (escala 1x de referência)
+PEDIDOS_OLIST = 99_441
+
+ESTADOS = ['SP', 'RJ', 'MG', 'RS', 'PR', 'SC', 'BA', 'DF', 'ES', 'GO', 'PE', 'CE', 'PA', 'MT', 'MA', 'MS']
+PESOS_ESTADOS = [42, 13, 12, 5.5, 5, 3.7, 3.4, 2.2, 2, 2, 1.7, 1.3, 1, 0.9, 0.8, 0.7]
+CIDADES = ['sao paulo', 'rio de janeiro', 'belo horizonte', 'brasilia', 'curitiba', 'campinas',
+           'porto alegre', 'salvador', 'guarulhos', 'sao bernardo do campo']
+CATEGORIAS = ['cama_mesa_banho', 'beleza_saude', 'esporte_lazer', 'moveis_decoracao',
+              'informatica_acessorios', 'utilidades_domesticas', 'relogios_presentes', 'telefonia',
+              'ferramentas_jardim', 'automotivo', 'brinquedos', 'cool_stuff', 'perfumaria', 'bebes',
+              'eletronicos', 'papelaria', 'fashion_bolsas_e_acessorios', 'pet_shop', 'moveis_escritorio',
+              'consoles_games']
+STATUS = ['delivered', 'shipped', 'canceled', 'unavailable', 'invoiced', 'processing', 'created', 'approved']
+PESOS_STATUS = [97, 1.1, 0.6, 0.6, 0.3, 0.3, 0.05, 0.05]
+TIPOS_PAGAMENTO = ['credit_card', 'boleto', 'voucher', 'debit_card']
+PESOS_PAGAMENTO = [74, 19, 5.5, 1.5]
+
+INICIO = np.datetime64('2016-09-04T00:00:00')
+FIM = np.datetime64('2018-10-17T00:00:00')
+
+
+def _ids(rng, n):
+    # Hash hexadecimal de 32 caracteres, como os ids da Olist
+    texto = rng.bytes(16 * n).hex()
+    return np.array([texto[i:i + 32] for i in range(0, 32 * n, 32)], dtype=object)
+
+
+def _escolher(rng, valores, pesos, n):
+    pesos = np.asarray(pesos, dtype=float)
+    return rng.choice(np.array(valores, dtype=object), n, p=pesos / pesos.sum())
+
+
+def _ausentes(rng, serie, fracao):
+    return serie.where(rng.random(len(serie)) >= fracao)
+
+
+def _texto_data(datas, rng=None, fracao_br=0.0):
+    """Datas como texto ISO; uma fração pode sair em DD/MM/YYYY (formato misto)."""
+    texto = pd.Series(pd.DatetimeIndex(datas).strftime('%Y-%m-%d %H:%M:%S'), dtype=object)
+    if fracao_br and rng is not None:
+        br = rng.random(len(texto)) < fracao_br
+        texto[br] = pd.DatetimeIndex(datas[br]).strftime('%d/%m/%Y %H:%M')
+    return texto.where(~pd.isna(datas), None)
+
+
+def _texto_valor(valores, rng, fracao_virgula):
+    """Valores monetários como texto; uma fração com vírgula decimal."""
+    texto = pd.Series(np.char.mod('%.2f', np.round(valores, 2)), dtype=object)
+    virgula = rng.random(len(texto)) < fracao_virgula
+    texto[virgula] = texto[virgula].str.replace('.', ',', regex=False)
+    return texto
+
+
+def gerar_tabelas(pedidos, seed=42, itens_medio=1.15, pagamentos_extra=0.05,
+                  reviews_duplicadas=0.01, fracao_virgula=0.3, fracao_datas_br=0.0):
+    """Dict nome da tabela -> DataFrame com as sete tabelas no esquema da Olist.
+
+    `itens_medio` é a média de itens por pedido (fan-out da junção),
+    `pagamentos_extra` a média de pagamentos adicionais por pedido e
+    `reviews_duplicadas` a fração de pedidos com uma segunda review.
+    """
+    rng = np.random.default_rng(seed)
+    n = pedidos
+
+    # Vendedores e produtos crescem com a base (proporções do dataset público)
+    n_vendedores = max(10, n // 33)
+    n_produtos = max(20, n // 3)
+    sellers = pd.DataFrame({
+        'seller_id': _ids(rng, n_vendedores),
+        'seller_zip_code_prefix': rng.integers(1000, 99990, n_vendedores),
+        'seller_city': rng.choice(np.array(CIDADES, dtype=object), n_vendedores),
+        'seller_state': _escolher(rng, ESTADOS, PESOS_ESTADOS, n_vendedores),
+    })
+    products = pd.DataFrame({
+        'product_id': _ids(rng, n_produtos),
+        'product_category_name': _ausentes(rng, pd.Series(rng.choice(np.array(CATEGORIAS, dtype=object), n_produtos)), 0.02),
+        'product_name_lenght': rng.integers(5, 76, n_produtos),
+        'product_description_lenght': rng.integers(4, 3992, n_produtos),
+        'product_photos_qty': rng.integers(1, 10, n_produtos),
+        'product_weight_g': rng.integers(50, 30000, n_produtos),
+        'product_length_cm': rng.integers(7, 105, n_produtos),
+        'product_height_cm': rng.integers(2, 105, n_produtos),
+        'product_width_cm': rng.integers(6, 118, n_produtos),
+    })
+
+    # Clientes: um customer_id por pedido; ~3% dos pedidos são de quem já comprou
+    order_id = _ids(rng, n)
+    customer_id = _ids(rng, n)
+    unicos = _ids(rng, max(1, int(n * 0.97)))
+    customers = pd.DataFrame({
+        'customer_id': customer_id,
+        'customer_unique_id': unicos[rng.integers(0, len(unicos), n)],
+        'customer_zip_code_prefix': rng.integers(1000, 99990, n),
+        'customer_city': rng.choice(np.array(CIDADES, dtype=object), n),
+        'customer_state': _escolher(rng, ESTADOS, PESOS_ESTADOS, n),
+    })
+
+    # Pedidos e datas
+    segundos = int((FIM - INICIO) / np.timedelta64(1, 's'))
+    compra = INICIO + rng.integers(0, segundos, n).astype('timedelta64[s]')
+    aprovacao = compra + rng.integers(600, 2 * 86400, n).astype('timedelta64[s]')
+    status = _escolher(rng, STATUS, PESOS_STATUS, n)
+    entregue = status == 'delivered'
+    transportadora = aprovacao + rng.integers(86400, 5 * 86400, n).astype('timedelta64[s]')
+    entrega = transportadora + rng.integers(86400, 40 * 86400, n).astype('timedelta64[s]')
+    prevista = (compra + rng.integers(10, 45, n).astype('timedelta64[D]')).astype('datetime64[D]')
+    orders = pd.DataFrame({
+        'order_id': order_id,
+        'customer_id': customer_id,
+        'order_status': status,
+        'order_purchase_timestamp': _texto_data(compra, rng, fracao_datas_br),
+        'order_approved_at': _texto_data(np.where(rng.random(n) < 0.002, np.datetime64('NaT'), aprovacao), rng, fracao_datas_br),
+        'order_delivered_carrier_date': _texto_data(np.where(entregue, transportadora, np.datetime64('NaT'))),
+        'order_delivered_customer_date': _texto_data(np.where(entregue, entrega, np.datetime64('NaT')), rng, fracao_datas_br),
+        'order_estimated_delivery_date': _texto_data(prevista.astype('datetime64[s]'), rng, fracao_datas_br),
+    })
+
+    # Itens: fan-out configurável; ~0,8% dos pedidos (cancelados etc.) sem itens
+    qtd_itens = 1 + rng.poisson(max(itens_medio - 1, 0), n)
+    qtd_itens[rng.random(n) < 0.008] = 0
+    pedido_item = np.repeat(np.arange(n), qtd_itens)
+    n_itens = len(pedido_item)
+    inicio_pedido = np.repeat(np.cumsum(qtd_itens) - qtd_itens, qtd_itens)
+    items = pd.DataFrame({
+        'order_id': order_id[pedido_item],
+        'order_item_id': np.arange(n_itens) - inicio_pedido + 1,
+        'product_id': products['product_id'].to_numpy()[rng.integers(0, n_produtos, n_itens)],
+        'seller_id': sellers['seller_id'].to_numpy()[rng.integers(0, n_vendedores, n_itens)],
+        'shipping_limit_date': _texto_data(compra[pedido_item] + np.timedelta64(6, 'D')),
+        'price': _texto_valor(rng.lognormal(4.4, 0.9, n_itens), rng, fracao_virgula),
+        'freight_value': _texto_valor(rng.gamma(2.0, 10.0, n_itens), rng, fracao_virgula),
+    })
+
+    # Pagamentos: um ou mais por pedido (sequência 1..k)
+    qtd_pag = 1 + rng.poisson(pagamentos_extra, n)
+    pedido_pag = np.repeat(np.arange(n), qtd_pag)
+    n_pag = len(pedido_pag)
+    inicio_pag = np.repeat(np.cumsum(qtd_pag) - qtd_pag, qtd_pag)
+    payments = pd.DataFrame({
+        'order_id': order_id[pedido_pag],
+        'payment_sequential': np.arange(n_pag) - inicio_pag + 1,
+        'payment_type': _escolher(rng, TIPOS_PAGAMENTO, PESOS_PAGAMENTO, n_pag),
+        'payment_installments': rng.integers(1, 11, n_pag),
+        'payment_value': _texto_valor(rng.lognormal(4.7, 0.9, n_pag), rng, fracao_virgula),
+    })
+
+    # Reviews: uma por pedido, uma fração com review duplicada (mais nova)
+    duplicada = rng.random(n) < reviews_duplicadas
+    pedido_rev = np.concatenate([np.arange(n), np.flatnonzero(duplicada)])
+    n_rev = len(pedido_rev)
+    criacao = (compra[pedido_rev] + rng.integers(3, 60, n_rev).astype('timedelta64[D]')).astype('datetime64[D]')
+    criacao[n:] += np.timedelta64(1, 'D')
+    comentario = pd.Series(rng.choice(np.array(['Recebi bem antes do prazo', 'Produto ótimo', 'Não recebi o produto',
+                                                 'Veio errado', ''], dtype=object), n_rev))
+    reviews = pd.DataFrame({
+        'review_id': _ids(rng, n_rev),
+        'order_id': order_id[pedido_rev],
+        'review_score': _escolher(rng, [5, 4, 3, 2, 1], [57.8, 19.3, 8.2, 3.2, 11.5], n_rev).astype(int),
+        'review_comment_title': None,
+        # ~59% sem comentário (NULL); parte dos demais vem como texto vazio
+        'review_comment_message': comentario.where(rng.random(n_rev) >= 0.59, None),
+        'review_creation_date': _texto_data(criacao.astype('datetime64[s]')),
+        'review_answer_timestamp': _texto_data((criacao + np.timedelta64(2, 'D')).astype('datetime64[s]')),
+    })
+
+    return {
+        'olist_orders_dataset': orders,
+        'olist_order_items_dataset': items,
+        'olist_products_dataset': products,
+        'olist_customers_dataset': customers,
+        'olist_sellers_dataset': sellers,
+        'olist_order_payments_dataset': payments,
+        'olist_order_reviews_dataset': reviews,
+    }
+
+
+# Chaves indexadas (no MySQL de produção são chaves primárias/estrangeiras)
+INDICES = {
+    'olist_orders_dataset': ['order_id', 'customer_id'],
+    'olist_order_items_dataset': ['order_id', 'product_id', 'seller_id'],
+    'olist_products_dataset': ['product_id'],
+    'olist_customers_dataset': ['customer_id'],
+    'olist_sellers_dataset': ['seller_id'],
+    'olist_order_payments_dataset': ['order_id'],
+    'olist_order_reviews_dataset': ['order_id'],
+}
+
+
+def gravar_sqlite(tabelas, caminho):
+    """Grava as tabelas em um arquivo SQLite novo (de forma atômica)."""
+    tmp = f"{caminho}.{os.getpid()}.tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    with sqlite3.connect(tmp) as conn:
+        for nome, df in tabelas.items():
+            df.to_sql(nome, conn, index=False, chunksize=100_000)
+            for col in INDICES.get(nome, []):
+                conn.execute(f"CREATE INDEX ix_{nome}_{col} ON {nome} ({col})")
+    conn.close()
+    os.replace(tmp, caminho)
+    return caminho
+
+
+def gerar_sqlite(caminho, pedidos, **opcoes):
+    """Gera a base sintética em `caminho`, reaproveitando o arquivo se já existir."""
+    if not os.path.exists(caminho):
+        gravar_sqlite(gerar_tabelas(pedidos, **opcoes), caminho)
+    return caminho
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera uma base sintética no esquema da Olist (SQLite)")
+    parser.add_argument('--pedidos', type=int, default=PEDIDOS_OLIST)
+    parser.add_argument('--saida', required=True)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--itens-medio', type=float, default=1.15)
+    parser.add_argument('--pagamentos-extra', type=float, default=0.05)
+    parser.add_argument('--reviews-duplicadas', type=float, default=0.01)
+    parser.add_argument('--fracao-virgula', type=float, default=0.3)
+    parser.add_argument('--fracao-datas-br', type=float, default=0.0)
+    args = parser.parse_args()
+
+    tabelas = gerar_tabelas(args.pedidos, seed=args.seed, itens_medio=args.itens_medio,
+                            pagamentos_extra=args.pagamentos_extra, reviews_duplicadas=args.reviews_duplicadas,
+                            fracao_virgula=args.fracao_virgula, fracao_datas_br=args.fracao_datas_br)
+    gravar_sqlite(tabelas, args.saida)
+    for nome, df in tabelas.items():
+        print(f"{nome:<32}{len(df):>12,}")
+
+
+if __name__ == "__main__":
+    main()
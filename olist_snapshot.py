@@ -0,0 +1,261 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.feather as feather
+from sqlalchemy import text
+
+from olist_metricas import etapa
+from olist_sql import MARCAS_DAGUA, TABELAS, data_normalizada, ler_marcas_dagua
+from olist_tipos import concatenar
+
+# --- SNAPSHOT EM DISCO (ARROW) ---
+# O DataFrame final (limpo, tipado e renomeado) é gravado em um arquivo Arrow
+# (Feather v2, sem compressão) identificado por uma impressão digital das
+# tabelas de origem. Na subida do processo o arquivo é lido via memory-map,
+# sem parse nem consulta ao banco (o DataFrame é uma cópia privada de cada
+# processo), e a base só é reconstruída quando a impressão digital muda. Com
+# uma função de atualização, o snapshot anterior é reaproveitado e só o delta
+# desde as marcas d'água gravadas nos metadados do arquivo é buscado no banco,
+# desde que a parte anterior às marcas não tenha mudado (ver conferência, abaixo).
+
+# Incrementar quando a lógica de limpeza/renomeação mudar (invalida snapshots antigos)
+VERSAO_SNAPSHOT = 9
+
+log = logging.getLogger(__name__)
+
+PASTA_SNAPSHOT = os.environ.get('OLIST_SNAPSHOT_DIR', '.olist_cache')
+
+# Cargas refeitas quando o banco muda durante a leitura (ver carregar_com_snapshot)
+TENTATIVAS_CARGA = 3
+
+# --- IMPRESSÃO DIGITAL E CONFERÊNCIA DO DELTA ---
+# A assinatura de cada tabela é a contagem de linhas e, para cada coluna de
+# data, quantas estão preenchidas e o maior dia (normalizado, como as marcas
+# d'água); os pedidos são agrupados pelo status. Além de inserções, ela muda
+# quando um pedido antigo troca de status ou recebe a data de aprovação ou de
+# entrega. Edições que não mexem nessas medidas (ex.: correção de um preço)
+# não são vistas: pedem apagar os snapshots de OLIST_SNAPSHOT_DIR.
+# Sem marcas, a assinatura cobre a tabela inteira e vira a impressão digital.
+# Com as marcas de um snapshot, cobre só a parte anterior a elas, que a
+# atualização incremental não relê (ver olist_sql.montar_filtro_delta); as
+# tabelas sem marca chegam a essa parte pelo pedido ou item a que pertencem.
+# Se ela mudou desde o snapshot (ex.: um pagamento a mais em um pedido
+# antigo), o delta não basta e a base é reconstruída por inteiro.
+
+# Colunas de data usadas para detectar inserções/atualizações em cada tabela
+COLUNAS_TEMPO = {
+    'olist_orders_dataset': ['order_purchase_timestamp', 'order_approved_at', 'order_delivered_customer_date'],
+    'olist_order_items_dataset': ['shipping_limit_date'],
+    'olist_order_reviews_dataset': ['review_answer_timestamp'],
+}
+
+# Tabela -> coluna pela qual a assinatura é agrupada
+GRUPOS = {'olist_orders_dataset': 'order_status'}
+
+# Tabela -> (JOIN até a tabela com marca d'água, alias dela, tabela da marca)
+ANCORAS = {
+    'olist_orders_dataset': ("", 't', 'olist_orders_dataset'),
+    'olist_order_items_dataset': ("", 't', 'olist_order_items_dataset'),
+    'olist_order_reviews_dataset': ("", 't', 'olist_order_reviews_dataset'),
+    'olist_order_payments_dataset': (" JOIN olist_orders_dataset o ON o.order_id = t.order_id",
+                                     'o', 'olist_orders_dataset'),
+    'olist_customers_dataset': (" JOIN olist_orders_dataset o ON o.customer_id = t.customer_id",
+                                'o', 'olist_orders_dataset'),
+    'olist_products_dataset': (" JOIN olist_order_items_dataset i ON i.product_id = t.product_id",
+                               'i', 'olist_order_items_dataset'),
+    'olist_sellers_dataset': (" JOIN olist_order_items_dataset i ON i.seller_id = t.seller_id",
+                              'i', 'olist_order_items_dataset'),
+}
+
+
+def _consulta_assinatura(dialeto, marcas=None):
+    largura = 2 * max(len(cols) for cols in COLUNAS_TEMPO.values())
+    partes, params = [], {}
+    for n, tabela in enumerate(TABELAS.values()):
+        medidas = []
+        for col in COLUNAS_TEMPO.get(tabela, []):
+            medidas += [f"COUNT(t.{col})", f"MAX({data_normalizada(f't.{col}', dialeto)})"]
+        # Mesmo número de colunas em todos os SELECTs do UNION ALL
+        medidas += ["NULL"] * (largura - len(medidas))
+        grupo = f"t.{GRUPOS[tabela]}" if tabela in GRUPOS else "NULL"
+        colunas = ", ".join(f"{m} AS m{i}" for i, m in enumerate(medidas))
+        sql = f"SELECT '{tabela}' AS tabela, {grupo} AS grupo, COUNT(*) AS linhas, {colunas} FROM {tabela} t"
+        if marcas is not None:
+            juncao, alias, tabela_marca = ANCORAS[tabela]
+            marca = marcas.get(tabela_marca)
+            col_marca = data_normalizada(f"{alias}.{MARCAS_DAGUA[tabela_marca]}", dialeto)
+            # Sem marca (tabela vazia no snapshot), nada é anterior a ela
+            sql += juncao + (f" WHERE {col_marca} < :marca_{n}" if marca is not None else " WHERE 1 = 0")
+            if marca is not None:
+                params[f"marca_{n}"] = marca
+        if tabela in GRUPOS:
+            sql += f" GROUP BY {grupo}"
+        partes.append(sql)
+    return "\nUNION ALL\n".join(partes), params
+
+
+def assinatura(conn, marcas=None):
+    """Contagens e maiores dias de cada tabela (e grupo), em texto (uma única query).
+
+    Com `marcas`, só da parte anterior às marcas d'água (a que o delta não relê).
+    """
+    sql, params = _consulta_assinatura(conn.dialect.name, marcas)
+    linhas = [[None if v is None else str(v) for v in linha] for linha in conn.execute(text(sql), params)]
+    return sorted(linhas, key=lambda linha: (linha[0], linha[1] or ''))
+
+
+def calcular_fingerprint(conn):
+    """Hash da assinatura das sete tabelas inteiras."""
+    h = hashlib.sha256()
+    for linha in assinatura(conn):
+        h.update(("|".join(map(str, linha)) + "\n").encode())
+    return h.hexdigest()[:16]
+
+
+def versao_dados(nome, fingerprint):
+    """Identificador da versão dos dados (também o nome do arquivo do snapshot)."""
+    return f"{nome}_v{VERSAO_SNAPSHOT}_{fingerprint}"
+
+
+def caminho_snapshot(nome, fingerprint, pasta=None):
+    pasta = pasta or PASTA_SNAPSHOT
+    return os.path.join(pasta, f"{versao_dados(nome, fingerprint)}.arrow")
+
+
+def ler_snapshot(caminho):
+    """Lê o snapshot via memory-map e o converte para pandas.
+
+    O arquivo é lido sem cópia, mas o to_pandas copia as colunas para a
+    memória do processo: cada processo fica com a sua cópia da base. A base
+    compartilhada entre processos é a de olist_compartilhado.
+    """
+    return feather.read_table(caminho, memory_map=True).to_pandas()
+
+
+def ler_marcas_snapshot(caminho):
+    """Marcas d'água e conferência gravadas no snapshot (lê apenas o schema do arquivo)."""
+    with pa.memory_map(caminho) as arquivo:
+        metadados = pa.ipc.open_file(arquivo).schema.metadata or {}
+    marcas = metadados.get(b'olist_marcas_dagua')
+    conferencia = metadados.get(b'olist_conferencia')
+    return (json.loads(marcas) if marcas else None), (json.loads(conferencia) if conferencia else None)
+
+
+def salvar_snapshot(df, caminho, marcas=None, conferencia=None):
+    """Grava de forma atômica (arquivo temporário + rename)."""
+    os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    if marcas is not None:
+        metadados = dict(tabela.schema.metadata or {})
+        metadados[b'olist_marcas_dagua'] = json.dumps(marcas).encode()
+        metadados[b'olist_conferencia'] = json.dumps(conferencia).encode()
+        tabela = tabela.replace_schema_metadata(metadados)
+    tmp = f"{caminho}.{os.getpid()}.tmp"
+    feather.write_feather(tabela, tmp, compression='uncompressed')
+    os.replace(tmp, caminho)
+
+
+def snapshot_anterior(nome, pasta=None):
+    """Snapshot mais recente do conjunto na versão atual, se houver."""
+    pasta = pasta or PASTA_SNAPSHOT
+    candidatos = glob.glob(os.path.join(pasta, f"{nome}_v{VERSAO_SNAPSHOT}_*.arrow"))
+    return max(candidatos, key=os.path.getmtime) if candidatos else None
+
+
+def ler_ultimo_snapshot(nome, pasta=None):
+    """Snapshot mais recente já em disco, sem consultar o banco (None se não houver).
+
+    Serve de versão inicial enquanto a validação contra o banco roda em segundo plano.
+    """
+    caminho = snapshot_anterior(nome, pasta)
+    if caminho is None:
+        return None
+    try:
+        df = ler_snapshot(caminho)
+    except OSError:
+        # Removido por outro processo entre o glob e a leitura
+        return None
+    # O nome do arquivo é a própria versão dos dados (nome_vN_fingerprint)
+    df.attrs['versao_dados'] = os.path.splitext(os.path.basename(caminho))[0]
+    return df
+
+
+def remover_snapshots_antigos(nome, atual, pasta=None):
+    """Apaga snapshots do mesmo conjunto com outra versão ou impressão digital."""
+    pasta = pasta or PASTA_SNAPSHOT
+    for antigo in glob.glob(os.path.join(pasta, f"{nome}_v*.arrow")):
+        if antigo != atual:
+            try:
+                os.remove(antigo)
+            except OSError:
+                pass
+
+
+def aplicar_delta(df_base, df_delta, chave='order_id'):
+    """Substitui na base as linhas dos pedidos presentes no delta (idempotente)."""
+    if df_delta.empty:
+        return df_base
+    mantidas = df_base.take(np.flatnonzero(~df_base[chave].isin(df_delta[chave].unique())))
+    return concatenar([mantidas, df_delta[df_base.columns]])
+
+
+def _carregar_do_banco(conn, nome, construir, pasta, atualizar):
+    # Marcas e conferência lidas antes da carga: o que chegar durante ela é relido na próxima
+    with etapa('conferencia'):
+        marcas = ler_marcas_dagua(conn)
+        conferencia = assinatura(conn, marcas)
+        anterior = snapshot_anterior(nome, pasta) if atualizar is not None else None
+        marcas_anteriores, conferencia_anterior = ler_marcas_snapshot(anterior) if anterior else (None, None)
+        # O delta só basta se nada anterior às marcas do snapshot mudou
+        incremental = bool(marcas_anteriores) and conferencia_anterior == assinatura(conn, marcas_anteriores)
+    if incremental:
+        with etapa('leitura_snapshot') as e:
+            df_anterior = e.saida(ler_snapshot(anterior))
+        return atualizar(conn, df_anterior, marcas_anteriores), marcas, conferencia
+    return construir(conn), marcas, conferencia
+
+
+def carregar_com_snapshot(conn, nome, construir, pasta=None, atualizar=None):
+    """Devolve o snapshot válido para o estado atual do banco, ou reconstrói via `construir(conn)`.
+
+    Se `atualizar(conn, df_anterior, marcas)` for informado e houver um snapshot
+    anterior com marcas d'água, ele é atualizado só com o delta em vez da
+    reconstrução completa, a menos que a parte anterior às marcas tenha mudado.
+    As faixas de order_id são lidas em conexões (e transações) separadas (ver
+    olist_sql.carregar_olist_sql): a impressão digital é relida ao fim e, se o
+    banco mudou durante a carga, ela é refeita (até TENTATIVAS_CARGA vezes).
+    """
+    with etapa('fingerprint'):
+        fingerprint = calcular_fingerprint(conn)
+    for tentativa in range(1, TENTATIVAS_CARGA + 1):
+        caminho = caminho_snapshot(nome, fingerprint, pasta)
+        if os.path.exists(caminho):
+            with etapa('leitura_snapshot') as e:
+                df = e.saida(ler_snapshot(caminho))
+            df.attrs['versao_dados'] = versao_dados(nome, fingerprint)
+            return df
+
+        df, marcas, conferencia = _carregar_do_banco(conn, nome, construir, pasta, atualizar)
+        # Nova transação: no MySQL (REPEATABLE READ) a atual ainda vê o banco de antes da carga
+        conn.rollback()
+        with etapa('fingerprint'):
+            depois = calcular_fingerprint(conn)
+        if depois == fingerprint:
+            break
+        log.warning("%s: o banco mudou durante a carga (tentativa %d de %d)", nome, tentativa, TENTATIVAS_CARGA)
+        fingerprint = depois
+    else:
+        raise RuntimeError(f"O banco mudou durante as {TENTATIVAS_CARGA} tentativas de carga de '{nome}'.")
+
+    if not df.empty:
+        with etapa('gravacao_snapshot', df):
+            salvar_snapshot(df, caminho, marcas, conferencia)
+            remover_snapshots_antigos(nome, caminho, pasta)
+    # Versão dos dados: chave dos caches derivados (agregados, figuras...)
+    df.attrs['versao_dados'] = versao_dados(nome, fingerprint)
+    return df
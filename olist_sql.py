@@ -0,0 +1,375 @@
+from concurrent.futures import Future
+
+import pandas as pd
+from sqlalchemy import text
+
+from olist_conexao import ler_em_paralelo
+from olist_tipos import concatenar, normalizar_datas
+
+# --- CONSTRUTOR DE QUERY (JOIN NO SERVIDOR) ---
+# Em vez de trazer as sete tabelas com SELECT * e juntar no pandas, montamos
+# uma única query com os LEFT JOINs, a deduplicação de pagamentos/reviews e
+# apenas as colunas que o dashboard usa. Requer ROW_NUMBER() (MySQL 8+ / SQLite 3.25+).
+
+TABELAS = {
+    'o': 'olist_orders_dataset',
+    'i': 'olist_order_items_dataset',
+    'p': 'olist_products_dataset',
+    'c': 'olist_customers_dataset',
+    's': 'olist_sellers_dataset',
+    'pg': 'olist_order_payments_dataset',
+    'r': 'olist_order_reviews_dataset',
+}
+
+# Coluna de saída -> (alias da tabela, expressão SQL)
+EXPRESSOES = {
+    'order_id': ('o', 'o.order_id'),
+    'customer_id': ('o', 'o.customer_id'),
+    'order_status': ('o', 'o.order_status'),
+    'order_purchase_timestamp': ('o', 'o.order_purchase_timestamp'),
+    'order_approved_at': ('o', 'o.order_approved_at'),
+    'order_delivered_customer_date': ('o', 'o.order_delivered_customer_date'),
+    'order_estimated_delivery_date': ('o', 'o.order_estimated_delivery_date'),
+    'order_item_id': ('i', 'i.order_item_id'),
+    'product_id': ('i', 'i.product_id'),
+    'seller_id': ('i', 'i.seller_id'),
+    'price': ('i', 'i.price'),
+    'freight_value': ('i', 'i.freight_value'),
+    'product_category_name': ('p', 'p.product_category_name'),
+    'product_photos_qty': ('p', 'p.product_photos_qty'),
+    'product_weight_g': ('p', 'p.product_weight_g'),
+    'product_length_cm': ('p', 'p.product_length_cm'),
+    'product_height_cm': ('p', 'p.product_height_cm'),
+    'product_width_cm': ('p', 'p.product_width_cm'),
+    'customer_zip_code_prefix': ('c', 'c.customer_zip_code_prefix'),
+    'customer_city': ('c', 'c.customer_city'),
+    'customer_state': ('c', 'c.customer_state'),
+    'seller_state': ('s', 's.seller_state'),
+    'payment_type': ('pg', 'pg.payment_type'),
+    'payment_installments': ('pg', 'pg.payment_installments'),
+    'payment_value': ('pg', 'pg.payment_value'),
+    'review_score': ('r', 'r.review_score'),
+    'review_comment': ('r', 'r.review_comment'),
+}
+
+# Colunas usadas pelo dashboard final (projeto_final_SQL_final.py)
+COLUNAS_DASHBOARD = [
+    'order_id', 'order_item_id', 'order_status',
+    'order_purchase_timestamp', 'order_approved_at',
+    'order_delivered_customer_date', 'order_estimated_delivery_date',
+    'price', 'freight_value', 'product_id', 'seller_id',
+    'product_category_name', 'product_photos_qty', 'product_weight_g',
+    'product_length_cm', 'product_height_cm', 'product_width_cm',
+    'customer_zip_code_prefix', 'customer_city', 'customer_state',
+    'seller_state',
+    'payment_type', 'payment_installments',
+    'review_score', 'review_comment',
+]
+
+# Colunas usadas pela versão de tratamento avançado (projeto_final_SQL.py)
+COLUNAS_V3 = [
+    'order_id', 'order_item_id', 'order_status',
+    'order_purchase_timestamp', 'order_approved_at',
+    'order_delivered_customer_date', 'order_estimated_delivery_date',
+    'price', 'freight_value', 'product_id', 'seller_id', 'product_category_name',
+    'customer_zip_code_prefix', 'customer_city', 'customer_state',
+    'seller_state',
+    'payment_type', 'payment_installments',
+    'review_score', 'review_comment',
+]
+
+# Pagamentos: mantém apenas o MAIOR pagamento por pedido (desempate pela sequência)
+SQL_PAGAMENTOS = """
+    SELECT order_id, payment_type, payment_installments, payment_value
+    FROM (
+        SELECT order_id, payment_type, payment_installments,
+               CAST(REPLACE(payment_value, ',', '.') AS DECIMAL(12, 2)) AS payment_value,
+               ROW_NUMBER() OVER (
+                   PARTITION BY order_id
+                   ORDER BY CAST(REPLACE(payment_value, ',', '.') AS DECIMAL(12, 2)) DESC,
+                            payment_sequential
+               ) AS rn
+        FROM olist_order_payments_dataset{filtro}
+    ) pg_rank
+    WHERE rn = 1"""
+
+# Reviews: mantém apenas a primeira review por pedido (a mais antiga). A data
+# de criação é texto com ISO e DD/MM/YYYY misturados: ordena pelo dia
+# normalizado e depois pela hora, que fica na mesma posição nos dois formatos
+SQL_REVIEWS = """
+    SELECT order_id, review_score, {comentario} AS review_comment
+    FROM (
+        SELECT order_id, review_score, review_comment_message,
+               ROW_NUMBER() OVER (
+                   PARTITION BY order_id
+                   ORDER BY {dia_criacao}, SUBSTR(review_creation_date, 12), review_id
+               ) AS rn
+        FROM olist_order_reviews_dataset{filtro}
+    ) r_rank
+    WHERE rn = 1"""
+
+# --- MARCAS D'ÁGUA (ATUALIZAÇÃO INCREMENTAL) ---
+# Pedidos, itens e reviews só crescem: a maior data já vista em cada tabela
+# delimita o que é novo. As colunas são texto com ISO e DD/MM/YYYY misturados,
+# e o MAX do texto cru fica preso em '31/12/...': as marcas são o maior dia
+# normalizado para 'YYYY-MM-DD' (ver data_normalizada). O delta relê tudo a
+# partir do dia da marca (>=), inclusive o próprio dia; reler um pedido não
+# muda o resultado, pois aplicar_delta substitui pedidos inteiros.
+# Pagamentos, clientes, produtos e vendedores não têm marca: olist_snapshot
+# confere se mudaram fora do delta antes de atualizar só com ele.
+MARCAS_DAGUA = {
+    'olist_orders_dataset': 'order_purchase_timestamp',
+    'olist_order_items_dataset': 'shipping_limit_date',
+    'olist_order_reviews_dataset': 'review_creation_date',
+}
+
+
+def data_normalizada(col, dialeto):
+    """Expressão SQL com o dia de `col` em 'YYYY-MM-DD', esteja ela em ISO ou DD/MM/YYYY (NULL segue NULL)."""
+    partes = [f"SUBSTR({col}, 7, 4)", "'-'", f"SUBSTR({col}, 4, 2)", "'-'", f"SUBSTR({col}, 1, 2)"]
+    # No MySQL '||' é o OU lógico: a concatenação é CONCAT()
+    dia_br = f"CONCAT({', '.join(partes)})" if dialeto == 'mysql' else " || ".join(partes)
+    return f"CASE WHEN SUBSTR({col}, 3, 1) = '/' THEN {dia_br} ELSE SUBSTR({col}, 1, 10) END"
+
+
+def ler_marcas_dagua(conn):
+    """Maior dia atual (normalizado) da coluna de data de cada tabela incremental."""
+    dialeto = conn.dialect.name
+    partes = [f"SELECT '{tabela}' AS tabela, MAX({data_normalizada(col, dialeto)}) AS marca FROM {tabela}"
+              for tabela, col in MARCAS_DAGUA.items()]
+    linhas = conn.execute(text("\nUNION ALL\n".join(partes))).fetchall()
+    return {tabela: (str(marca) if marca is not None else None) for tabela, marca in linhas}
+
+
+def montar_filtro_delta(marcas, dialeto):
+    """Subquery com os pedidos afetados desde as marcas d'água, e seus parâmetros.
+
+    Um pedido é afetado se ele próprio, algum item ou alguma review dele for
+    do dia da marca da respectiva tabela em diante; o pedido inteiro é então relido.
+    """
+    partes, params = [], {}
+    for n, (tabela, col) in enumerate(MARCAS_DAGUA.items()):
+        marca = marcas.get(tabela)
+        if marca is None:
+            partes.append(f"SELECT order_id FROM {tabela} WHERE {col} IS NOT NULL")
+        else:
+            partes.append(f"SELECT order_id FROM {tabela} WHERE {data_normalizada(col, dialeto)} >= :marca_{n}")
+            params[f"marca_{n}"] = marca
+    return "\n        UNION\n        ".join(partes), params
+
+
+# --- PARTIÇÕES POR order_id (LEITURA PARALELA) ---
+# order_id é um hash hexadecimal: faixas pelo primeiro dígito dividem os
+# pedidos em partes de tamanho parecido. Cada pedido cai em uma única faixa,
+# então a deduplicação de pagamentos/reviews continua correta por partição.
+# A primeira e a última faixa são abertas, cobrindo qualquer formato de id.
+# Cada faixa é lida em outra conexão e transação, então o resultado não é um
+# retrato único do banco: carregar_com_snapshot relê a impressão digital ao
+# fim e refaz a carga se algo mudou no meio.
+DIGITOS_HEX = '0123456789abcdef'
+
+
+def faixas_pedidos(particoes):
+    """Lista de faixas (inicio, fim) de order_id; None = faixa aberta."""
+    particoes = max(1, min(particoes, len(DIGITOS_HEX)))
+    cortes = [DIGITOS_HEX[round(k * len(DIGITOS_HEX) / particoes)] for k in range(1, particoes)]
+    limites = [None] + cortes + [None]
+    return list(zip(limites[:-1], limites[1:]))
+
+
+def montar_query_olist(colunas=None, comentario_vazio_como_nulo=True, filtro_pedidos=None, faixa_pedidos=None,
+                       dialeto=None):
+    """Monta o SELECT único com os JOINs necessários para as colunas pedidas.
+
+    `filtro_pedidos` é uma subquery de order_id que restringe o resultado (e as
+    deduplicações de pagamentos/reviews) a esses pedidos. `faixa_pedidos`
+    (inicio, fim) restringe a uma faixa de order_id, com os valores passados
+    nos parâmetros :pedido_ini / :pedido_fim. `dialeto` (conn.dialect.name)
+    escolhe a concatenação da data normalizada das reviews.
+    """
+    colunas = list(colunas or COLUNAS_DASHBOARD)
+    desconhecidas = [c for c in colunas if c not in EXPRESSOES]
+    if desconhecidas:
+        raise ValueError(f"Colunas sem mapeamento SQL: {desconhecidas}")
+
+    aliases = {EXPRESSOES[c][0] for c in colunas}
+    # Produtos e vendedores dependem das chaves dos itens
+    if aliases & {'p', 's'}:
+        aliases.add('i')
+
+    select = ",\n    ".join(f"{EXPRESSOES[c][1]} AS {c}" for c in colunas)
+    sql = f"SELECT\n    {select}\nFROM {TABELAS['o']} o"
+
+    # Itens sempre entram: definem a granularidade (uma linha por item)
+    sql += f"\nLEFT JOIN {TABELAS['i']} i ON i.order_id = o.order_id"
+    if 'p' in aliases:
+        sql += f"\nLEFT JOIN {TABELAS['p']} p ON p.product_id = i.product_id"
+    if 'c' in aliases:
+        sql += f"\nLEFT JOIN {TABELAS['c']} c ON c.customer_id = o.customer_id"
+    if 's' in aliases:
+        sql += f"\nLEFT JOIN {TABELAS['s']} s ON s.seller_id = i.seller_id"
+    condicoes = []
+    if filtro_pedidos:
+        condicoes.append(f"order_id IN (\n        {filtro_pedidos}\n        )")
+    if faixa_pedidos is not None:
+        if faixa_pedidos[0] is not None:
+            condicoes.append("order_id >= :pedido_ini")
+        if faixa_pedidos[1] is not None:
+            condicoes.append("order_id < :pedido_fim")
+    filtro = "\n        WHERE " + " AND ".join(condicoes) if condicoes else ""
+    if 'pg' in aliases:
+        sql += f"\nLEFT JOIN ({SQL_PAGAMENTOS.format(filtro=filtro)}\n) pg ON pg.order_id = o.order_id"
+    if 'r' in aliases:
+        comentario = "NULLIF(review_comment_message, '')" if comentario_vazio_como_nulo else "review_comment_message"
+        dia_criacao = data_normalizada('review_creation_date', dialeto)
+        sql += (f"\nLEFT JOIN ({SQL_REVIEWS.format(comentario=comentario, dia_criacao=dia_criacao, filtro=filtro)}"
+                f"\n) r ON r.order_id = o.order_id")
+    if condicoes:
+        sql += "\nWHERE " + " AND ".join(f"o.{c}" for c in condicoes)
+    return sql
+
+
+def _ler_query(conn, sql, params, tamanho_chunk=None, tratar_chunk=None):
+    if tamanho_chunk is None:
+        df = pd.read_sql(sql, conn, params=params)
+        return tratar_chunk(df) if tratar_chunk else df
+
+    conn = conn.execution_options(stream_results=True)
+    partes = []
+    for chunk in pd.read_sql(sql, conn, params=params, chunksize=tamanho_chunk):
+        partes.append(tratar_chunk(chunk) if tratar_chunk else chunk)
+    # Blocos tratados em um pool de processos chegam como Future (ver olist_paralelo)
+    return concatenar([p.result() if isinstance(p, Future) else p for p in partes])
+
+
+def carregar_olist_sql(conn, colunas=None, comentario_vazio_como_nulo=True, desde=None,
+                       tamanho_chunk=None, tratar_chunk=None, particoes=1):
+    """Executa a query única no servidor e devolve o DataFrame já juntado.
+
+    Com `desde` (marcas d'água de `ler_marcas_dagua`), traz apenas os pedidos
+    novos ou alterados depois delas. Com `tamanho_chunk`, o resultado é lido
+    em blocos por um cursor no servidor e cada bloco passa por `tratar_chunk`
+    (tipagem/downcast) antes de ser guardado, reduzindo o pico de memória.
+    Com `particoes` > 1, a query é dividida em faixas de order_id lidas em
+    paralelo, cada uma em outra conexão do pool do engine de `conn`.
+    """
+    params = {}
+    filtro = None
+    dialeto = conn.dialect.name
+    if desde is not None:
+        filtro, params = montar_filtro_delta(desde, dialeto)
+
+    if particoes <= 1:
+        sql = text(montar_query_olist(colunas, comentario_vazio_como_nulo, filtro_pedidos=filtro, dialeto=dialeto))
+        return _ler_query(conn, sql, params, tamanho_chunk, tratar_chunk)
+
+    tarefas = {}
+    for faixa in faixas_pedidos(particoes):
+        sql = text(montar_query_olist(colunas, comentario_vazio_como_nulo, filtro_pedidos=filtro, faixa_pedidos=faixa,
+                                      dialeto=dialeto))
+        params_faixa = {**params, 'pedido_ini': faixa[0], 'pedido_fim': faixa[1]}
+        params_faixa = {k: v for k, v in params_faixa.items() if v is not None}
+        tarefas[faixa] = (lambda c, sql=sql, p=params_faixa:
+                          _ler_query(c, sql, p, tamanho_chunk, tratar_chunk))
+    partes = ler_em_paralelo(conn.engine, tarefas, max_workers=particoes)
+    return concatenar(list(partes.values()))
+
+
+# --- CAMINHO DE REFERÊNCIA (PANDAS) ---
+def ler_tabelas(conn, paralelo=False):
+    """SELECT * das sete tabelas (alias -> DataFrame).
+
+    Com `paralelo`, as tabelas (independentes entre si) são lidas ao mesmo
+    tempo, cada uma em uma conexão do pool do engine de `conn`.
+    """
+    tarefas = {alias: (lambda c, t=tabela: pd.read_sql(f"SELECT * FROM {t}", c))
+               for alias, tabela in TABELAS.items()}
+    if paralelo:
+        return ler_em_paralelo(conn.engine, tarefas, max_workers=len(tarefas))
+    return {alias: ler(conn) for alias, ler in tarefas.items()}
+
+
+def deduplicar_pagamentos(df_payments):
+    """Maior pagamento por pedido (desempate pela sequência), como SQL_PAGAMENTOS."""
+    df_payments['payment_value'] = pd.to_numeric(df_payments['payment_value'].astype(str).str.replace(',', '.'), errors='coerce')
+    return (df_payments
+            .sort_values(['payment_value', 'payment_sequential'], ascending=[False, True], kind='stable')
+            .drop_duplicates(subset=['order_id'], keep='first'))
+
+
+def deduplicar_reviews(df_reviews, comentario_vazio_como_nulo=True):
+    """Primeira review por pedido (a mais antiga), como SQL_REVIEWS."""
+    if comentario_vazio_como_nulo:
+        df_reviews['review_comment_message'] = df_reviews['review_comment_message'].replace('', pd.NA)
+    df_reviews = df_reviews.rename(columns={'review_comment_message': 'review_comment'})
+    # Ordem pela data convertida (ISO e DD/MM/YYYY misturados no texto); sem data vem primeiro, como no SQL
+    criacao = normalizar_datas(df_reviews['review_creation_date']).rename('_criacao')
+    return (df_reviews
+            .assign(_criacao=criacao)
+            .sort_values(['_criacao', 'review_id'], kind='stable', na_position='first')
+            .drop_duplicates(subset=['order_id'], keep='first')
+            .drop(columns='_criacao'))
+
+
+def juntar_tabelas(tabelas, df_payments_unique, df_reviews_unique):
+    """LEFT JOINs do caminho antigo, com pagamentos e reviews já deduplicados."""
+    df = pd.merge(tabelas['o'], tabelas['i'], on='order_id', how='left')
+    df = pd.merge(df, tabelas['p'], on='product_id', how='left')
+    df = pd.merge(df, tabelas['c'], on='customer_id', how='left')
+    df = pd.merge(df, tabelas['s'], on='seller_id', how='left')
+    df = pd.merge(df, df_payments_unique, on='order_id', how='left')
+    return pd.merge(df, df_reviews_unique, on='order_id', how='left')
+
+
+def carregar_olist_pandas(conn, colunas=None, comentario_vazio_como_nulo=True, paralelo=False):
+    """Reproduz o caminho antigo (SELECT * + pd.merge) para comparação.
+
+    Os desempates da deduplicação seguem a mesma ordem da query SQL, pois o
+    SELECT * original não garante ordem das linhas.
+    """
+    colunas = list(colunas or COLUNAS_DASHBOARD)
+    tabelas = ler_tabelas(conn, paralelo)
+    df = juntar_tabelas(tabelas, deduplicar_pagamentos(tabelas['pg']),
+                        deduplicar_reviews(tabelas['r'], comentario_vazio_como_nulo))
+    return df[colunas]
+
+
+def _normalizar_coluna(col):
+    # Os drivers devolvem tipos diferentes (Decimal, str, float): colunas numéricas
+    # são comparadas pelo valor, as demais pelo texto
+    num = pd.to_numeric(col.astype(str).str.replace(',', '.'), errors='coerce')
+    if num.notna().sum() == col.notna().sum():
+        return num
+    return col.astype(str).where(col.notna())
+
+
+def verificar_equivalencia(conn, colunas=None, comentario_vazio_como_nulo=True):
+    """Compara o caminho SQL (único e particionado) com o caminho pandas.
+
+    Levanta AssertionError se divergirem.
+    """
+    colunas = list(colunas or COLUNAS_DASHBOARD)
+    chave = [c for c in ('order_id', 'order_item_id') if c in colunas]
+
+    def normalizar(df):
+        df = df.sort_values(chave, kind='stable').reset_index(drop=True)
+        return df.apply(_normalizar_coluna)
+
+    df_sql = normalizar(carregar_olist_sql(conn, colunas, comentario_vazio_como_nulo))
+    df_pd = normalizar(carregar_olist_pandas(conn, colunas, comentario_vazio_como_nulo))
+    pd.testing.assert_frame_equal(df_sql, df_pd, check_dtype=False)
+    # A leitura particionada em paralelo tem de devolver exatamente as mesmas linhas
+    df_par = normalizar(carregar_olist_sql(conn, colunas, comentario_vazio_como_nulo, particoes=4))
+    pd.testing.assert_frame_equal(df_par, df_sql)
+    return len(df_sql)
+
+
+if __name__ == "__main__":
+    # Uso: python olist_sql.py sqlite:///olist.db
+    import sys
+    from olist_conexao import criar_engine
+
+    engine = criar_engine(sys.argv[1])
+    with engine.connect() as conn:
+        n = verificar_equivalencia(conn)
+    print(f"OK: caminho SQL e caminho pandas idênticos ({n:,} linhas).")
@@ -0,0 +1,278 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from pandas.tseries.api import guess_datetime_format
+
+# --- TIPAGEM COMPACTA ---
+# Conversões aplicadas a cada bloco (chunk) assim que ele chega do banco, para
+# que só blocos já compactos fiquem em memória até a concatenação:
+# preços/medidas em float32, contagens pequenas em inteiros mínimos e colunas
+# de baixa cardinalidade como Categorical.
+
+# Colunas numéricas de ponto flutuante (float32 basta para preço, frete e medidas)
+COLUNAS_FLOAT = ['price', 'freight_value', 'payment_value', 'product_weight_g',
+                 'product_length_cm', 'product_height_cm', 'product_width_cm']
+
+# Contagens pequenas: viram int8/int16 quando não há ausentes
+COLUNAS_INTEIRAS = ['product_photos_qty', 'review_score', 'payment_installments']
+
+# Dimensões de baixa cardinalidade: Categorical desde a leitura, para que
+# value_counts/groupby nas abas trabalhem sobre códigos inteiros
+COLUNAS_CATEGORICAS = ['order_status', 'customer_state', 'seller_state',
+                       'payment_type', 'product_category_name']
+
+
+def converter_numericos(df, colunas, preencher_zero=False):
+    """Converte para número (aceitando vírgula decimal) no menor tipo adequado.
+
+    Com `preencher_zero`, ausentes viram 0 (comportamento do dashboard final).
+    """
+    for col in colunas:
+        if col not in df.columns:
+            continue
+        s = df[col]
+        # Só faz a volta por string quando o driver entregou texto/Decimal
+        if not pd.api.types.is_numeric_dtype(s):
+            s = pd.to_numeric(s.astype(str).str.replace(',', '.'), errors='coerce')
+        if preencher_zero:
+            s = s.fillna(0)
+        if col in COLUNAS_INTEIRAS and s.notna().all() and (s % 1 == 0).all():
+            df[col] = pd.to_numeric(s.astype('int64'), downcast='integer')
+        else:
+            df[col] = s.astype('float32')
+    return df
+
+
+def converter_categoricos(df, colunas=None):
+    for col in colunas or COLUNAS_CATEGORICAS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
+
+
+def converter_datas(df, colunas, parse_data=None):
+    # ISO e DD/MM/YYYY com formatos explícitos (ver normalizar_datas): o
+    # resultado não depende de qual bloco trouxe qual formato
+    parse_data = parse_data or normalizar_datas
+    for col in colunas:
+        if col in df.columns:
+            df[col] = parse_data(df[col])
+    return df
+
+
+# --- DATAS EM FORMATOS MISTOS ---
+# As datas chegam como texto ISO (padrão SQL), mas parte das linhas vem em
+# DD/MM/YYYY. As linhas de cada família são convertidas em passadas
+# vetorizadas separadas (strptime do Arrow, em C), uma por formato, na ordem
+# de frequência detectada em uma amostra da família; cada passada só olha as
+# linhas ainda pendentes. Em colunas com muitos textos repetidos (datas sem
+# hora, como a entrega prevista) cada texto distinto é convertido uma única
+# vez, com o dictionary_encode servindo de cache; em timestamps quase todos
+# distintos a deduplicação custaria mais que a conversão e é pulada. O que não
+# casa com nenhum formato vira NaT e é contado no relatório, em vez de sumir
+# em silêncio.
+
+# Textos tratados como ausentes (não contam como falha de conversão)
+VAZIOS = ['', 'nan', 'NaN', 'None', 'NaT', '<NA>', 'null', 'NULL']
+
+FORMATOS_ISO = ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d']
+FORMATOS_BR = ['%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y']
+AMOSTRA_FORMATO = 200
+# Deduplicação só compensa quando a amostra tem no máximo esta fração de textos distintos
+AMOSTRA_REPETICAO = 2_000
+LIMITE_DISTINTOS = 0.5
+
+_lock_relatorio = threading.Lock()
+
+
+def _amostra(textos, posicoes, tamanho):
+    """Amostra (com reposição, semente fixa) dos textos nas posições dadas."""
+    sorteio = np.random.default_rng(0).integers(0, len(posicoes), min(tamanho, len(posicoes)))
+    return textos.take(pa.array(posicoes[sorteio])).to_pylist()
+
+
+def _formatos(textos, familia, dayfirst, conhecidos):
+    """Formatos detectados na amostra da família (mais frequente primeiro), seguidos dos demais conhecidos."""
+    amostra = _amostra(textos, np.flatnonzero(familia), AMOSTRA_FORMATO)
+    palpites = pd.Series([guess_datetime_format(t, dayfirst=dayfirst) for t in amostra], dtype=object)
+    detectados = [f for f in palpites.dropna().value_counts().index if f in conhecidos]
+    return detectados + [f for f in conhecidos if f not in detectados]
+
+
+def _posicao_dia(formato):
+    # Diretivas de largura fixa: %Y ocupa 4 caracteres, as demais os mesmos 2 da diretiva
+    prefixo = formato[:formato.index('%d')]
+    return len(prefixo) + 2 * prefixo.count('%Y')
+
+
+def _converter_familia(textos, pendentes, formatos, convertidas):
+    """Uma passada vetorizada por formato sobre as linhas ainda pendentes (atualiza `pendentes`)."""
+    for formato in formatos:
+        if not pendentes.any():
+            break
+        posicoes = np.flatnonzero(pendentes)
+        parte = textos.take(pa.array(posicoes))
+        datas = pc.strptime(parte, format=formato, unit='us', error_is_null=True)
+        # O strptime do Arrow aceita 31/02 e devolve 03/03: o dia lido tem que ser o do texto
+        dia = _posicao_dia(formato)
+        validas = pc.fill_null(pc.equal(pc.utf8_lpad(pc.cast(pc.day(datas), pa.string()), 2, '0'),
+                                        pc.utf8_slice_codeunits(parte, dia, dia + 2)), False)
+        validas = validas.to_numpy(zero_copy_only=False)
+        convertidas[posicoes[validas]] = datas.to_numpy(zero_copy_only=False)[validas]
+        pendentes[posicoes[validas]] = False
+
+
+def _acumular(relatorio, coluna, parcial):
+    # Blocos de várias faixas chegam de threads diferentes
+    with _lock_relatorio:
+        total = relatorio.setdefault(coluna, {'linhas': 0, 'iso': 0, 'br': 0, 'nao_convertidas': 0, 'exemplos': []})
+        for chave in ('linhas', 'iso', 'br', 'nao_convertidas'):
+            total[chave] += parcial[chave]
+        total['exemplos'] = (total['exemplos'] + parcial['exemplos'])[:5]
+
+
+def juntar_relatorios(relatorio, outro):
+    """Soma em `relatorio` as contagens de `outro` (ex.: blocos tratados em outro processo)."""
+    for coluna, parcial in outro.items():
+        _acumular(relatorio, coluna, parcial)
+    return relatorio
+
+
+def normalizar_datas(serie, relatorio=None):
+    """Converte datas em texto ISO e/ou DD/MM/YYYY para datetime64[us].
+
+    Com `relatorio` (dict), acumula por coluna as linhas convertidas em cada
+    formato, as não convertidas e alguns exemplos delas.
+    """
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie
+    try:
+        textos = pa.array(serie, type=pa.string(), from_pandas=True)
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        # Objetos datetime/date do driver: o texto deles já sai em ISO
+        textos = pa.array(serie.astype(str), type=pa.string())
+    amostra = _amostra(textos, np.arange(len(textos)), AMOSTRA_REPETICAO)
+    if len(set(amostra)) <= LIMITE_DISTINTOS * len(amostra):
+        codificado = pc.dictionary_encode(textos)
+        textos = codificado.dictionary
+        # Código -1 (ausente) aponta para a posição extra no fim, que fica NaT
+        codigos = pc.fill_null(codificado.indices, -1).to_numpy(zero_copy_only=False)
+    else:
+        codigos = None
+    textos = pc.utf8_trim_whitespace(textos)
+
+    vazios = pc.or_(pc.is_null(textos), pc.is_in(textos, pa.array(VAZIOS))).to_numpy(zero_copy_only=False)
+    iso = pc.fill_null(pc.equal(pc.utf8_slice_codeunits(textos, 4, 5), '-'), False).to_numpy(zero_copy_only=False) & ~vazios
+    br = pc.fill_null(pc.equal(pc.utf8_slice_codeunits(textos, 2, 3), '/'), False).to_numpy(zero_copy_only=False) & ~vazios
+
+    convertidas = np.full(len(textos) + 1, np.datetime64('NaT'), dtype='datetime64[us]')
+    pendentes_iso, pendentes_br = iso.copy(), br.copy()
+    if iso.any():
+        _converter_familia(textos, pendentes_iso, _formatos(textos, iso, False, FORMATOS_ISO), convertidas)
+    if br.any():
+        _converter_familia(textos, pendentes_br, _formatos(textos, br, True, FORMATOS_BR), convertidas)
+    # Sobras ISO fora dos formatos usuais (frações de segundo, 'T'...): pandas, só nelas
+    if pendentes_iso.any():
+        posicoes = np.flatnonzero(pendentes_iso)
+        convertidas[posicoes] = pd.to_datetime(pd.Series(textos.take(pa.array(posicoes)), dtype=object),
+                                               format='ISO8601', errors='coerce').to_numpy('datetime64[us]')
+
+    if codigos is None:
+        codigos = np.arange(len(textos))
+    if relatorio is not None:
+        falhas = np.isnat(convertidas[:-1]) & ~vazios
+        linhas = np.bincount(codigos[codigos >= 0], minlength=len(textos))
+        _acumular(relatorio, serie.name, {
+            'linhas': len(serie),
+            'iso': int(linhas[iso & ~falhas].sum()),
+            'br': int(linhas[br & ~falhas].sum()),
+            'nao_convertidas': int(linhas[falhas].sum()),
+            'exemplos': textos.filter(pa.array(falhas)).slice(0, 5).to_pylist(),
+        })
+    return pd.Series(convertidas[codigos], index=serie.index, name=serie.name)
+
+
+def nao_convertidas(relatorio):
+    """{coluna: linhas não convertidas}, só das colunas com falhas."""
+    return {col: r['nao_convertidas'] for col, r in relatorio.items() if r['nao_convertidas']}
+
+
+def tipar_chunk(chunk, zerar=(), numericos=(), datas=(), parse_data=None, categoricas=None):
+    """Tipagem completa de um bloco: numéricos, datas e categorias."""
+    converter_numericos(chunk, zerar, preencher_zero=True)
+    converter_numericos(chunk, numericos)
+    converter_datas(chunk, datas, parse_data)
+    return converter_categoricos(chunk, categoricas)
+
+
+def concatenar(partes):
+    """pd.concat que preserva Categorical unificando as categorias dos blocos.
+
+    O concat puro transforma categorias diferentes em object, desfazendo a
+    economia. As categorias dos blocos são ajustadas no próprio bloco.
+    """
+    partes = [p for p in partes if p is not None]
+    if len(partes) == 1:
+        return partes[0]
+    categoricas = [c for c in partes[0].columns
+                   if all(isinstance(p[c].dtype, pd.CategoricalDtype) for p in partes)]
+    for col in categoricas:
+        categorias = partes[0][col].cat.categories
+        for p in partes[1:]:
+            categorias = categorias.union(p[col].cat.categories)
+        for p in partes:
+            p[col] = p[col].cat.set_categories(categorias)
+    return pd.concat(partes, ignore_index=True)
+
+
+def preencher_categoria(serie, valor):
+    """fillna que também funciona em Categorical (acrescenta a categoria se faltar)."""
+    if isinstance(serie.dtype, pd.CategoricalDtype) and valor not in serie.cat.categories:
+        serie = serie.cat.add_categories([valor])
+    return serie.fillna(valor)
+
+
+def alinhar_categorias(a, b):
+    """Deixa duas séries Categorical com as mesmas categorias (para comparação direta)."""
+    if isinstance(a.dtype, pd.CategoricalDtype) and isinstance(b.dtype, pd.CategoricalDtype):
+        categorias = a.cat.categories.union(b.cat.categories)
+        return a.cat.set_categories(categorias), b.cat.set_categories(categorias)
+    return a, b
+
+
+# --- OPERAÇÕES SOBRE CATEGORIAS ---
+# Limpezas de texto rodam uma vez por categoria distinta, não uma vez por linha.
+
+def formatar_categoria(categorias):
+    """'cama_mesa_banho' -> 'Cama Mesa Banho'."""
+    return categorias.str.replace('_', ' ').str.title()
+
+
+def limpar_categorias(serie, funcao):
+    """Aplica `funcao` (Index -> Index) às categorias e recodifica as linhas.
+
+    Categorias que passam a ter o mesmo rótulo são fundidas. Séries que não são
+    Categorical são convertidas antes.
+    """
+    if not isinstance(serie.dtype, pd.CategoricalDtype):
+        serie = serie.astype('category')
+    novos = pd.Index(funcao(serie.cat.categories.astype(str)))
+    unicos = novos.unique()
+    mapa = np.append(unicos.get_indexer(novos), -1)  # código -1 (ausente) continua -1
+    codigos = mapa[serie.cat.codes.to_numpy()]
+    return pd.Series(pd.Categorical.from_codes(codigos, unicos), index=serie.index, name=serie.name)
+
+
+def categorica_binaria(condicao, sim, nao, index=None):
+    """Rótulo de duas categorias montado direto dos códigos (sem strings por linha)."""
+    codigos = np.asarray(condicao, dtype=bool).astype('int8')
+    return pd.Series(pd.Categorical.from_codes(codigos, categories=[nao, sim]), index=index)
+
+
+def contar(serie):
+    """value_counts sem as categorias de contagem zero (que o Categorical mantém)."""
+    contagem = serie.value_counts()
+    return contagem[contagem > 0]
@@ -1,12 +1,34 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from sqlalchemy import create_engine
+from functools import partial
 import numpy as np
+from olist_conexao import criar_engine
+from olist_etl import carregar_modelo, ler_agregados, ultimo_modelo, SOMENTE_LEITURA
+from olist_modelo import filtrar_modelo
+from olist_graficos import CacheFiguras, figura_coortes, figura_histograma
+from olist_recompra import retencao
+from olist_atualizacao import AtualizadorEmSegundoPlano
+from olist_agregados import ABAS_V3
+from olist_exportacao import (FORMATOS, blocos_modelo, blocos_tabela, colunas_exportaveis, conteudo, exportar,
+                              tabelas_resumo)
+from olist_kpis import consultar, kpis_v3, meses_do_periodo, sketches_v3
+from olist_qualidade import bits, relatorio_qualidade
+from olist_filtros import construir_indices, opcoes, periodo_disponivel, posicoes_filtradas
+from olist_metricas import (concluir_execucao, etapa, iniciar_execucao, tabela_etapas, texto_prometheus,
+                            ultima_execucao)
 
 # Configuração da Página
 st.set_page_config(page_title="Analytics Olist - Tratamento Avançado", layout="wide")
 
+# Tempos de cada etapa desta execução da página (ver olist_metricas)
+execucao_pagina = iniciar_execucao('render_v3')
+
+def parar_pagina():
+    """st.stop() que antes conclui a execução da página (os tempos dela não se perdem)."""
+    concluir_execucao(execucao_pagina)
+    st.stop()
+
 # --- CONEXÃO ---
 @st.cache_resource
 def get_db_connection():
@@ -15,118 +37,154 @@ def get_db_connection():
     DB_USER = "alunosqlharve"
     DB_PASS = "Ed&ktw35j"
     DB_NAME = "modulosql"
-    return create_engine(f"mysql+pymysql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
-
-# --- FUNÇÃO DE LIMPEZA AVANÇADA ---
-def safe_date_parse(series):
-    """Tenta converter datas de forma robusta, lidando com formatos mistos."""
-    # Se já for data, retorna direto
-    if pd.api.types.is_datetime64_any_dtype(series):
-        return series
-    
-    # Converte para string e limpa
-    s = series.astype(str).str.strip().replace('nan', pd.NA).replace('None', pd.NA)
-    
-    # Tenta formato ISO (YYYY-MM-DD) primeiro (Padrão SQL)
-    try:
-        return pd.to_datetime(s, format='%Y-%m-%d %H:%M:%S', errors='coerce')
-    except:
-        # Se falhar, tenta formato BR (DD/MM/YYYY) com dayfirst=True
-        return pd.to_datetime(s, dayfirst=True, errors='coerce')
+    # Engine com pool (tamanho, pre-ping, reciclagem: ver olist_conexao.CONFIG_POOL)
+    return criar_engine(f"mysql+pymysql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
+
+@st.cache_resource
+def get_atualizador_v3():
+    # Compartilhado por todas as sessões: revalida a cada 10 min em segundo plano,
+    # servindo a versão anterior (ou o último snapshot em disco) enquanto isso
+    # No modo somente leitura (OLIST_SOMENTE_LEITURA=1) só relê o build gerado por olist_etl.py
+    engine = None if SOMENTE_LEITURA else get_db_connection()
+    return AtualizadorEmSegundoPlano(lambda: carregar_modelo('v3', engine), intervalo=600,
+                                     inicial=lambda: ultimo_modelo('v3'))
 
-# --- CARREGAMENTO ---
-@st.cache_data(ttl=600) # Cache curto para testes
 def load_data_v3():
-    engine = get_db_connection()
+    atualizador = get_atualizador_v3()
     try:
-        with engine.connect() as conn:
-            # Carrega tabelas
-            orders = pd.read_sql("SELECT * FROM olist_orders_dataset", conn)
-            items = pd.read_sql("SELECT * FROM olist_order_items_dataset", conn)
-            products = pd.read_sql("SELECT * FROM olist_products_dataset", conn)
-            customers = pd.read_sql("SELECT * FROM olist_customers_dataset", conn)
-            sellers = pd.read_sql("SELECT * FROM olist_sellers_dataset", conn)
-            payments = pd.read_sql("SELECT * FROM olist_order_payments_dataset", conn)
-            reviews = pd.read_sql("SELECT * FROM olist_order_reviews_dataset", conn)
-
-        # ---------------------------------------------------------
-        # CAMADA 1: TRATAMENTO DE DATAS NA ORIGEM
-        # ---------------------------------------------------------
-        date_cols = ['order_purchase_timestamp', 'order_approved_at', 
-                     'order_delivered_customer_date', 'order_estimated_delivery_date']
-        
-        for col in date_cols:
-            if col in orders.columns:
-                orders[col] = safe_date_parse(orders[col])
-
-        # ---------------------------------------------------------
-        # CAMADA 2: JOIN E CÁLCULO DE VALORES (EVITAR DUPLICIDADE)
-        # ---------------------------------------------------------
-        
-        # Base: Pedidos + Clientes (1:1)
-        df = pd.merge(orders, customers, on='customer_id', how='left')
-        
-        # + Itens (1:N) - Aqui o pedido pode "explodir" em linhas se tiver varios itens
-        df = pd.merge(df, items, on='order_id', how='left')
-        
-        # Tratamento de Valores (Substitui vírgula e garante float)
-        for col in ['price', 'freight_value']:
-            df[col] = pd.to_numeric(df[col].astype(str).str.replace(',', '.'), errors='coerce').fillna(0)
-            
-        # Valor Total da Linha (Item + Frete)
-        df['total_payment'] = df['price'] + df['freight_value']
-
-        # Enriquecimento
-        df = pd.merge(df, products, on='product_id', how='left')
-        df = pd.merge(df, sellers, on='seller_id', how='left')
-
-        # ---------------------------------------------------------
-        # CAMADA 3: PAGAMENTOS E REVIEWS (DEDUPLICAÇÃO ESTRITA)
-        # ---------------------------------------------------------
-        # Para evitar que um pedido de R$100 com 3 parcelas vire R$300
-        
-        # Pagamentos: Pegamos apenas os dados qualitativos (tipo, parcelas) do MAIOR pagamento
-        if not payments.empty:
-            payments['payment_value'] = pd.to_numeric(payments['payment_value'].astype(str).str.replace(',', '.'), errors='coerce')
-            pay_dedup = payments.sort_values('payment_value', ascending=False).drop_duplicates('order_id')
-            df = pd.merge(df, pay_dedup[['order_id', 'payment_type', 'payment_installments']], on='order_id', how='left')
-
-        # Reviews: Pegamos apenas o primeiro review
-        if not reviews.empty:
-            if 'review_comment_message' in reviews.columns:
-                reviews = reviews.rename(columns={'review_comment_message': 'review_comment'})
-            rev_dedup = reviews.drop_duplicates('order_id')
-            df = pd.merge(df, rev_dedup[['order_id', 'review_score', 'review_comment']], on='order_id', how='left')
-            
-            # Garante que review_score é número
-            df['review_score'] = pd.to_numeric(df['review_score'], errors='coerce')
-
-        return df
-
+        modelo = atualizador.obter()
     except Exception as e:
         st.error(f"Erro crítico no processamento: {e}")
-        st.stop()
+        parar_pagina()
+    if atualizador.ultimo_erro is not None:
+        st.sidebar.warning(f"Falha ao atualizar os dados; exibindo a versão anterior. ({atualizador.ultimo_erro})")
+    return modelo
+
+# Executa carregamento: modelo estrela com fato de pedidos, fato de itens e dimensões
+# (compartilhado entre sessões: não deve ser alterado no lugar)
+with etapa('carga_dados') as e:
+    modelo = e.saida(load_data_v3())
 
-# Executa carregamento
-df = load_data_v3()
+# Base vazia: nada a filtrar nem resumir (índices e sketches precisam de linhas)
+if modelo.empty:
+    st.error("Erro Crítico: nenhum pedido na base carregada.")
+    parar_pagina()
 
 # ---------------------------------------------------------
-# CAMADA 4: FILTRO DE DADOS SUJOS (OUTLIERS)
+# CAMADA 4: FILTRO DE DADOS SUJOS (OUTLIERS) E AGREGADOS
 # ---------------------------------------------------------
+# O filtro (apenas entregues, prazo entre 0 e 180 dias) e os resumos de cada
+# aba são calculados em olist_agregados, uma vez por versão dos dados e
+# combinação de filtros da barra lateral. O prazo fora da faixa é uma das
+# regras de qualidade marcadas na carga (ver olist_qualidade).
+
+# Filtros da barra lateral, servidos por índices montados uma vez por versão dos dados
+FILTROS = {
+    'customer_state': "UF do Cliente",
+    'seller_state': "UF do Vendedor",
+    'product_category_name': "Categoria",
+    'order_status': "Status do Pedido",
+}
+
+@st.cache_resource(max_entries=2)
+def carregar_indices_v3(versao, _modelo):
+    # Índices no grão de item (as categorias de produto e vendedor são do item)
+    return construir_indices(_modelo.itens_com(['order_purchase_timestamp', *FILTROS]),
+                             'order_purchase_timestamp', list(FILTROS), violacoes=_modelo.itens['violacoes'])
+
+@st.cache_data(max_entries=2)
+def carregar_qualidade_v3(versao, _modelo):
+    # Violações por regra na base inteira (antes dos filtros), uma vez por versão dos dados
+    return relatorio_qualidade(_modelo, 'v3')
+
+def filtros_sidebar(indices, qualidade):
+    """Widgets da barra lateral; devolve (período, seleções, regras excluídas) em forma hashável."""
+    st.sidebar.header("Filtros")
+    periodo = None
+    disponivel = periodo_disponivel(indices)
+    if disponivel is not None:
+        ini, fim = disponivel[0].date(), disponivel[1].date()
+        escolhido = st.sidebar.date_input("Período da Compra", value=(ini, fim), min_value=ini, max_value=fim)
+        # Durante a seleção o widget devolve só a data inicial
+        if isinstance(escolhido, (tuple, list)) and len(escolhido) == 2 and tuple(escolhido) != (ini, fim):
+            periodo = tuple(escolhido)
+    selecoes = tuple(
+        (col, tuple(st.sidebar.multiselect(rotulo, opcoes(indices, col))))
+        for col, rotulo in FILTROS.items() if col in indices['categorias']
+    )
+    # Só as regras com alguma violação na base
+    violadas = qualidade[qualidade['Itens'] > 0].set_index('Regra')
+    excluir = tuple(st.sidebar.multiselect(
+        "Excluir dados com problemas", list(violadas.index),
+        format_func=lambda regra: f"{violadas.at[regra, 'Descrição']} ({violadas.at[regra, 'Itens']:,})"))
+    return periodo, selecoes, excluir
+
+with etapa('indices', modelo):
+    indices = carregar_indices_v3(modelo.attrs.get('versao_dados'), modelo)
+with etapa('qualidade', modelo):
+    qualidade = carregar_qualidade_v3(modelo.attrs.get('versao_dados'), modelo)
+
+@st.cache_resource(max_entries=2)
+def carregar_sketches_v3(versao, _modelo):
+    # Sketches por mês x UF x categoria da base inteira (ver olist_kpis)
+    return sketches_v3(_modelo)
+
+with etapa('sketches', modelo):
+    sketches = carregar_sketches_v3(modelo.attrs.get('versao_dados'), modelo)
+periodo, selecoes, excluir = filtros_sidebar(indices, qualidade)
+with etapa('filtros', modelo) as e:
+    posicoes = posicoes_filtradas(indices, periodo, dict(selecoes), bits('v3', *excluir))
+    modelo = e.saida(filtrar_modelo(modelo, posicoes))
+
+if modelo.empty:
+    st.warning("Nenhum registro para os filtros selecionados.")
+    parar_pagina()
+
+sem_filtro = periodo is None and not any(valores for _, valores in selecoes) and not excluir
+
+@st.cache_resource(max_entries=2)
+def carregar_agregados_build_v3(versao):
+    # Agregados de todas as abas gravados pelo build (None se não houver), lidos uma vez por versão
+    return ler_agregados(versao)
+
+@st.cache_data(max_entries=256)
+def carregar_agregados_aba_v3(versao, filtros, aba, _modelo):
+    # `_modelo` não entra no hash do cache: a chave é a versão dos dados + filtros + aba
+    return ABAS_V3[aba](_modelo)
+
+def agregados_aba(aba):
+    """Resumos de uma aba só: os do build quando não há filtro, senão calculados (em cache)."""
+    versao = modelo.attrs.get('versao_dados')
+    if sem_filtro:
+        ag = carregar_agregados_build_v3(versao)
+        if ag is not None:
+            return ag
+    with etapa('agregados', modelo):
+        return carregar_agregados_aba_v3(versao, (periodo, selecoes, excluir), aba, modelo)
+
+def kpis_topo():
+    """Métricas do topo pelos sketches; com filtros que eles não cobrem, pelos resumos gerais."""
+    # Sketches cobrem período em meses inteiros, UF do cliente e categoria (sem exclusão por regra)
+    filtros = dict(selecoes)
+    meses = meses_do_periodo(periodo) if periodo is not None else None
+    if (periodo is not None and meses is None) or filtros.get('seller_state') or filtros.get('order_status') or excluir:
+        return agregados_aba('Geral')
+    with etapa('kpis'):
+        return kpis_v3(*consultar(sketches, meses, filtros.get('customer_state'), filtros.get('product_category_name')))
+
+ag = kpis_topo()
+
+# Figuras prontas em LRU compartilhado, por versão dos dados + filtros + gráfico
+@st.cache_resource
+def get_cache_figuras_v3():
+    return CacheFiguras(max_entradas=128)
 
-# Filtro 1: Apenas entregues (para cálculo de prazo)
-df_delivered = df[df['order_status'] == 'delivered'].copy()
-
-# Cálculo de Dias
-df_delivered['days_to_delivery'] = (df_delivered['order_delivered_customer_date'] - df_delivered['order_approved_at']).dt.days
-
-# Filtro 2: Remoção de Datas Absurdas (Erro de sistema ou logística extrema)
-# Removemos prazos negativos (erro) ou maiores que 180 dias (provável extravio/erro)
-mask_valid_dates = (df_delivered['days_to_delivery'] >= 0) & (df_delivered['days_to_delivery'] <= 180)
-df_clean_logistics = df_delivered[mask_valid_dates]
+cache_figuras = get_cache_figuras_v3()
+chave_figuras = (modelo.attrs.get('versao_dados'), periodo, selecoes, excluir)
 
-# Para Vendas, usamos o df completo (pois venda cancelada também tem valor tentado)
-# Mas vamos usar df_delivered para "Vendas Efetivadas" se preferir. Vamos usar df geral.
+def figura(nome, montar):
+    # `montar` só roda quando a figura não está no cache
+    return cache_figuras.obter(chave_figuras + (nome,), montar)
 
 # =========================================================
 # DASHBOARD
@@ -137,130 +195,192 @@ st.title("📊 Dashboard Executivo (Tratamento Avançado)")
 if st.sidebar.checkbox("🕵️ Mostrar Diagnóstico de Dados"):
     st.header("Diagnóstico")
     st.write("Amostra dos dados processados:")
-    st.dataframe(df.head())
-    st.write(f"Total Linhas: {len(df)}")
-    st.write(f"Pedidos Únicos: {df['order_id'].nunique()}")
+    st.dataframe(modelo.pedidos.head())
+    st.write(f"Total Linhas (itens): {len(modelo)}")
+    geral = agregados_aba('Geral')
+    st.write(f"Pedidos Únicos: {geral['pedidos']}")
+    st.write(f"Memória do modelo (pedidos + itens + dimensões): {modelo.memoria_mb():.1f} MB")
+    if modelo.attrs.get('uso_compartilhado') is not None:
+        # Ver olist_compartilhado: uma cópia por máquina, anexada por memory map
+        st.caption(f"Modelo compartilhado entre os processos do servidor (versão {modelo.attrs['versao_dados']}).")
     
-    n_sujos = len(df_delivered) - len(df_clean_logistics)
-    st.warning(f"Foram removidos {n_sujos} registros com datas inconsistentes (negativas ou > 180 dias) para o cálculo de média.")
+    st.warning(f"Foram removidos {geral['n_sujos']} registros com datas inconsistentes (negativas ou > 180 dias) para o cálculo de média.")
+
+    # Regras de qualidade avaliadas na carga (ver olist_qualidade), sobre a base inteira
+    st.write("Qualidade dos dados (linhas da base inteira que violam cada regra; exclua-as na barra lateral):")
+    st.dataframe(qualidade, hide_index=True, use_container_width=True)
+
+    # Datas em texto que não casaram com nenhum formato (ISO ou DD/MM/YYYY) na última carga
+    datas_falhas = modelo.attrs.get('datas_nao_convertidas')
+    if datas_falhas:
+        st.warning("Datas que não puderam ser convertidas (ficaram vazias): "
+                   + ", ".join(f"{col}: {n}" for col, n in datas_falhas.items()))
+    elif datas_falhas is not None:
+        st.write("Todas as datas preenchidas foram convertidas.")
+
+    est = cache_figuras.estatisticas()
+    taxa = f"{est['taxa_acerto']:.0%}" if est['taxa_acerto'] is not None else "N/A"
+    st.write(f"Cache de figuras: {taxa} de acertos ({est['acertos']:,} acertos, {est['faltas']:,} faltas, "
+             f"{est['entradas']}/{est['max_entradas']} figuras, {est['descartes']:,} descartadas).")
+
+mostrar_tempos = st.sidebar.checkbox("⏱️ Mostrar Tempos por Etapa")
 
 # Métricas Globais (Topo)
 c1, c2, c3, c4 = st.columns(4)
 # Métrica 1: Faturamento (Soma correta)
-faturamento = df['total_payment'].sum()
-c1.metric("Faturamento Total", f"R$ {faturamento:,.2f}")
+c1.metric("Faturamento Total", f"R$ {ag['faturamento']:,.2f}")
 
 # Métrica 2: Pedidos (Contagem Única)
-pedidos = df['order_id'].nunique()
-c2.metric("Total Pedidos", f"{pedidos:,}")
+c2.metric("Total Pedidos", f"{ag['pedidos']:,}")
 
 # Métrica 3: Prazo Médio (Usando base limpa)
-prazo_medio = df_clean_logistics['days_to_delivery'].mean()
-c3.metric("Prazo Médio Entrega", f"{prazo_medio:.1f} dias")
+c3.metric("Prazo Médio Entrega", f"{ag['prazo_medio']:.1f} dias")
 
 # Métrica 4: Nota Média
-nota_media = df['review_score'].mean()
-c4.metric("Nota Média", f"{nota_media:.2f}/5")
+c4.metric("Nota Média", f"{ag['nota_media']:.2f}/5")
 
 st.markdown("---")
 
-# ABAS
-abas = st.tabs(["📦 Logística", "💰 Vendas", "⭐ Satisfação", "🏷️ Produtos", "🗺️ Geografia", "🔄 Recompra"])
+# ABAS: cada uma é uma função que recebe os resumos dela (ABAS_V3); só a
+# aba selecionada roda (ver ABAS SOB DEMANDA)
 
-with abas[0]: # Logística
+def aba_logistica(ag): # Logística
     st.subheader("Análise de Entrega (Base Limpa)")
     col1, col2 = st.columns(2)
     
     # Histograma
-    fig_hist = px.histogram(df_clean_logistics, x='days_to_delivery', nbins=50, title="Distribuição Real do Prazo")
+    fig_hist = figura('logistica.hist_dias', lambda: figura_histograma(ag['hist_dias'], "Distribuição Real do Prazo", 'days_to_delivery'))
     col1.plotly_chart(fig_hist, use_container_width=True)
     
     # Status do Prazo
-    df_clean_logistics['status_prazo'] = df_clean_logistics.apply(
-        lambda x: 'No Prazo' if x['order_delivered_customer_date'] <= x['order_estimated_delivery_date'] else 'Atrasado', axis=1
-    )
-    fig_pie = px.pie(df_clean_logistics, names='status_prazo', title="Entregas no Prazo vs Atrasadas", color_discrete_sequence=['green', 'red'])
+    fig_pie = figura('logistica.prazo', lambda: px.pie(
+        ag['contagem_status_prazo'], names='status_prazo', values='count', title="Entregas no Prazo vs Atrasadas",
+        color_discrete_sequence=['green', 'red']))
     col2.plotly_chart(fig_pie, use_container_width=True)
 
-with abas[1]: # Vendas
+def aba_vendas(ag): # Vendas
     st.subheader("Evolução de Vendas")
-    # Agrupamento correto por mês
-    df['mes_ano'] = df['order_purchase_timestamp'].dt.to_period('M').astype(str)
-    # Importante: Somamos valor e contamos IDs únicos de pedido
-    vendas_mes = df.groupby('mes_ano').agg({
-        'total_payment': 'sum',
-        'order_id': 'nunique'
-    }).reset_index()
+    # Soma de valor e contagem de IDs únicos de pedido por mês
+    vendas_mes = ag['vendas_mes']
     
     # Identifica pico
     if not vendas_mes.empty:
         pico = vendas_mes.loc[vendas_mes['total_payment'].idxmax()]
         st.info(f"🏆 Melhor Mês: **{pico['mes_ano']}** com R$ {pico['total_payment']:,.2f}")
     
-    fig_line = px.line(vendas_mes, x='mes_ano', y='total_payment', markers=True, title="Faturamento Mensal")
+    fig_line = figura('vendas.mensal', lambda: px.line(vendas_mes, x='mes_ano', y='total_payment', markers=True, title="Faturamento Mensal"))
     st.plotly_chart(fig_line, use_container_width=True)
 
-with abas[2]: # Satisfação
+def aba_satisfacao(ag): # Satisfação
     st.subheader("Avaliações")
     c1, c2 = st.columns([1, 2])
     # Comentários
-    comentarios = df['review_comment'].notna().mean() * 100
-    c1.metric("% Com Clientes que Comentam", f"{comentarios:.1f}%")
+    c1.metric("% Com Clientes que Comentam", f"{ag['pct_comentarios']:.1f}%")
     # Gráfico Notas
-    fig_bar = px.bar(df['review_score'].value_counts().reset_index(), x='review_score', y='count', title="Distribuição das Notas")
+    fig_bar = figura('satisfacao.notas', lambda: px.bar(ag['dist_notas'], x='review_score', y='count', title="Distribuição das Notas"))
     c2.plotly_chart(fig_bar, use_container_width=True)
 
-with abas[3]: # Produtos
+def aba_produtos(ag): # Produtos
     st.subheader("Top Categorias")
-    # Limpa categorias nulas
-    df_cat = df.dropna(subset=['product_category_name'])
-    df_cat['Categoria'] = df_cat['product_category_name'].str.replace('_', ' ').str.title()
-    
-    top_cat = df_cat.groupby('Categoria')['total_payment'].sum().nlargest(10).reset_index()
-    fig_cat = px.bar(top_cat, x='total_payment', y='Categoria', orientation='h', title="Top 10 Categorias por Receita")
-    fig_cat.update_layout(yaxis={'categoryorder':'total ascending'})
+    fig_cat = figura('produtos.top_categorias', lambda: px.bar(
+        ag['top_categorias'], x='total_payment', y='Categoria', orientation='h', title="Top 10 Categorias por Receita"
+    ).update_layout(yaxis={'categoryorder':'total ascending'}))
     st.plotly_chart(fig_cat, use_container_width=True)
 
     # Relação Preço x Vendas
     st.markdown("#### Preço vs Volume")
-    scatter_data = df_cat.groupby('Categoria').agg({
-        'price': 'mean',
-        'order_id': 'count'
-    }).reset_index()
-    fig_scat = px.scatter(scatter_data, x='price', y='order_id', hover_name='Categoria', 
-                          title="Preço Médio vs Quantidade Vendida", labels={'price': 'Preço Médio', 'order_id': 'Qtd Vendas'})
+    fig_scat = figura('produtos.preco_volume', lambda: px.scatter(
+        ag['preco_por_categoria'], x='price', y='order_id', hover_name='Categoria',
+        title="Preço Médio vs Quantidade Vendida", labels={'price': 'Preço Médio', 'order_id': 'Qtd Vendas'}))
     st.plotly_chart(fig_scat, use_container_width=True)
 
-with abas[4]: # Geografia
+def aba_geografia(ag): # Geografia
     st.subheader("Geografia")
     col1, col2 = st.columns(2)
-    # Filtra Nulos
-    df_geo = df.dropna(subset=['customer_state', 'seller_state'])
-    
-    top_cli = df_geo['customer_state'].value_counts().head(10)
-    col1.plotly_chart(px.bar(top_cli, title="Top Estados (Clientes)"), use_container_width=True)
-    
-    top_sel = df_geo['seller_state'].value_counts().head(10)
-    col2.plotly_chart(px.bar(top_sel, title="Top Estados (Vendedores)", color_discrete_sequence=['orange']), use_container_width=True)
+    col1.plotly_chart(figura('geografia.clientes', lambda: px.bar(
+        ag['top_uf_clientes'], title="Top Estados (Clientes)")), use_container_width=True)
+    col2.plotly_chart(figura('geografia.vendedores', lambda: px.bar(
+        ag['top_uf_vendedores'], title="Top Estados (Vendedores)", color_discrete_sequence=['orange'])), use_container_width=True)
 
-with abas[5]: # Recompra
+def aba_recompra(ag): # Recompra
     st.subheader("Fidelidade (Recompra)")
-    if 'customer_zip_code_prefix' in df.columns and 'customer_city' in df.columns:
-        # Proxy de ID
-        df['proxy_id'] = df['customer_zip_code_prefix'].astype(str) + df['customer_city']
-        contagem = df.groupby('proxy_id')['order_id'].nunique()
-        recorrentes = contagem[contagem > 1].index
-        
-        df_rec = df[df['proxy_id'].isin(recorrentes)]
-        
-        if not df_rec.empty:
+    if 'recompra' in ag:
+        rec = ag['recompra']
+        if rec is not None:
             c1, c2 = st.columns(2)
-            c1.metric("Clientes Recorrentes", f"{len(recorrentes):,}")
-            c2.metric("Ticket Médio (Recorrentes)", f"R$ {df_rec['total_payment'].mean():.2f}")
+            c1.metric("Clientes Recorrentes", f"{rec['clientes']:,}")
+            c2.metric("Ticket Médio (Recorrentes)", f"R$ {rec['ticket_medio']:.2f}")
             
             # Perfil
             st.write("Preferência de Pagamento na Recompra:")
-            fig_pag = px.pie(df_rec.drop_duplicates('order_id'), names='payment_type', title="Meio de Pagamento")
+            fig_pag = figura('recompra.pagamentos', lambda: px.pie(
+                rec['pagamentos'], names='payment_type', values='count', title="Meio de Pagamento"))
             st.plotly_chart(fig_pag, use_container_width=True)
         else:
-            st.warning("Poucos dados para análise de recompra.")
\ No newline at end of file
+            st.warning("Poucos dados para análise de recompra.")
+    if ag.get('mediana_intervalo') is not None:
+        st.write(f"Tempo mediano entre compras do mesmo cliente: {ag['mediana_intervalo']:.0f} dias")
+        st.plotly_chart(figura('recompra.intervalos', lambda: figura_histograma(
+            ag['intervalos_recompra'], "Dias entre Compras", 'Dias entre Compras')), use_container_width=True)
+    if ag.get('coortes') is not None and not ag['coortes'].empty:
+        st.plotly_chart(figura('recompra.coortes', lambda: figura_coortes(
+            retencao(ag['coortes']), "Retenção por Coorte (mês da 1ª compra)")), use_container_width=True)
+
+# --- ABAS SOB DEMANDA ---
+# st.tabs com on_change='rerun' reexecuta a página ao trocar de aba e marca em
+# `.open` a aba visível: só ela calcula os agregados e monta as figuras.
+# A logística usa os resumos gerais (base limpa); o topo sai dos sketches.
+ABAS = {
+    "📦 Logística": ('Logística', 'Geral', aba_logistica),
+    "💰 Vendas": ('Vendas', 'Vendas', aba_vendas),
+    "⭐ Satisfação": ('Satisfação', 'Satisfação', aba_satisfacao),
+    "🏷️ Produtos": ('Produtos', 'Produtos', aba_produtos),
+    "🗺️ Geografia": ('Geografia', 'Geografia', aba_geografia),
+    "🔄 Recompra": ('Recompra', 'Recompra', aba_recompra),
+}
+
+abas = st.tabs(list(ABAS), key='aba_v3', on_change='rerun')
+ag_aberta = {}
+for conteiner, (nome, resumos, renderizar) in zip(abas, ABAS.values()):
+    if conteiner.open:
+        with conteiner, etapa(f'aba.{nome}'):
+            ag_aberta = agregados_aba(resumos)
+            renderizar(ag_aberta)
+
+# --- EXPORTAÇÃO (em blocos, sem cópia da base; ver olist_exportacao) ---
+# O expander também é sob demanda: fechado, não monta nada
+exportacao = st.expander("📥 Exportar Dados", key='exportar_v3', on_change='rerun')
+if exportacao.open:
+    with exportacao:
+        fontes = {"Itens (base filtrada)": 'itens', "Pedidos (base filtrada)": 'pedidos'}
+        resumos = tabelas_resumo(ag_aberta)
+        fontes.update({f"Resumo da aba: {nome}": nome for nome in resumos})
+        fonte = fontes[st.selectbox("Dados", list(fontes))]
+        disponiveis = colunas_exportaveis(modelo, fonte) if fonte in ('itens', 'pedidos') else list(resumos[fonte].columns)
+        colunas = st.multiselect("Colunas", disponiveis, default=disponiveis)
+        formato = st.radio("Formato", list(FORMATOS), horizontal=True)
+        if st.button("Gerar arquivo", disabled=not colunas):
+            if fonte in ('itens', 'pedidos'):
+                blocos, total = blocos_modelo(modelo, colunas, fonte), len(modelo.itens if fonte == 'itens' else modelo.pedidos)
+            else:
+                blocos, total = blocos_tabela(resumos[fonte][colunas]), len(resumos[fonte])
+            barra = st.progress(0.0, text="Exportando...")
+            with etapa('exportacao'):
+                arquivo = exportar(blocos, formato, lambda linhas: barra.progress(
+                    linhas / max(total, 1), text=f"{linhas:,} de {total:,} linhas"))
+            # Lido só no clique (download adiado), já compactado
+            st.download_button("Baixar arquivo", data=partial(conteudo, arquivo), file_name=f"olist_v3_{fonte}.{formato}",
+                               mime=FORMATOS[formato], on_click='ignore')
+
+# --- TEMPOS POR ETAPA ---
+concluir_execucao(execucao_pagina)
+if mostrar_tempos:
+    st.header("Tempos por Etapa")
+    st.write("Esta execução da página (carga, filtros, agregados e cada aba):")
+    st.dataframe(tabela_etapas(execucao_pagina), hide_index=True, use_container_width=True)
+    carga = ultima_execucao('carga_v3')
+    if carga is not None:
+        st.write(f"Última carga da base ({pd.Timestamp(carga.inicio, unit='s'):%d/%m/%Y %H:%M:%S} UTC, {carga.duracao_s:.2f}s no total):")
+        st.dataframe(tabela_etapas(carga), hide_index=True, use_container_width=True)
+    with st.expander("Métricas acumuladas (formato Prometheus)"):
+        st.code(texto_prometheus(), language='text')
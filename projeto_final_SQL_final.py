@@ -1,381 +1,482 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from sqlalchemy import create_engine
+from functools import partial
 import os
+from olist_conexao import criar_engine
+from olist_etl import carregar_modelo, ler_agregados, ultimo_modelo, SOMENTE_LEITURA
+from olist_modelo import filtrar_modelo
+from olist_graficos import CacheFiguras, figura_coortes, figura_dispersao, figura_histograma
+from olist_recompra import retencao
+from olist_atualizacao import AtualizadorEmSegundoPlano
+from olist_agregados import ABAS_DASHBOARD
+from olist_exportacao import (FORMATOS, blocos_modelo, blocos_tabela, colunas_exportaveis, conteudo, exportar,
+                              tabelas_resumo)
+from olist_filtros import construir_indices, opcoes, periodo_disponivel, posicoes_filtradas
+from olist_kpis import consultar, kpis_dashboard, meses_do_periodo, sketches_dashboard
+from olist_qualidade import bits, relatorio_qualidade
+from olist_metricas import (concluir_execucao, etapa, iniciar_execucao, tabela_etapas, texto_prometheus,
+                            ultima_execucao)
 
 # Configuração da Página
 st.set_page_config(page_title="Analytics Olist - Dados Reais", layout="wide")
 
-# --- FUNÇÃO DE CARREGAMENTO E FUSÃO DE DADOS (SQL) ---
-@st.cache_data
-def load_data():
+# Tempos de cada etapa desta execução da página (ver olist_metricas)
+execucao_pagina = iniciar_execucao('render_final')
+
+def parar_pagina():
+    """st.stop() que antes conclui a execução da página (os tempos dela não se perdem)."""
+    concluir_execucao(execucao_pagina)
+    st.stop()
+
+# --- CONEXÃO ---
+@st.cache_resource
+def get_db_connection():
     # Credenciais MySQL fornecidas
     DB_HOST = "ip-45-79-142-173.cloudezapp.io"
     DB_PORT = "3306"
     DB_USER = "alunosqlharve"
     DB_PASS = "Ed&ktw35j"
     DB_NAME = "modulosql"
+    # Engine único por processo, com pool (ver olist_conexao.CONFIG_POOL)
+    return criar_engine(f"mysql+pymysql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
+
+@st.cache_resource
+def get_atualizador():
+    # Compartilhado por todas as sessões: revalida a cada 10 min em segundo plano,
+    # servindo a versão anterior (ou o último snapshot em disco) enquanto isso
+    # No modo somente leitura (OLIST_SOMENTE_LEITURA=1) só relê o build gerado por olist_etl.py
+    engine = None if SOMENTE_LEITURA else get_db_connection()
+    return AtualizadorEmSegundoPlano(lambda: carregar_modelo('final', engine), intervalo=600,
+                                     inicial=lambda: ultimo_modelo('final'))
 
+def load_data():
+    atualizador = get_atualizador()
     try:
-        # Criando a engine de conexão com MySQL
-        engine = create_engine(f"mysql+pymysql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
-        
-        with engine.connect() as conn:
-            # Carregamento das tabelas mantendo os nomes originais
-            df_orders = pd.read_sql("SELECT * FROM olist_orders_dataset", conn)
-            df_items = pd.read_sql("SELECT * FROM olist_order_items_dataset", conn)
-            df_products = pd.read_sql("SELECT * FROM olist_products_dataset", conn)
-            df_customers = pd.read_sql("SELECT * FROM olist_customers_dataset", conn)
-            df_sellers = pd.read_sql("SELECT * FROM olist_sellers_dataset", conn)
-            df_payments = pd.read_sql("SELECT * FROM olist_order_payments_dataset", conn)
-            df_reviews = pd.read_sql("SELECT * FROM olist_order_reviews_dataset", conn)
-
-        # --- FUSÃO DAS TABELAS (Estratégia LEFT JOIN) ---
-        
-        # Base: Pedidos
-        df = df_orders.copy()
-        
-        # + Itens
-        df = pd.merge(df, df_items, on='order_id', how='left')
-        
-        # + Produtos
-        df = pd.merge(df, df_products, on='product_id', how='left')
-        
-        # + Clientes
-        df = pd.merge(df, df_customers, on='customer_id', how='left')
-        
-        # + Vendedores
-        df = pd.merge(df, df_sellers, on='seller_id', how='left')
-        
-        # + Pagamentos (CORREÇÃO CRÍTICA DE DUPLICIDADE)
-        if not df_payments.empty:
-            df_payments['payment_value'] = pd.to_numeric(df_payments['payment_value'].astype(str).str.replace(',', '.'), errors='coerce')
-            # Ordena por valor e mantém apenas o maior pagamento por pedido
-            df_payments_unique = df_payments.sort_values('payment_value', ascending=False).drop_duplicates(subset=['order_id'], keep='first')
-            df = pd.merge(df, df_payments_unique, on='order_id', how='left')
-        
-        # + Reviews (CORREÇÃO DE DUPLICIDADE E CORREÇÃO DO ERRO DE 99%)
-        if 'review_comment_message' in df_reviews.columns:
-            # Substitui strings vazias por nulo para o cálculo de porcentagem correto
-            df_reviews['review_comment_message'] = df_reviews['review_comment_message'].replace('', pd.NA)
-            df_reviews = df_reviews.rename(columns={'review_comment_message': 'review_comment'})
-        
-        # Remove duplicatas de reviews (mantém a primeira encontrada)
-        df_reviews_unique = df_reviews.drop_duplicates(subset=['order_id'], keep='first')
-        df = pd.merge(df, df_reviews_unique, on='order_id', how='left')
-
-        # --- LIMPEZA E TIPAGEM ---
-        
-        # Converter colunas numéricas
-        numeric_cols = ['price', 'freight_value', 'product_weight_g', 'product_photos_qty', 'review_score', 'payment_installments']
-        for col in numeric_cols:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col].astype(str).str.replace(',', '.'), errors='coerce').fillna(0)
-
-        # Cálculo do Valor Total (Item + Frete)
-        df['total_payment'] = df['price'] + df['freight_value']
-
-        # Renomear colunas para Português
-        mapa_colunas = {
-            'order_status': 'Status do Pedido',
-            'order_purchase_timestamp': 'Data da Compra',
-            'order_approved_at': 'Data Aprovação',
-            'order_delivered_customer_date': 'Data Entrega Real',
-            'order_estimated_delivery_date': 'Data Entrega Prevista',
-            'customer_state': 'Estado do Cliente',
-            'seller_state': 'Estado do Vendedor',
-            'total_payment': 'Valor Total',
-            'payment_type': 'Tipo de Pagamento',
-            'payment_installments': 'Parcelas',
-            'review_score': 'Nota de Avaliação',
-            'review_comment': 'Comentário',
-            'product_category_name': 'Categoria do Produto',
-            'product_photos_qty': 'Qtd Fotos',
-            'product_weight_g': 'Peso (g)',
-            'price': 'Preço Unitário',
-            'freight_value': 'Valor do Frete',
-            'product_length_cm': 'Comprimento (cm)',
-            'product_height_cm': 'Altura (cm)',
-            'product_width_cm': 'Largura (cm)',
-            'customer_city': 'Cidade do Cliente',
-            'customer_zip_code_prefix': 'CEP Prefixo'
-        }
-        df = df.rename(columns=mapa_colunas)
-        
-        # Conversão de Datas
-        cols_data = ['Data da Compra', 'Data Aprovação', 'Data Entrega Real', 'Data Entrega Prevista']
-        for col in cols_data:
-            if col in df.columns:
-                df[col] = pd.to_datetime(df[col], errors='coerce')
-        
-        return df
-
+        modelo = atualizador.obter()
     except Exception as e:
         st.error(f"Erro ao processar dados via MySQL: {e}")
-        st.stop()
+        parar_pagina()
+    if atualizador.ultimo_erro is not None:
+        st.sidebar.warning(f"Falha ao atualizar os dados; exibindo a versão anterior. ({atualizador.ultimo_erro})")
+    return modelo
 
-# Carrega os dados
-df = load_data()
+# Carrega os dados: modelo estrela com fato de pedidos, fato de itens e dimensões
+# (compartilhado entre sessões: não deve ser alterado no lugar)
+with etapa('carga_dados') as e:
+    modelo = e.saida(load_data())
 
 # --- VERIFICAÇÃO DE SEGURANÇA ---
-if df.empty:
+if modelo.empty:
     st.error("Erro Crítico: A tabela final ficou vazia.")
-    st.stop()
+    parar_pagina()
 
 st.title("🚀 Dashboard Executivo (Dados Validados)")
-st.caption(f"Base carregada via MySQL: {len(df):,} registros processados.")
-
-# --- ENGENHARIA DE NOVAS COLUNAS ---
-# Q1: Dias para Entrega
-if {'Data Entrega Real', 'Data Aprovação'}.issubset(df.columns):
-    df['Dias para Entrega'] = (df['Data Entrega Real'] - df['Data Aprovação']).dt.days
-
-# Q4: Status do Prazo
-if {'Data Entrega Real', 'Data Entrega Prevista'}.issubset(df.columns):
-    df['Entregue no Prazo'] = df['Data Entrega Real'] <= df['Data Entrega Prevista']
-    df['Status do Prazo'] = df['Entregue no Prazo'].map({True: 'No Prazo/Adiantado', False: 'Atrasado'})
-
-# Q6: Volume
-if {'Comprimento (cm)', 'Altura (cm)', 'Largura (cm)'}.issubset(df.columns):
-    df['Volume (cm3)'] = df['Comprimento (cm)'] * df['Altura (cm)'] * df['Largura (cm)']
-
-# Q8: Tipo de Frete
-if {'Estado do Cliente', 'Estado do Vendedor'}.issubset(df.columns):
-    df['Estado do Cliente'] = df['Estado do Cliente'].fillna('Desc')
-    df['Estado do Vendedor'] = df['Estado do Vendedor'].fillna('Desc')
-    df['Tipo de Frete'] = df.apply(lambda x: 'Local' if x['Estado do Cliente'] == x['Estado do Vendedor'] and x['Estado do Cliente'] != 'Desc' else 'Interestadual', axis=1)
-
-# Q9: Recompra (Proxy)
-if {'CEP Prefixo', 'Cidade do Cliente'}.issubset(df.columns):
-    df['ID Cliente (Proxy)'] = df['CEP Prefixo'].astype(str) + "_" + df['Cidade do Cliente']
-    contagem = df['ID Cliente (Proxy)'].value_counts()
-    recorrentes = contagem[contagem > 1].index
-    df['Cliente Recorrente'] = df['ID Cliente (Proxy)'].isin(recorrentes)
-    df['Tipo de Cliente'] = df['Cliente Recorrente'].map({True: 'Recorrente', False: 'Novo'})
-
-# Tratamento de Categoria
-if 'Categoria do Produto' in df.columns:
-    df['Categoria do Produto'] = df['Categoria do Produto'].astype(str).str.replace('_', ' ').str.title()
+st.caption(f"Base carregada via MySQL: {len(modelo):,} registros processados ({len(modelo.pedidos):,} pedidos).")
+
+# --- FILTROS (índices montados uma vez por versão dos dados) ---
+FILTROS = {
+    'Estado do Cliente': "UF do Cliente",
+    'Estado do Vendedor': "UF do Vendedor",
+    'Categoria do Produto': "Categoria",
+    'Status do Pedido': "Status do Pedido",
+}
+
+@st.cache_resource(max_entries=2)
+def carregar_indices(versao, _modelo):
+    # Índices no grão de item (as categorias de produto e vendedor são do item)
+    return construir_indices(_modelo.itens_com(['Data da Compra', *FILTROS]), 'Data da Compra', list(FILTROS),
+                             violacoes=_modelo.itens['violacoes'])
+
+@st.cache_data(max_entries=2)
+def carregar_qualidade(versao, _modelo):
+    # Violações por regra na base inteira (antes dos filtros), uma vez por versão dos dados
+    return relatorio_qualidade(_modelo, 'final')
+
+def filtros_sidebar(indices, qualidade):
+    """Widgets da barra lateral; devolve (período, seleções, regras excluídas) em forma hashável."""
+    st.sidebar.header("Filtros")
+    periodo = None
+    disponivel = periodo_disponivel(indices)
+    if disponivel is not None:
+        ini, fim = disponivel[0].date(), disponivel[1].date()
+        escolhido = st.sidebar.date_input("Período da Compra", value=(ini, fim), min_value=ini, max_value=fim)
+        # Durante a seleção o widget devolve só a data inicial
+        if isinstance(escolhido, (tuple, list)) and len(escolhido) == 2 and tuple(escolhido) != (ini, fim):
+            periodo = tuple(escolhido)
+    selecoes = tuple(
+        (col, tuple(st.sidebar.multiselect(rotulo, opcoes(indices, col))))
+        for col, rotulo in FILTROS.items() if col in indices['categorias']
+    )
+    # Só as regras com alguma violação na base (as corrigidas na carga também: ex. preço ausente -> 0)
+    violadas = qualidade[qualidade['Itens'] > 0].set_index('Regra')
+    excluir = tuple(st.sidebar.multiselect(
+        "Excluir dados com problemas", list(violadas.index),
+        format_func=lambda regra: f"{violadas.at[regra, 'Descrição']} ({violadas.at[regra, 'Itens']:,})"))
+    return periodo, selecoes, excluir
+
+with etapa('indices', modelo):
+    indices = carregar_indices(modelo.attrs.get('versao_dados'), modelo)
+with etapa('qualidade', modelo):
+    qualidade = carregar_qualidade(modelo.attrs.get('versao_dados'), modelo)
+
+@st.cache_resource(max_entries=2)
+def carregar_sketches(versao, _modelo):
+    # Sketches por mês x UF x categoria da base inteira (ver olist_kpis)
+    return sketches_dashboard(_modelo)
+
+with etapa('sketches', modelo):
+    sketches = carregar_sketches(modelo.attrs.get('versao_dados'), modelo)
+periodo, selecoes, excluir = filtros_sidebar(indices, qualidade)
+mostrar_tempos = st.sidebar.checkbox("⏱️ Mostrar Tempos por Etapa")
+with etapa('filtros', modelo) as e:
+    posicoes = posicoes_filtradas(indices, periodo, dict(selecoes), bits('final', *excluir))
+    modelo = e.saida(filtrar_modelo(modelo, posicoes))
+if posicoes is not None:
+    st.caption(f"Filtros ativos: {len(modelo):,} registros selecionados.")
+
+if modelo.empty:
+    st.warning("Nenhum registro para os filtros selecionados.")
+    parar_pagina()
+
+# --- AGREGADOS (por aba, uma vez por versão dos dados e combinação de filtros) ---
+sem_filtro = periodo is None and not any(valores for _, valores in selecoes) and not excluir
+
+@st.cache_resource(max_entries=2)
+def carregar_agregados_build(versao):
+    # Agregados de todas as abas gravados pelo build (None se não houver), lidos uma vez por versão
+    return ler_agregados(versao)
+
+@st.cache_data(max_entries=256)
+def carregar_agregados_aba(versao, filtros, aba, _modelo):
+    # `_modelo` não entra no hash do cache: a chave é a versão dos dados + filtros + aba
+    return ABAS_DASHBOARD[aba](_modelo)
+
+def agregados_aba(aba):
+    """Resumos de uma aba só: os do build quando não há filtro, senão calculados (em cache)."""
+    versao = modelo.attrs.get('versao_dados')
+    if sem_filtro:
+        ag = carregar_agregados_build(versao)
+        if ag is not None:
+            return ag
+    with etapa('agregados', modelo):
+        return carregar_agregados_aba(versao, (periodo, selecoes, excluir), aba, modelo)
+
+# --- KPIs DAS ABAS (sketches, ver olist_kpis) ---
+# Chaves dos agregados que os sketches respondem; o ticket médio fica em ag['recompra']
+KPIS_SKETCHES = {'media_dias', 'mediana_dias', 'pct_prazo', 'nota_media', 'pct_comentaram'}
+
+def kpis_sketches():
+    """KPIs pelos sketches; None com filtros que eles não cobrem (valem os calculados na aba)."""
+    # Sketches cobrem período em meses inteiros, UF do cliente e categoria (sem exclusão por regra)
+    filtros = dict(selecoes)
+    meses = meses_do_periodo(periodo) if periodo is not None else None
+    outros = any(valores for col, valores in selecoes if col not in ('Estado do Cliente', 'Categoria do Produto'))
+    if (periodo is not None and meses is None) or outros or excluir:
+        return None
+    with etapa('kpis'):
+        return kpis_dashboard(*consultar(sketches, meses, filtros.get('Estado do Cliente'),
+                                         filtros.get('Categoria do Produto')))
+
+def com_kpis(ag):
+    """Agregados da aba com os KPIs trocados pelos dos sketches (cópia: `ag` pode estar em cache)."""
+    chaves = ag.keys() & KPIS_SKETCHES
+    rec = ag.get('recompra')
+    if not chaves and rec is None:
+        return ag
+    kpis = kpis_sketches()
+    if kpis is None:
+        return ag
+    ag = {**ag, **{chave: kpis[chave] for chave in chaves}}
+    if rec is not None:
+        ag['recompra'] = {**rec, 'ticket_medio': kpis['ticket_medio_recorrentes']}
+    return ag
+
+# --- FIGURAS (LRU compartilhado, por versão dos dados + filtros + gráfico) ---
+@st.cache_resource
+def get_cache_figuras():
+    return CacheFiguras(max_entradas=256)
+
+cache_figuras = get_cache_figuras()
+chave_figuras = (modelo.attrs.get('versao_dados'), periodo, selecoes, excluir)
+
+def figura(nome, montar):
+    # `montar` só roda quando a figura não está no cache
+    return cache_figuras.obter(chave_figuras + (nome,), montar)
 
 # --- VISUALIZAÇÃO ---
-abas = st.tabs([
-    "📦 Logística", 
-    "💰 Vendas", 
-    "⭐ Satisfação", 
-    "🏷️ Produtos", 
-    "🗺️ Geografia", 
-    "🔄 Recompra"
-])
+# Cada aba é uma função que recebe os resumos dela (ABAS_DASHBOARD); só a aba
+# selecionada roda (ver o fim do arquivo).
 
 # ABA 1: Logística
-with abas[0]:
+def aba_logistica(ag):
     st.subheader("Performance Logística")
     st.caption("Q1: Tempo desde a aprovação do pedido até a entrega ao cliente. | Q6: Impacto do peso e volume no frete. | Q8: Atrasos por tipo de frete.")
     col1, col2 = st.columns(2)
 
-    if 'Dias para Entrega' in df.columns:
-        media_dias = df['Dias para Entrega'].mean()
-        mediana_dias = df['Dias para Entrega'].median()
+    if 'media_dias' in ag:
+        media_dias = ag['media_dias']
+        mediana_dias = ag['mediana_dias']
         val_media = f"{media_dias:.1f}" if pd.notna(media_dias) else "N/A"
         val_mediana = f"{mediana_dias:.1f}" if pd.notna(mediana_dias) else "N/A"
         m1, m2 = col1.columns(2)
         m1.metric("Tempo Médio de Entrega", f"{val_media} dias", help="Média aritmética dos dias entre aprovação e entrega")
         m2.metric("Tempo Mediano de Entrega", f"{val_mediana} dias", help="Valor central: 50% das entregas levam menos que isso")
-        fig = px.histogram(df, x='Dias para Entrega', nbins=30, title="Curva de Entrega (Dias)")
+        # Contagens por faixa já calculadas nos agregados (não envia as linhas ao navegador)
+        fig = figura('logistica.hist_dias', lambda: figura_histograma(ag['hist_dias'], "Curva de Entrega (Dias)", 'Dias para Entrega'))
         col1.plotly_chart(fig, use_container_width=True)
 
-    if 'Status do Prazo' in df.columns:
-        valid_prazos = df['Status do Prazo'].dropna()
-        if not valid_prazos.empty:
-            pct_prazo = (valid_prazos == 'No Prazo/Adiantado').mean() * 100
-            col2.metric("% No Prazo", f"{pct_prazo:.1f}%")
-            fig_pz = px.pie(df, names='Status do Prazo', title="Aderência ao Prazo", hole=0.4, color_discrete_sequence=['green', 'red'])
-            col2.plotly_chart(fig_pz, use_container_width=True)
+    if ag.get('pct_prazo') is not None:
+        col2.metric("% No Prazo", f"{ag['pct_prazo']:.1f}%")
+        fig_pz = figura('logistica.prazo', lambda: px.pie(
+            ag['contagem_prazo'], names='Status do Prazo', values='count', title="Aderência ao Prazo", hole=0.4,
+            color='Status do Prazo', color_discrete_map={'No Prazo/Adiantado': 'green', 'Atrasado': 'red'}))
+        col2.plotly_chart(fig_pz, use_container_width=True)
     
     c3, c4 = st.columns(2)
-    if 'Peso (g)' in df.columns and 'Valor do Frete' in df.columns:
-        df_peso = df[(df['Peso (g)'] > 0) & (df['Valor do Frete'] > 0)]
-        if not df_peso.empty:
-            fig_peso = px.scatter(df_peso.sample(min(2000, len(df_peso))), x='Peso (g)', y='Valor do Frete', title="Peso x Frete (Amostra)", opacity=0.5)
-            c3.plotly_chart(fig_peso, use_container_width=True)
-            c3.caption("Cada ponto representa um produto. Quanto mais pesado, maior tende a ser o frete.")
-
-    if 'Volume (cm3)' in df.columns and 'Valor do Frete' in df.columns:
-        df_vol = df[(df['Volume (cm3)'] > 0) & (df['Valor do Frete'] > 0)]
-        if not df_vol.empty:
-            fig_vol = px.scatter(df_vol.sample(min(2000, len(df_vol))), x='Volume (cm3)', y='Valor do Frete', title="Volume x Frete (Amostra)", opacity=0.5)
-            c4.plotly_chart(fig_vol, use_container_width=True)
-            c4.caption("Volume = Comprimento x Altura x Largura do produto. Analisa se o tamanho físico impacta no frete.")
+    # Densidade em grade + amostra estratificada fixa (ver olist_graficos)
+    disp_peso = ag.get('dispersao_peso_frete')
+    if disp_peso is not None:
+        fig_peso = figura('logistica.peso_frete', lambda: figura_dispersao(disp_peso, "Peso x Frete (Densidade + Amostra)"))
+        c3.plotly_chart(fig_peso, use_container_width=True)
+        c3.caption("Cada ponto representa um produto. Quanto mais pesado, maior tende a ser o frete.")
+
+    disp_vol = ag.get('dispersao_volume_frete')
+    if disp_vol is not None:
+        fig_vol = figura('logistica.volume_frete', lambda: figura_dispersao(disp_vol, "Volume x Frete (Densidade + Amostra)"))
+        c4.plotly_chart(fig_vol, use_container_width=True)
+        c4.caption("Volume = Comprimento x Altura x Largura do produto. Analisa se o tamanho físico impacta no frete.")
 
     c5, c6 = st.columns(2)
-    if 'Tipo de Frete' in df.columns and 'Status do Prazo' in df.columns:
-        atrasos = df[df['Status do Prazo'] == 'Atrasado']
-        if not atrasos.empty:
-            fig_atr = px.histogram(atrasos, x='Tipo de Frete', title="Onde ocorrem os atrasos?")
-            c5.plotly_chart(fig_atr, use_container_width=True)
-            c5.caption("Local = vendedor e comprador no mesmo estado. Interestadual = estados diferentes.")
+    atrasos = ag.get('atrasos_por_frete')
+    if atrasos is not None and not atrasos.empty:
+        fig_atr = figura('logistica.atrasos', lambda: px.bar(atrasos, x='Tipo de Frete', y='count', title="Onde ocorrem os atrasos?"))
+        c5.plotly_chart(fig_atr, use_container_width=True)
+        c5.caption("Local = vendedor e comprador no mesmo estado. Interestadual = estados diferentes.")
 
 # ABA 2: Vendas
-with abas[1]:
+def aba_vendas(ag):
     st.subheader("Análise Financeira")
     st.caption("Q2: Mês com maior volume de pedidos e mês com maior faturamento (Preço + Frete).")
-    if 'Data da Compra' in df.columns:
-        df_vendas = df.dropna(subset=['Data da Compra']).copy()
-        if not df_vendas.empty:
-            df_vendas['Mês/Ano'] = df_vendas['Data da Compra'].dt.to_period('M').astype(str)
-            
-            vendas_mes = df_vendas.groupby('Mês/Ano').agg(
-                Qtd_Pedidos=('Status do Pedido', 'count'),
-                Faturamento=('Valor Total', 'sum')
-            ).reset_index()
-            
-            if not vendas_mes.empty:
-                idx_ped = vendas_mes['Qtd_Pedidos'].idxmax()
-                idx_fat = vendas_mes['Faturamento'].idxmax()
-                pico_ped = vendas_mes.loc[idx_ped]
-                pico_fat = vendas_mes.loc[idx_fat]
-                
-                c1, c2 = st.columns(2)
-                c1.info(f"📅 Mais Pedidos: **{pico_ped['Mês/Ano']}** ({pico_ped['Qtd_Pedidos']})")
-                c2.success(f"💰 Maior Faturamento: **{pico_fat['Mês/Ano']}** (R$ {pico_fat['Faturamento']:,.2f})")
-                
-                st.plotly_chart(px.line(vendas_mes, x='Mês/Ano', y='Faturamento', markers=True, title="Faturamento Mensal"), use_container_width=True)
+    vendas_mes = ag.get('vendas_mes')
+    if vendas_mes is not None and not vendas_mes.empty:
+        idx_ped = vendas_mes['Qtd_Pedidos'].idxmax()
+        idx_fat = vendas_mes['Faturamento'].idxmax()
+        pico_ped = vendas_mes.loc[idx_ped]
+        pico_fat = vendas_mes.loc[idx_fat]
+        
+        c1, c2 = st.columns(2)
+        c1.info(f"📅 Mais Pedidos: **{pico_ped['Mês/Ano']}** ({pico_ped['Qtd_Pedidos']})")
+        c2.success(f"💰 Maior Faturamento: **{pico_fat['Mês/Ano']}** (R$ {pico_fat['Faturamento']:,.2f})")
+        
+        fig_vendas = figura('vendas.mensal', lambda: px.line(vendas_mes, x='Mês/Ano', y='Faturamento', markers=True, title="Faturamento Mensal"))
+        st.plotly_chart(fig_vendas, use_container_width=True)
 
 # ABA 3: Satisfação (CORREÇÃO APLICADA AQUI)
-with abas[2]:
+def aba_satisfacao(ag):
     st.subheader("NPS & Comentários")
     st.caption("Q3: Avaliação da satisfação dos clientes (notas de 1 a 5 e % que deixaram comentários). | Q4: Relação entre prazo de entrega e nota dada pelo cliente.")
-    if 'Nota de Avaliação' in df.columns:
-        # Deduplicação por pedido para métricas de satisfação (evita inflar por itens do mesmo pedido)
-        df_satisfacao = df.drop_duplicates(subset=['order_id'])
-        
-        media = df_satisfacao['Nota de Avaliação'].mean()
+    if 'nota_media' in ag:
+        # Métricas calculadas sobre pedidos únicos (evita inflar por itens do mesmo pedido)
+        media = ag['nota_media']
         val_media = f"{media:.2f}" if pd.notna(media) else "0.00"
         
         c1, c2 = st.columns([1,2])
         c1.metric("Nota Média", f"{val_media}/5")
         
-        if 'Comentário' in df_satisfacao.columns:
-            # Cálculo sobre pedidos únicos: Comentários Válidos / Total de Pedidos
-            total_pedidos = len(df_satisfacao)
-            comentarios_reais = df_satisfacao['Comentário'].notna().sum()
-            pct_coments = (comentarios_reais / total_pedidos) * 100
-            c1.metric("% Comentaram", f"{pct_coments:.1f}%")
+        if 'pct_comentaram' in ag:
+            c1.metric("% Comentaram", f"{ag['pct_comentaram']:.1f}%")
         
-        df_notas = df_satisfacao['Nota de Avaliação'].dropna()
-        if not df_notas.empty:
-            fig_notas = px.bar(df_notas.value_counts().reset_index(), x='Nota de Avaliação', y='count', title="Distribuição de Notas (Pedidos Únicos)")
+        if not ag['dist_notas'].empty:
+            fig_notas = figura('satisfacao.notas', lambda: px.bar(
+                ag['dist_notas'], x='Nota de Avaliação', y='count', title="Distribuição de Notas (Pedidos Únicos)"))
             c2.plotly_chart(fig_notas, use_container_width=True)
 
         # Q4: Cruzamento Prazo x Satisfação
-        if 'Status do Prazo' in df_satisfacao.columns:
+        if 'nota_por_prazo' in ag:
             st.markdown("#### Q4: Satisfação x Cumprimento do Prazo")
             st.caption("Compara a nota de avaliação dos clientes que receberam no prazo (ou adiantado) vs. os que receberam atrasado.")
-            df_prazo_sat = df_satisfacao.dropna(subset=['Status do Prazo', 'Nota de Avaliação'])
-            if not df_prazo_sat.empty:
+            if not ag['nota_por_prazo'].empty:
                 q4_c1, q4_c2 = st.columns(2)
-                media_por_prazo = df_prazo_sat.groupby('Status do Prazo')['Nota de Avaliação'].mean().reset_index()
-                fig_prazo_nota = px.bar(media_por_prazo, x='Status do Prazo', y='Nota de Avaliação',
+                fig_prazo_nota = figura('satisfacao.nota_por_prazo', lambda: px.bar(
+                    ag['nota_por_prazo'], x='Status do Prazo', y='Nota de Avaliação',
                     color='Status do Prazo', color_discrete_map={'No Prazo/Adiantado': 'green', 'Atrasado': 'red'},
-                    title="Nota Média por Status do Prazo", text_auto='.2f')
+                    title="Nota Média por Status do Prazo", text_auto='.2f'))
                 q4_c1.plotly_chart(fig_prazo_nota, use_container_width=True)
 
-                dist_prazo_nota = df_prazo_sat.groupby(['Status do Prazo', 'Nota de Avaliação']).size().reset_index(name='Quantidade')
-                fig_dist = px.bar(dist_prazo_nota, x='Nota de Avaliação', y='Quantidade', color='Status do Prazo',
+                fig_dist = figura('satisfacao.dist_prazo_nota', lambda: px.bar(
+                    ag['dist_prazo_nota'], x='Nota de Avaliação', y='Quantidade', color='Status do Prazo',
                     barmode='group', color_discrete_map={'No Prazo/Adiantado': 'green', 'Atrasado': 'red'},
-                    title="Distribuição de Notas: No Prazo vs Atrasado")
+                    title="Distribuição de Notas: No Prazo vs Atrasado"))
                 q4_c2.plotly_chart(fig_dist, use_container_width=True)
 
 # ABA 4: Produtos
-with abas[3]:
+def aba_produtos(ag):
     st.subheader("Análise de Produtos")
     st.caption("Q5: Categorias mais e menos vendidas, relação entre preço e volume de vendas, e impacto da quantidade de fotos do anúncio nas vendas.")
-    if 'Categoria do Produto' in df.columns:
-        df_cat = df[df['Categoria do Produto'] != 'Nan'] 
+    if 'contagem_categorias' in ag:
         c1, c2 = st.columns(2)
-        top_cats = df_cat['Categoria do Produto'].value_counts().head(10).reset_index()
+        top_cats = ag['contagem_categorias'].head(10).reset_index()
         if not top_cats.empty:
-            c1.plotly_chart(px.bar(top_cats, x='count', y='Categoria do Produto', orientation='h', title="Mais Vendidos"), use_container_width=True)
-        bot_cats = df_cat['Categoria do Produto'].value_counts().tail(10).reset_index()
+            c1.plotly_chart(figura('produtos.mais_vendidos', lambda: px.bar(
+                top_cats, x='count', y='Categoria do Produto', orientation='h', title="Mais Vendidos")), use_container_width=True)
+        bot_cats = ag['contagem_categorias'].tail(10).reset_index()
         if not bot_cats.empty:
-            c2.plotly_chart(px.bar(bot_cats, x='count', y='Categoria do Produto', orientation='h', title="Menos Vendidos", color_discrete_sequence=['red']), use_container_width=True)
+            c2.plotly_chart(figura('produtos.menos_vendidos', lambda: px.bar(
+                bot_cats, x='count', y='Categoria do Produto', orientation='h', title="Menos Vendidos",
+                color_discrete_sequence=['red'])), use_container_width=True)
 
-        if 'Preço Unitário' in df.columns:
+        if 'preco_por_categoria' in ag:
             st.markdown("#### Preço x Volume de Vendas")
             st.caption("Cada ponto representa uma categoria. Eixo X = preço médio dos produtos da categoria. Eixo Y = quantidade de itens vendidos.")
-            cat_perf = df_cat.groupby('Categoria do Produto').agg(
-                Preco_Medio=('Preço Unitário', 'mean'),
-                Vendas=('Status do Pedido', 'count')
-            ).reset_index()
+            cat_perf = ag['preco_por_categoria']
             if not cat_perf.empty:
-                st.plotly_chart(px.scatter(cat_perf, x='Preco_Medio', y='Vendas', hover_name='Categoria do Produto'), use_container_width=True)
+                st.plotly_chart(figura('produtos.preco_volume', lambda: px.scatter(
+                    cat_perf, x='Preco_Medio', y='Vendas', hover_name='Categoria do Produto')), use_container_width=True)
 
         # Q5: Fotos x Vendas
-        if 'Qtd Fotos' in df.columns:
+        if 'fotos_perf' in ag:
             st.markdown("#### Quantidade de Fotos do Anúncio x Vendas")
             st.caption("Qtd de Fotos = número de imagens que o vendedor cadastrou no anúncio do produto no marketplace. Analisa se anúncios com mais fotos vendem mais.")
-            df_fotos = df_cat[df_cat['Qtd Fotos'] > 0].copy()
-            if not df_fotos.empty:
-                fotos_perf = df_fotos.groupby('Qtd Fotos').agg(
-                    Vendas=('Status do Pedido', 'count'),
-                    Preco_Medio=('Preço Unitário', 'mean')
-                ).reset_index()
+            fotos_perf = ag['fotos_perf']
+            if not fotos_perf.empty:
                 f1, f2 = st.columns(2)
-                fig_fotos = px.bar(fotos_perf, x='Qtd Fotos', y='Vendas', title="Volume de Vendas por Qtd de Fotos")
+                fig_fotos = figura('produtos.fotos_vendas', lambda: px.bar(
+                    fotos_perf, x='Qtd Fotos', y='Vendas', title="Volume de Vendas por Qtd de Fotos"))
                 f1.plotly_chart(fig_fotos, use_container_width=True)
-                fig_fotos_preco = px.bar(fotos_perf, x='Qtd Fotos', y='Preco_Medio', title="Preço Médio por Qtd de Fotos", color_discrete_sequence=['orange'])
+                fig_fotos_preco = figura('produtos.fotos_preco', lambda: px.bar(
+                    fotos_perf, x='Qtd Fotos', y='Preco_Medio', title="Preço Médio por Qtd de Fotos",
+                    color_discrete_sequence=['orange']))
                 f2.plotly_chart(fig_fotos_preco, use_container_width=True)
 
 # ABA 5: Geografia
-with abas[4]:
+def aba_geografia(ag):
     st.subheader("Geografia")
     st.caption("Q7: Estados (UF) com maior concentração de compradores e de vendedores no marketplace.")
     c1, c2 = st.columns(2)
-    if 'Estado do Cliente' in df.columns:
-        c1.plotly_chart(px.bar(df['Estado do Cliente'].value_counts().head(10), title="Top Compradores (UF)"), use_container_width=True)
-    if 'Estado do Vendedor' in df.columns:
-        c2.plotly_chart(px.bar(df['Estado do Vendedor'].value_counts().head(10), title="Top Vendedores (UF)", color_discrete_sequence=['orange']), use_container_width=True)
+    if 'top_uf_clientes' in ag:
+        c1.plotly_chart(figura('geografia.clientes', lambda: px.bar(
+            ag['top_uf_clientes'], title="Top Compradores (UF)")), use_container_width=True)
+    if 'top_uf_vendedores' in ag:
+        c2.plotly_chart(figura('geografia.vendedores', lambda: px.bar(
+            ag['top_uf_vendedores'], title="Top Vendedores (UF)", color_discrete_sequence=['orange'])), use_container_width=True)
 
 # ABA 6: Recompra
-with abas[5]:
+def aba_recompra(ag):
     st.subheader("Perfil de Recompra")
     st.caption("Q9: Padrão dos clientes que compraram mais de uma vez. Identificados por combinação de CEP + Cidade (proxy, pois a Olist anonimiza os clientes).")
-    if 'Tipo de Cliente' in df.columns:
-        df_rec = df[df['Tipo de Cliente'] == 'Recorrente']
-        if not df_rec.empty:
-            c1, c2, c3 = st.columns(3)
-            c1.metric("Clientes Recorrentes", df_rec['ID Cliente (Proxy)'].nunique())
-            c2.metric("Ticket Médio", f"R$ {df_rec['Valor Total'].mean():.2f}")
-            c3.metric("Nota Média", f"{df_rec['Nota de Avaliação'].mean():.2f}")
-            
-            # Métricas adicionais
-            c4, c5, c6 = st.columns(3)
-            if 'Parcelas' in df_rec.columns:
-                c4.metric("Média de Parcelas", f"{df_rec['Parcelas'].mean():.1f}")
-            if 'Status do Prazo' in df_rec.columns:
-                prazo_rec = df_rec['Status do Prazo'].dropna()
-                if not prazo_rec.empty:
-                    pct_prazo_rec = (prazo_rec == 'No Prazo/Adiantado').mean() * 100
-                    c5.metric("% Entrega no Prazo", f"{pct_prazo_rec:.1f}%")
-            if 'Estado do Cliente' in df_rec.columns:
-                top_estado = df_rec['Estado do Cliente'].value_counts().index[0]
-                c6.metric("Estado com Mais Recompras", top_estado)
-
-            r1, r2 = st.columns(2)
-            if 'Tipo de Pagamento' in df_rec.columns:
-                r1.plotly_chart(px.pie(df_rec, names='Tipo de Pagamento', title="Pagamento Preferido na Recompra"), use_container_width=True)
-            if 'Categoria do Produto' in df_rec.columns:
-                top_rec = df_rec[df_rec['Categoria do Produto'] != 'Nan']['Categoria do Produto'].value_counts().head(5).reset_index()
-                r2.plotly_chart(px.bar(top_rec, x='count', y='Categoria do Produto', orientation='h', title="Top Categorias na Recompra"), use_container_width=True)
-
-            r3, r4 = st.columns(2)
-            if 'Estado do Cliente' in df_rec.columns:
-                top_estados_rec = df_rec['Estado do Cliente'].value_counts().head(10).reset_index()
-                fig_loc = px.bar(top_estados_rec, x='count', y='Estado do Cliente', orientation='h', title="Top Estados - Clientes Recorrentes")
-                r3.plotly_chart(fig_loc, use_container_width=True)
-            if 'Parcelas' in df_rec.columns:
-                parcelas_dist = df_rec['Parcelas'].value_counts().sort_index().reset_index()
-                parcelas_dist.columns = ['Parcelas', 'Quantidade']
-                fig_parc = px.bar(parcelas_dist, x='Parcelas', y='Quantidade', title="Distribuição de Parcelas na Recompra")
-                r4.plotly_chart(fig_parc, use_container_width=True)
\ No newline at end of file
+    rec = ag.get('recompra')
+    if rec is not None:
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Clientes Recorrentes", rec['clientes'])
+        c2.metric("Ticket Médio", f"R$ {rec['ticket_medio']:.2f}")
+        c3.metric("Nota Média", f"{rec['nota_media']:.2f}")
+        
+        # Métricas adicionais
+        c4, c5, c6 = st.columns(3)
+        if 'media_parcelas' in rec:
+            c4.metric("Média de Parcelas", f"{rec['media_parcelas']:.1f}")
+        if rec.get('pct_prazo') is not None:
+            c5.metric("% Entrega no Prazo", f"{rec['pct_prazo']:.1f}%")
+        if 'top_estado' in rec:
+            c6.metric("Estado com Mais Recompras", rec['top_estado'])
+
+        r1, r2 = st.columns(2)
+        if 'pagamentos' in rec:
+            r1.plotly_chart(figura('recompra.pagamentos', lambda: px.pie(
+                rec['pagamentos'], names='Tipo de Pagamento', values='count', title="Pagamento Preferido na Recompra")),
+                use_container_width=True)
+        if 'top_categorias' in rec:
+            r2.plotly_chart(figura('recompra.categorias', lambda: px.bar(
+                rec['top_categorias'], x='count', y='Categoria do Produto', orientation='h', title="Top Categorias na Recompra")),
+                use_container_width=True)
+
+        r3, r4 = st.columns(2)
+        if 'top_estados' in rec:
+            fig_loc = figura('recompra.estados', lambda: px.bar(
+                rec['top_estados'], x='count', y='Estado do Cliente', orientation='h', title="Top Estados - Clientes Recorrentes"))
+            r3.plotly_chart(fig_loc, use_container_width=True)
+        if 'parcelas_dist' in rec:
+            fig_parc = figura('recompra.parcelas', lambda: px.bar(
+                rec['parcelas_dist'], x='Parcelas', y='Quantidade', title="Distribuição de Parcelas na Recompra"))
+            r4.plotly_chart(fig_parc, use_container_width=True)
+
+    # Tempo entre compras e coortes (todos os clientes, por mês da 1ª compra)
+    if ag.get('mediana_intervalo') is not None:
+        st.markdown("#### Tempo entre Compras")
+        st.caption(f"Mediana: {ag['mediana_intervalo']:.0f} dias entre uma compra e a seguinte do mesmo cliente.")
+        st.plotly_chart(figura('recompra.intervalos', lambda: figura_histograma(
+            ag['intervalos_recompra'], "Dias entre Compras Seguidas", 'Dias entre Compras')), use_container_width=True)
+    if ag.get('coortes') is not None and not ag['coortes'].empty:
+        st.markdown("#### Coortes por Mês da Primeira Compra")
+        st.caption("Cada linha é o grupo de clientes que comprou pela primeira vez naquele mês; cada coluna, a % deles que voltou a comprar N meses depois.")
+        st.plotly_chart(figura('recompra.coortes', lambda: figura_coortes(
+            retencao(ag['coortes']), "Retenção por Coorte (%)")), use_container_width=True)
+
+# --- ABAS SOB DEMANDA ---
+# st.tabs com on_change='rerun' reexecuta a página ao trocar de aba e marca em
+# `.open` a aba visível: só ela calcula os agregados e monta as figuras, então
+# um rerun custa uma aba, não seis.
+ABAS = {
+    "📦 Logística": ('Logística', aba_logistica),
+    "💰 Vendas": ('Vendas', aba_vendas),
+    "⭐ Satisfação": ('Satisfação', aba_satisfacao),
+    "🏷️ Produtos": ('Produtos', aba_produtos),
+    "🗺️ Geografia": ('Geografia', aba_geografia),
+    "🔄 Recompra": ('Recompra', aba_recompra),
+}
+
+abas = st.tabs(list(ABAS), key='aba_final', on_change='rerun')
+ag_aberta = {}
+for conteiner, (nome, renderizar) in zip(abas, ABAS.values()):
+    if conteiner.open:
+        with conteiner, etapa(f'aba.{nome}'):
+            ag_aberta = agregados_aba(nome)
+            renderizar(com_kpis(ag_aberta))
+
+# --- EXPORTAÇÃO (em blocos, sem cópia da base; ver olist_exportacao) ---
+# O expander também é sob demanda: fechado, não monta nada
+exportacao = st.expander("📥 Exportar Dados", key='exportar_final', on_change='rerun')
+if exportacao.open:
+    with exportacao:
+        fontes = {"Itens (base filtrada)": 'itens', "Pedidos (base filtrada)": 'pedidos'}
+        resumos = tabelas_resumo(ag_aberta)
+        fontes.update({f"Resumo da aba: {nome}": nome for nome in resumos})
+        fonte = fontes[st.selectbox("Dados", list(fontes))]
+        disponiveis = colunas_exportaveis(modelo, fonte) if fonte in ('itens', 'pedidos') else list(resumos[fonte].columns)
+        colunas = st.multiselect("Colunas", disponiveis, default=disponiveis)
+        formato = st.radio("Formato", list(FORMATOS), horizontal=True)
+        if st.button("Gerar arquivo", disabled=not colunas):
+            if fonte in ('itens', 'pedidos'):
+                blocos, total = blocos_modelo(modelo, colunas, fonte), len(modelo.itens if fonte == 'itens' else modelo.pedidos)
+            else:
+                blocos, total = blocos_tabela(resumos[fonte][colunas]), len(resumos[fonte])
+            barra = st.progress(0.0, text="Exportando...")
+            with etapa('exportacao'):
+                arquivo = exportar(blocos, formato, lambda linhas: barra.progress(
+                    linhas / max(total, 1), text=f"{linhas:,} de {total:,} linhas"))
+            # Lido só no clique (download adiado), já compactado
+            st.download_button("Baixar arquivo", data=partial(conteudo, arquivo), file_name=f"olist_final_{fonte}.{formato}",
+                               mime=FORMATOS[formato], on_click='ignore')
+
+# --- TEMPOS POR ETAPA ---
+concluir_execucao(execucao_pagina)
+if mostrar_tempos:
+    st.divider()
+    st.subheader("⏱️ Tempos por Etapa")
+    st.caption("Esta execução da página: carga, filtros, agregados e renderização de cada aba.")
+    st.dataframe(tabela_etapas(execucao_pagina), hide_index=True, use_container_width=True)
+    carga = ultima_execucao('carga_final')
+    if carga is not None:
+        st.caption(f"Última carga da base ({pd.Timestamp(carga.inicio, unit='s'):%d/%m/%Y %H:%M:%S} UTC, {carga.duracao_s:.2f}s no total).")
+        st.dataframe(tabela_etapas(carga), hide_index=True, use_container_width=True)
+    est = cache_figuras.estatisticas()
+    taxa = f"{est['taxa_acerto']:.0%}" if est['taxa_acerto'] is not None else "N/A"
+    st.caption(f"Cache de figuras: {taxa} de acertos ({est['acertos']:,} acertos, {est['faltas']:,} faltas, "
+               f"{est['entradas']}/{est['max_entradas']} figuras, {est['descartes']:,} descartadas).")
+    # Regras de qualidade avaliadas na carga (ver olist_qualidade), sobre a base inteira
+    st.subheader("🧪 Qualidade dos Dados")
+    st.caption("Linhas da base inteira que violam cada regra; as com ação foram corrigidas na carga. Exclua-as na barra lateral.")
+    st.dataframe(qualidade, hide_index=True, use_container_width=True)
+    with st.expander("Métricas acumuladas (formato Prometheus)"):
+        st.code(texto_prometheus(), language='text')